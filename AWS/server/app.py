@@ -1,11 +1,17 @@
 from flask import Flask
-from flask_jwt_extended import JWTManager
 from flask_mail import Mail
-from utils.extensions import oauth, mail
+from utils.extensions import oauth, mail, jwt
 from routes import register_blueprints
+from utils.token_blocklist import token_blocklist
+from utils.mail_outbox import mail_outbox
+from utils.password_hasher import dummy_hash
+from utils.user_filter import user_filter
 from dotenv import load_dotenv
 import logging
 import os
+from datetime import timedelta
+from services.postgres_rds import PostgresRDSClient
+from services.migrations import MigrationRunner
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +27,9 @@ def create_app():
     # Load configuration from environment variables
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default_secret_key')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'default_jwt_secret_key')
+    # Access tokens are short-lived; sessions are kept alive by rotating refresh tokens
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15)))
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(hours=int(os.getenv('JWT_REFRESH_TOKEN_HOURS', 72)))
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
     app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
@@ -29,15 +38,49 @@ def create_app():
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
 
     # Initialize extensions
-    JWTManager(app)
+    jwt.init_app(app)
+    # Reject tokens revoked on logout; with TOKEN_BLOCKLIST_STORE=none access
+    # tokens are verified statelessly and stay valid until they expire
+    if token_blocklist.enabled:
+        jwt.token_in_blocklist_loader(lambda jwt_header, jwt_payload: token_blocklist.is_revoked(jwt_payload['jti']))
     mail.init_app(app)
     oauth.init_app(app)
 
+    # Hash the dummy password unknown-user logins are verified against now, not on the first such login
+    dummy_hash()
+
+    # Apply pending schema migrations
+    with app.app_context():
+        _run_migrations()
+
+    # Load existing usernames and emails into the existence filter, and keep it current, in the background
+    user_filter.start(app)
+    token_blocklist.start(app)
+
+    # Deliver queued mail from this process, unless mail_worker.py does it
+    if os.getenv('MAIL_OUTBOX_SENDER', 'thread').lower() == 'thread':
+        mail_outbox.start(app)
+
     # Register blueprints
     register_blueprints(app)
 
     return app
 
+def _run_migrations():
+    """Apply (or with RDS_MIGRATIONS=dry-run, only list) pending migrations.
+
+    A failed apply is raised so the process doesn't serve on a schema the code doesn't match.
+    """
+    mode = os.getenv('RDS_MIGRATIONS', 'apply').lower()
+    if mode == 'off':
+        return
+    try:
+        MigrationRunner(PostgresRDSClient._connect).run(dry_run=(mode == 'dry-run'))
+    except Exception as e:
+        logger.error(f"Database migration error: {str(e)}")
+        if mode != 'dry-run':
+            raise
+
 if __name__ == '__main__':
     app = create_app()
     host = os.getenv('FLASK_RUN_HOST', '0.0.0.0')
@@ -0,0 +1,55 @@
+""" Measure JWT verifications per second by algorithm, with and without the verified-token cache. """
+
+""" Step 1: Import required libraries """
+import argparse
+import time
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from utils.jwt_keys import KeyRing
+from utils.jwt_manager import CachingJWTManager
+
+""" Step 2: Define the benchmark """
+KEY_FACTORIES = {
+    'HS256': None,
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def make_manager(algorithm, cache_size):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'bench-secret-key-of-at-least-32-bytes'
+    key_ring = None
+    if KEY_FACTORIES[algorithm] is not None:
+        private_key = KEY_FACTORIES[algorithm]()
+        key_ring = KeyRing(algorithm, {'bench': private_key}, {'bench': private_key.public_key()}, 'bench')
+    manager = CachingJWTManager(app, key_ring=key_ring, cache_size=cache_size)
+    return app, manager
+
+
+def verifications_per_second(algorithm, cache_size, seconds):
+    app, manager = make_manager(algorithm, cache_size)
+    with app.app_context():
+        token = create_access_token(identity='42')
+        count = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            manager._decode_jwt_from_config(token)
+            count += 1
+    return count / seconds
+
+
+""" Step 3: Run the benchmark """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--algorithms', nargs='+', choices=list(KEY_FACTORIES), default=list(KEY_FACTORIES))
+    parser.add_argument('--seconds', type=float, default=2.0, help='Duration of each measurement')
+    args = parser.parse_args()
+
+    print(f"{'algorithm':<10} {'verify/s':>12} {'cached/s':>12} {'speedup':>8}")
+    for algorithm in args.algorithms:
+        uncached = verifications_per_second(algorithm, 0, args.seconds)
+        cached = verifications_per_second(algorithm, 1024, args.seconds)
+        print(f"{algorithm:<10} {uncached:>12,.0f} {cached:>12,.0f} {cached / uncached:>7.1f}x")
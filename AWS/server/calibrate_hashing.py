@@ -0,0 +1,60 @@
+""" Pick password hashing parameters that hit a target latency on this machine. """
+
+""" Step 1: Import required libraries """
+import argparse
+import time
+from utils.password_hasher import hash_password, normalize_method, Argon2Hasher
+
+""" Step 2: Define calibration helpers """
+SAMPLE_PASSWORD = "calibration-password"
+
+
+def measure(method, rounds=3):
+    """Return the median seconds taken to hash a password with method."""
+    timings = []
+    for _ in range(rounds):
+        started_at = time.perf_counter()
+        hash_password(SAMPLE_PASSWORD, method)
+        timings.append(time.perf_counter() - started_at)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_scrypt(target, r=8, p=1):
+    # scrypt cost must be a power of two; double n until the target is reached
+    n = 2**14
+    while measure(f"scrypt:{n}:{r}:{p}") < target and n < 2**20:
+        n *= 2
+    return f"scrypt:{n}:{r}:{p}"
+
+
+def calibrate_pbkdf2(target, hash_name="sha256"):
+    # pbkdf2 cost is linear in iterations, so extrapolate from a probe run
+    probe = 100_000
+    elapsed = measure(f"pbkdf2:{hash_name}:{probe}")
+    iterations = max(int(probe * target / elapsed), probe)
+    return f"pbkdf2:{hash_name}:{iterations}"
+
+
+def calibrate_argon2(target, memory_kib=65536, parallelism=4):
+    # Keep memory fixed and raise the number of passes
+    time_cost = 1
+    while measure(f"argon2:{time_cost}:{memory_kib}:{parallelism}") < target and time_cost < 20:
+        time_cost += 1
+    return f"argon2:{time_cost}:{memory_kib}:{parallelism}"
+
+
+""" Step 3: Run the calibration """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--algorithm', choices=['scrypt', 'pbkdf2', 'argon2'], default='scrypt')
+    parser.add_argument('--target-ms', type=float, default=250, help='Target hashing latency in milliseconds')
+    args = parser.parse_args()
+
+    if args.algorithm == 'argon2' and Argon2Hasher is None:
+        parser.error("argon2 calibration requires the argon2-cffi package")
+
+    target = args.target_ms / 1000.0
+    calibrators = {'scrypt': calibrate_scrypt, 'pbkdf2': calibrate_pbkdf2, 'argon2': calibrate_argon2}
+    method = normalize_method(calibrators[args.algorithm](target))
+    print(f"Measured {measure(method) * 1000:.0f} ms per hash")
+    print(f"PASSWORD_HASH_METHOD={method}")
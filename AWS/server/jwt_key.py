@@ -1,16 +1,87 @@
-""" Generate a secret key for JWT token. """
+""" Generate a secret key for JWT token, or manage the asymmetric JWT signing keys. """
 
 """ Step 1: Import required libraries """
+import argparse
+import os
 import secrets
+import time
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 
-""" Step 2: Generate a secret key """
-JWT_key = secrets.token_urlsafe(32)
-print(JWT_key)
+""" Step 2: Define the key helpers """
+# Private key factories for the asymmetric JWT_ALGORITHM values
+KEY_FACTORIES = {
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+}
 
-# Generate a 32-byte secret key
-secret_key = secrets.token_urlsafe(32)
-print(f"SECRET_KEY={secret_key}")
 
-# Generate a 16-byte security password salt
-security_password_salt = secrets.token_urlsafe(16)
-print(f"SECURITY_PASSWORD_SALT={security_password_salt}")
\ No newline at end of file
+def print_secrets():
+    # Generate a secret key for HS256 (JWT_SECRET_KEY)
+    JWT_key = secrets.token_urlsafe(32)
+    print(JWT_key)
+
+    # Generate a 32-byte secret key
+    secret_key = secrets.token_urlsafe(32)
+    print(f"SECRET_KEY={secret_key}")
+
+    # Generate a 16-byte security password salt
+    security_password_salt = secrets.token_urlsafe(16)
+    print(f"SECURITY_PASSWORD_SALT={security_password_salt}")
+
+
+def generate_key(key_dir, algorithm, kid=None):
+    """Write a new private key as <kid>.pem. Kids default to a timestamp, so the
+    newest key sorts last and becomes the active one unless JWT_ACTIVE_KID is set."""
+    kid = kid or time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    os.makedirs(key_dir, exist_ok=True)
+    path = os.path.join(key_dir, f"{kid}.pem")
+    pem = KEY_FACTORIES[algorithm]().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    # Readable by the owner only; fails rather than overwrite an existing key
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pem)
+    return kid
+
+
+def retire_key(key_dir, kid):
+    """Replace <kid>.pem with <kid>.pub.pem: the key stops signing but still
+    verifies (and stays in the JWKS) until the tokens it signed have expired."""
+    path = os.path.join(key_dir, f"{kid}.pem")
+    with open(path, 'rb') as f:
+        private_key = serialization.load_pem_private_key(f.read(), password=None)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    with open(os.path.join(key_dir, f"{kid}.pub.pem"), 'wb') as f:
+        f.write(public_pem)
+    os.remove(path)
+
+
+""" Step 3: Generate the requested keys """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        epilog="Rotation: generate a key while JWT_ACTIVE_KID pins the current one, so the JWKS publishes "
+               "it before it signs; after JWKS_MAX_AGE point JWT_ACTIVE_KID at it and retire the old key, "
+               "then delete the old .pub.pem once the refresh token lifetime has passed."
+    )
+    parser.add_argument('--generate', action='store_true', help='Add a signing key to the key directory')
+    parser.add_argument('--retire', metavar='KID', help='Keep this key for verification only')
+    parser.add_argument('--algorithm', choices=list(KEY_FACTORIES),
+                        default=os.getenv('JWT_ALGORITHM') if os.getenv('JWT_ALGORITHM') in KEY_FACTORIES else 'RS256')
+    parser.add_argument('--kid', help='Key id for --generate (default: current UTC timestamp)')
+    parser.add_argument('--key-dir', default=os.getenv('JWT_KEY_DIR', 'keys'))
+    args = parser.parse_args()
+
+    if not args.generate and not args.retire:
+        print_secrets()
+    if args.retire:
+        retire_key(args.key_dir, args.retire)
+        print(f"Retired JWT key '{args.retire}' (verify only)")
+    if args.generate:
+        kid = generate_key(args.key_dir, args.algorithm, args.kid)
+        print(f"Generated {args.algorithm} key '{kid}' in {args.key_dir}")
@@ -0,0 +1,5 @@
+-- Index Google sign-in lookups; built CONCURRENTLY so existing tables stay writable.
+-- Only OAuth users have a google_id, so the index skips everyone else.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_google_id
+    ON users (google_id)
+    WHERE google_id IS NOT NULL;
@@ -0,0 +1,19 @@
+-- Outgoing mail written by requests and delivered by the background sender
+-- (utils/mail_outbox.py). Claiming a batch pushes next_attempt_at forward by
+-- a lease, so a message whose sender died is picked up again afterwards.
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    subject TEXT NOT NULL,
+    sender VARCHAR(255) NOT NULL,
+    recipients TEXT[] NOT NULL,
+    body TEXT,
+    html TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_error TEXT,
+    sent_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_due ON mail_outbox (next_attempt_at) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_sent_at ON mail_outbox (sent_at) WHERE sent_at IS NOT NULL;
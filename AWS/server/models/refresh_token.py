@@ -0,0 +1,68 @@
+"""This module defines the server-side record of issued refresh tokens."""
+""" Step 1: Import required libraries """
+import time
+from services.postgres_rds import PostgresRDSClient
+
+""" Step 2: Register the refresh token statements """
+PostgresRDSClient.register_statement(
+    "refresh_token_insert",
+    "INSERT INTO refresh_tokens (jti, family_id, user_id, expires_at) VALUES (%s, %s, %s, to_timestamp(%s))"
+)
+# Marking a token used is the rotation itself: of two concurrent refreshes only one gets the row back
+PostgresRDSClient.register_statement("refresh_token_use", """
+    UPDATE refresh_tokens SET used_at = now()
+    WHERE jti = %s AND used_at IS NULL AND NOT revoked AND expires_at > now()
+    RETURNING family_id, user_id
+""")
+PostgresRDSClient.register_statement("refresh_token_revoke_family_of", """
+    UPDATE refresh_tokens SET revoked = TRUE
+    WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE jti = %s) AND NOT revoked
+""")
+PostgresRDSClient.register_statement(
+    "refresh_token_revoke_family", "UPDATE refresh_tokens SET revoked = TRUE WHERE family_id = %s AND NOT revoked"
+)
+PostgresRDSClient.register_statement(
+    "refresh_token_revoke_user", "UPDATE refresh_tokens SET revoked = TRUE WHERE user_id = %s AND NOT revoked"
+)
+
+
+""" Step 3: Define the RefreshToken model """
+class RefreshToken:
+    """A refresh token that was redeemed; its family and user carry over to the next one."""
+    # Seconds between deletions of expired rows
+    PURGE_INTERVAL = 3600.0
+    _next_purge = 0.0
+
+    def __init__(self, family_id, user_id):
+        self.family_id = family_id
+        self.user_id = user_id
+
+    # Define a class method to record a newly issued refresh token
+    @classmethod
+    def create(cls, jti, family_id, user_id, expires_at):
+        PostgresRDSClient.execute_prepared("refresh_token_insert", (jti, family_id, user_id, expires_at))
+        if time.monotonic() >= RefreshToken._next_purge:
+            RefreshToken._next_purge = time.monotonic() + cls.PURGE_INTERVAL
+            PostgresRDSClient.execute_query("DELETE FROM refresh_tokens WHERE expires_at <= now()")
+
+    # Define a class method to redeem a refresh token exactly once. Presenting
+    # a token that was already used means it leaked (or the client replayed
+    # it), so every token of its family is revoked and None is returned
+    @classmethod
+    def rotate(cls, jti):
+        result = PostgresRDSClient.execute_prepared("refresh_token_use", (jti,), fetch_one=True)
+        if result:
+            family_id, user_id = result["data"]
+            return cls(family_id, str(user_id))
+        PostgresRDSClient.execute_prepared("refresh_token_revoke_family_of", (jti,))
+        return None
+
+    # Define a class method to end one session (e.g. on logout)
+    @classmethod
+    def revoke_family(cls, family_id):
+        PostgresRDSClient.execute_prepared("refresh_token_revoke_family", (family_id,))
+
+    # Define a class method to end every session of a user (e.g. on password reset)
+    @classmethod
+    def revoke_user(cls, user_id):
+        PostgresRDSClient.execute_prepared("refresh_token_revoke_user", (user_id,))
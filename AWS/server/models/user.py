@@ -2,11 +2,47 @@
 """ Step 1: Import required libraries """
 from pydantic import BaseModel, EmailStr, Field, field_validator, validator
 from services.postgres_rds import PostgresRDSClient
+from utils.user_cache import user_cache
 from bson import ObjectId
 from email_validator import validate_email, EmailNotValidError
-from typing import Optional, Union
+from typing import NamedTuple, Optional, Union
 
 """ Step 2: Define the User model """
+# Columns of a full user row; preferred_language is aliased to the model field name
+USER_COLUMNS = 'id, username, email, password, name, age, gender, preferred_language AS "preferredLanguage", profile_picture, google_id'
+# Everything but the password hash, for data that leaves the service (e.g. exports)
+PROFILE_COLUMNS = 'id, username, email, name, age, gender, preferred_language AS "preferredLanguage", profile_picture, google_id'
+# Just enough to verify a login and answer it
+CREDENTIAL_COLUMNS = 'id, username, password, preferred_language'
+
+# The fixed user queries run as server-side prepared statements on each pooled connection
+PostgresRDSClient.register_statement("user_by_id", f"SELECT {USER_COLUMNS} FROM users WHERE id = %s")
+PostgresRDSClient.register_statement("user_by_username", f"SELECT {USER_COLUMNS} FROM users WHERE username = %s")
+PostgresRDSClient.register_statement("user_by_email", f"SELECT {USER_COLUMNS} FROM users WHERE email = %s")
+PostgresRDSClient.register_statement("user_credentials_by_username", f"SELECT {CREDENTIAL_COLUMNS} FROM users WHERE username = %s")
+PostgresRDSClient.register_statement("user_credentials_by_email", f"SELECT {CREDENTIAL_COLUMNS} FROM users WHERE email = %s")
+PostgresRDSClient.register_statement("user_id_by_email", "SELECT id FROM users WHERE email = %s")
+PostgresRDSClient.register_statement("user_update_password", "UPDATE users SET password = %s WHERE username = %s RETURNING id")
+PostgresRDSClient.register_statement("users_by_ids", f"SELECT {USER_COLUMNS} FROM users WHERE id = ANY(%s)")
+PostgresRDSClient.register_statement("users_by_emails", f"SELECT {USER_COLUMNS} FROM users WHERE email = ANY(%s)")
+PostgresRDSClient.register_statement("user_conflicts", """
+    SELECT bool_or(username = %s), bool_or(email = %s)
+    FROM users WHERE username = %s OR email = %s
+""")
+
+
+class UserCredentials(NamedTuple):
+    """Login-only view of a user, read without building a full User."""
+    id: str
+    username: str
+    password: Optional[str]
+    preferredLanguage: Optional[str]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(str(row[0]), row[1], row[2], row[3]) if row else None
+
+
 class User(BaseModel):
     id: Optional[Union[str, int]] = None
     username: str = Field(..., min_length=3, max_length=20)
@@ -53,51 +89,125 @@ class User(BaseModel):
             return v
         return str(v)  # Convert any ID to string
 
-    # Define a class method to find a user by username
+    # Build a User from a database row without re-running the validators;
+    # rows were validated when they were inserted, so this only converts the ID
     @classmethod
-    def find_by_username(cls, username):
-        query = "SELECT * FROM users WHERE username = %s"
-        result = PostgresRDSClient.execute_query(query, (username,), fetch_one=True)
+    def from_db_row(cls, row):
+        fields = {name: row[name] for name in cls.model_fields if name in row}
+        if fields.get('id') is not None:
+            fields['id'] = str(fields['id'])
+        return cls.model_construct(**fields)
+
+    # Build a User from an execute_query result, or None if no row matched
+    @classmethod
+    def _from_result(cls, result):
         if result:
-            # Map column names to values and convert types as needed
-            user_dict = dict(zip(result["columns"], result["data"]))
-            # Ensure ID is a string
-            if 'id' in user_dict and user_dict['id'] is not None:
-                user_dict['id'] = str(user_dict['id'])
-            return cls(**user_dict)
+            # Map column names to values
+            return cls.from_db_row(dict(zip(result["columns"], result["data"])))
         return None
+
+    # Run a single-row lookup and cache the user it returns
+    @classmethod
+    def _fetch_one(cls, statement, params):
+        token = user_cache.fill_token()
+        result = PostgresRDSClient.execute_prepared(statement, params, fetch_one=True)
+        user = cls._from_result(result)
+        user_cache.put(user, token)
+        return user
+
+    # Define a class method to find a user by username
+    @classmethod
+    def find_by_username(cls, username):
+        cached = user_cache.get('username', username)
+        if cached:
+            return cached
+        return cls._fetch_one("user_by_username", (username,))
     
     # Define a class method to find a user by email
     @classmethod
     def update_password(cls, username, new_hashed_password):
-        query = "UPDATE users SET password = %s WHERE username = %s"
-        result = PostgresRDSClient.execute_query(query, (new_hashed_password, username))
+        result = PostgresRDSClient.execute_prepared("user_update_password", (new_hashed_password, username), fetch_one=True)
+        # Invalidating by id also bumps the shared version seen by every node
+        user_cache.invalidate(id=result["data"][0] if result else None, username=username)
         return result is not None
     
+    # Return which of username/email are already taken by existing users
+    @classmethod
+    def find_conflicts(cls, username, email):
+        result = PostgresRDSClient.execute_prepared("user_conflicts", (username, email, username, email), fetch_one=True)
+        if not result:
+            return []
+        username_taken, email_taken = result["data"]
+        return [field for field, taken in (('username', username_taken), ('email', email_taken)) if taken]
+
     # Define a class method to find a user by ID
     @classmethod
     def find_by_id(cls, user_id):
-        query = "SELECT * FROM users WHERE id = %s"
-        result = PostgresRDSClient.execute_query(query, (user_id,), fetch_one=True)
-        if result:
-            # Map column names to values and convert types as needed
-            user_dict = dict(zip(result["columns"], result["data"]))
-            # Ensure ID is a string
-            if 'id' in user_dict and user_dict['id'] is not None:
-                user_dict['id'] = str(user_dict['id'])
-            return cls(**user_dict)
-        return None
+        cached = user_cache.get('id', user_id)
+        if cached:
+            return cached
+        return cls._fetch_one("user_by_id", (user_id,))
     
     # Define a class method to find a user by email
     @classmethod
     def find_by_email(cls, email):
-        query = "SELECT * FROM users WHERE email = %s"
-        result = PostgresRDSClient.execute_query(query, (email,), fetch_one=True)
-        if result:
-            # Map column names to values and convert types as needed
-            user_dict = dict(zip(result["columns"], result["data"]))
-            # Ensure ID is a string
-            if 'id' in user_dict and user_dict['id'] is not None:
-                user_dict['id'] = str(user_dict['id'])
-            return cls(**user_dict)
-        return None
\ No newline at end of file
+        cached = user_cache.get('email', email)
+        if cached:
+            return cached
+        return cls._fetch_one("user_by_email", (email,))
+
+    # Define class methods to find many users in one round-trip; the results
+    # follow the input order, with None for each value that matched no user
+    @classmethod
+    def find_many_by_ids(cls, user_ids):
+        ids = {}
+        for user_id in user_ids:
+            try:
+                ids[str(user_id)] = int(user_id)
+            except (TypeError, ValueError):
+                continue  # Can never match a row, so it stays None
+        users = cls._find_many('id', ids, "users_by_ids")
+        return [users.get(str(user_id)) for user_id in user_ids]
+
+    @classmethod
+    def find_many_by_emails(cls, emails):
+        users = cls._find_many('email', {email: email for email in emails}, "users_by_emails")
+        return [users.get(email) for email in emails]
+
+    # Serve what the cache holds and fetch the rest with a single ANY() query;
+    # keys maps each lookup key to the value sent to the database
+    @classmethod
+    def _find_many(cls, field, keys, statement):
+        users = user_cache.get_many(field, keys)
+        missing = [value for key, value in keys.items() if key not in users]
+        if missing:
+            token = user_cache.fill_token()
+            result = PostgresRDSClient.execute_prepared(statement, (missing,), fetch_all=True)
+            found = [cls.from_db_row(dict(zip(result["columns"], row))) for row in (result["data"] if result else [])]
+            user_cache.put_many(found, token)
+            users.update({str(getattr(user, field)): user for user in found})
+        return users
+
+    # Define class methods to fetch only the credentials needed to log in;
+    # these always read the database, as the cache never holds password hashes
+    @classmethod
+    def find_credentials_by_username(cls, username):
+        result = PostgresRDSClient.execute_prepared("user_credentials_by_username", (username,), fetch_one=True)
+        return UserCredentials.from_row(result["data"] if result else None)
+
+    @classmethod
+    def find_credentials_by_email(cls, email):
+        result = PostgresRDSClient.execute_prepared("user_credentials_by_email", (email,), fetch_one=True)
+        return UserCredentials.from_row(result["data"] if result else None)
+
+    # Define a class method to check whether an email is registered, returning the user's ID
+    @classmethod
+    def find_id_by_email(cls, email):
+        cached = user_cache.get('email', email)
+        if cached:
+            return cached.id
+        result = PostgresRDSClient.execute_prepared("user_id_by_email", (email,), fetch_one=True)
+        return str(result["data"][0]) if result else None
+
+
+user_cache.register_model(User)
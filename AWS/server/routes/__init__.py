@@ -1,11 +1,18 @@
 """Initialize Flask blueprints."""
 """step 1: Import the required libraries"""
+import os
 from .auth import auth_routes
+from .metrics import metrics_routes
+from .jwks import jwks_routes
 
 """step 2: Define the register_blueprints function"""
 def register_blueprints(app):
     """Register Flask blueprints."""
     app.register_blueprint(auth_routes)
+    app.register_blueprint(jwks_routes)
+    # Metrics are internal; only expose them when explicitly enabled
+    if os.getenv('METRICS_ENABLED', 'false').lower() == 'true':
+        app.register_blueprint(metrics_routes)
     
 
 
@@ -2,14 +2,24 @@
 
 """ Step 1: Importing required libraries"""
 import logging
-from utils.extensions import oauth, mail
+from utils.extensions import oauth
 from flask import Blueprint, request, jsonify, current_app, url_for, redirect, session
 import os
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from utils.hashing_pool import HashingPool, HashingPoolSaturated
+from utils.password_hasher import needs_rehash, dummy_hash
+from utils.user_cache import user_cache
+from utils.user_filter import user_filter
+from utils.token_blocklist import token_blocklist
+from utils.tokens import issue_tokens
+from utils.mail_outbox import mail_outbox
+from utils.rate_limit import (
+    check_limits, client_ip, rate_limited_response,
+    login_ip_limiter, login_identifier_limiter, reset_ip_limiter, reset_email_limiter
+)
 from services.postgres_rds import PostgresRDSClient
 from models.user import User as UserModel
+from models.refresh_token import RefreshToken as RefreshTokenModel
 from dotenv import load_dotenv
 from pydantic import ValidationError
 from email_validator import validate_email, EmailNotValidError
@@ -27,6 +37,22 @@ load_dotenv()
 auth_routes = Blueprint("auth", __name__)
 
 
+# Signup insert, run as a server-side prepared statement
+SIGNUP_INSERT = PostgresRDSClient.register_statement("user_signup_insert", """
+    INSERT INTO users (username, email, password, name, age, gender, preferred_language, profile_picture)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING id
+""")
+
+# Account created on first Google sign-in (no password)
+GOOGLE_SIGNUP_INSERT = PostgresRDSClient.register_statement("user_google_signup_insert", """
+    INSERT INTO users (username, email, name, google_id, profile_picture)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING id
+""")
+
 # Define the upload folder and allowed extensions
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static', 'profile_pics')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -38,6 +64,19 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Response used when the password hashing pool is saturated
+def hashing_busy_response():
+    logging.warning("Password hashing pool saturated, rejecting request")
+    response = jsonify({"error": "Server is busy, please try again shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Username for an account created on Google sign-in: the letters and digits of
+# the email's local part, cut to 20 and padded to the 3 characters User requires
+def google_username(email):
+    username = ''.join(c for c in email.split('@')[0] if c.isascii() and c.isalnum())[:20]
+    return username if len(username) >= 3 else f"user{username}"
+
 # Initialize Amazon S3 service
 s3_service = AmazonS3Service()
 
@@ -72,44 +111,44 @@ def signup():
 
         user = UserModel(**user_data)
 
-        # Check if user already exists with the same username or email
-        logging.info("Checking for existing users")
-        query = """
-            SELECT * FROM users WHERE username = %s OR email = %s
-        """
-        params = (user.username, user.email)
-        existing_user = PostgresRDSClient.execute_query(query, params, fetch_one=True)
-        if existing_user:
-            logging.info("User already exists")
-            return jsonify({"error": "User with this username or email already exists"}), 409
-        
-        hashed_password = generate_password_hash(user.password)
+        hashed_password = HashingPool.generate_password_hash(user.password)
         user_data['password'] = hashed_password
 
-        query = """
-            INSERT INTO users (username, email, password, name, age, gender, preferred_language, profile_picture)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
-        """
+        # Insert in a single round-trip; the unique constraints on username and
+        # email make a duplicate (including a concurrent one) insert nothing
         params = (
             user.username, user.email, hashed_password, user.name, user.age,
             user.gender, user.preferredLanguage, user.profile_picture
         )
-        result = PostgresRDSClient.execute_query(query, params, fetch_one=True)
+        result = PostgresRDSClient.execute_prepared(SIGNUP_INSERT, params, fetch_one=True)
         if result:
             logging.info("User registration successful")
-            user_id = result[0]
-            access_token = create_access_token(identity=str(user_id), expires_delta=timedelta(hours=72))
+            # Extract user ID correctly from result dictionary
+            user_id = result["data"][0]
+            user_cache.invalidate(username=user.username, email=user.email)
+            user_filter.add(user_id, username=user.username, email=user.email)
+            tokens = issue_tokens(user_id)
 
             return jsonify({
                 "message": "User registered successfully",
-                "access_token": access_token,
+                **tokens,
                 "userId": str(user_id),
                 "preferredLanguage": user.preferredLanguage or 'en',
                 "profile_picture": user.profile_picture
             }), 201
-        else:
-            logging.error("Failed to save user")
-            return jsonify({"error": "Failed to register user"}), 500
+
+        # Nothing was inserted, so report which unique column(s) collided
+        conflicts = UserModel.find_conflicts(user.username, user.email)
+        if conflicts:
+            logging.info(f"User already exists (conflicting {', '.join(conflicts)})")
+            return jsonify({
+                "error": "User with this username or email already exists",
+                "conflicts": conflicts
+            }), 409
+        logging.error("Failed to save user")
+        return jsonify({"error": "Failed to register user"}), 500
+    except HashingPoolSaturated:
+        return hashing_busy_response()
     except Exception as e:
         logging.error(f"Exception during registration: {str(e)}")
         return jsonify({"error": str(e)}), 400
@@ -128,6 +167,15 @@ def login():
         if not identifier or not password:
             return jsonify({"msg": "Missing identifier or password"}), 400
 
+        # Throttle per client and per account before any lookup or hash check
+        retry_after = check_limits(
+            (login_ip_limiter, client_ip()),
+            (login_identifier_limiter, str(identifier).strip().lower())
+        )
+        if retry_after:
+            logging.warning(f"Login rate limited for {client_ip()}")
+            return rate_limited_response(retry_after)
+
         # Validate if identifier is an email
         try:
             # Attempt to validate identifier as an email
@@ -136,13 +184,35 @@ def login():
         except EmailNotValidError:
             is_email = False
 
-        # Find user by email or username
-        user = UserModel.find_by_email(identifier) if is_email else UserModel.find_by_username(identifier)
-        
-        if user and check_password_hash(user.password, password):
-            access_token = create_access_token(identity=str(user.id), expires_delta=timedelta(hours=72))
+        # Fetch only the credentials; identifiers nobody has, or that recently matched nobody, skip the database
+        field = 'email' if is_email else 'username'
+        if not user_filter.might_exist(field, identifier) or user_cache.is_missing(field, identifier):
+            user = None
+        else:
+            # Taken before the lookup, so a signup that lands meanwhile keeps it from being remembered as missing
+            token = user_cache.fill_token()
+            if is_email:
+                user = UserModel.find_credentials_by_email(identifier)
+            else:
+                user = UserModel.find_credentials_by_username(identifier)
+            if user is None:
+                user_filter.report_false_positive()
+                user_cache.put_missing(field, identifier, token)
+
+        # Without a real hash, verify against a dummy one so unknown users cost the same as a wrong password
+        password_hash = user.password if user and user.password else dummy_hash()
+        if HashingPool.check_password_hash(password_hash, password) and user and user.password:
+            # Transparently upgrade hashes made with an outdated algorithm or work factor
+            if needs_rehash(user.password):
+                try:
+                    new_password_hash = HashingPool.generate_password_hash(password)
+                    UserModel.update_password(user.username, new_password_hash)
+                    logging.info(f"Rehashed password for user {user.id}")
+                except Exception as e:
+                    logging.warning(f"Password rehash failed for user {user.id}: {str(e)}")
+            tokens = issue_tokens(user.id)
             return jsonify({
-                "access_token": access_token,
+                **tokens,
                 "userId": str(user.id),
                 "preferredLanguage": user.preferredLanguage or 'en'  # Include preferredLanguage
             }), 200
@@ -152,6 +222,8 @@ def login():
     except ValidationError as ve:
         logging.error(f"Validation error: {ve}")
         return jsonify({"error": ve.errors()}), 400
+    except HashingPoolSaturated:
+        return hashing_busy_response()
     except Exception as e:
         logging.error(f"Login error: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
@@ -165,13 +237,35 @@ def login():
 
 @jwt_required()
 def logout():
-    # JWT Revocation or Blacklisting could be implemented here if needed
+    # Deny this token until it would have expired anyway, and end its session
+    claims = get_jwt()
+    token_blocklist.revoke(claims['jti'], claims['exp'])
+    if 'fam' in claims:
+        RefreshTokenModel.revoke_family(claims['fam'])
     jwt_id = get_jwt_identity()
     logging.info(f"User {jwt_id} logged out successfully")
 
     return jsonify({"msg": "Logout successful"}), 200
 
 
+#Route to exchange a refresh token for a new token pair
+@auth_routes.post('/user/refresh')
+
+@jwt_required(refresh=True)
+def refresh():
+    # Each refresh token is redeemed once; a replayed one ends its whole session
+    claims = get_jwt()
+    try:
+        token = RefreshTokenModel.rotate(claims['jti'])
+        if token is None:
+            logging.warning(f"Rejected used or revoked refresh token for user {claims['sub']}")
+            return jsonify({"msg": "Refresh token is no longer valid"}), 401
+        return jsonify(issue_tokens(token.user_id, token.family_id)), 200
+    except Exception as e:
+        logging.error(f"Token refresh error: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
 
 
 # Route to start Google OAuth
@@ -219,15 +313,11 @@ def google_callback():
             logging.error("OAuth state parameter mismatch")
             return jsonify({'error': 'Invalid authentication state'}), 400
             
-        token = oauth.google.authorize_access_token()
-        if not token:
-            logging.error("Failed to retrieve access token from Google")
-            return jsonify({'error': 'Failed to retrieve access token'}), 400
-        
-        # Add claims_options to specify the expected issuer
+        # Add claims_options to specify the expected issuer, taken from the cached discovery document
+        issuer = oauth.google.load_server_metadata().get('issuer', 'https://accounts.google.com')
         claims_options = {
             'iss': {
-                'values': ['https://accounts.google.com', 'accounts.google.com'],
+                'values': [issuer, 'accounts.google.com'],
             },
             'aud': {
                 'values': [os.getenv('GOOGLE_CLIENT_ID')],
@@ -236,46 +326,46 @@ def google_callback():
                 'values': [nonce],
             },
         }
-       
-        user_info = oauth.google.parse_id_token(token, nonce=nonce, claims_options=claims_options)
-        print(f"User info: {user_info}")
+
+        # The ID token is verified during the token exchange, against the cached signing keys
+        token = oauth.google.authorize_access_token(claims_options=claims_options)
+        if not token:
+            logging.error("Failed to retrieve access token from Google")
+            return jsonify({'error': 'Failed to retrieve access token'}), 400
+
+        user_info = token.get('userinfo') or oauth.google.parse_id_token(token, nonce=nonce, claims_options=claims_options)
         email = user_info.get('email')
         name = user_info.get('name')
         google_id = user_info.get('sub')
         profile_picture = user_info.get('picture')
-        print(f"Email: {email}, Name: {name}, Google ID: {google_id}, Profile Picture: {profile_picture}")
 
         if not email:
             return jsonify({'error': 'Failed to retrieve email from Google'}), 400
 
         # Check if user already exists
-        user = UserModel.find_by_email(email)
+        user_id = UserModel.find_id_by_email(email)
 
-        if not user:
+        if not user_id:
             # Create a new user
-            user_data = {
-                'username': email.split('@')[0],
-                'email': email,
-                'name': name,
-                'google_id': google_id,
-                'profile_picture': profile_picture,
-            }
-            db_client = MongoDBClient.get_client()
-            db = db_client[MongoDBClient.get_db_name()]
-            result = db['users'].insert_one(user_data)
-            user_id = result.inserted_id
-        else:
-            user_id = user.id
-
-        # Generate JWT token
-        access_token = create_access_token(
-            identity=str(user_id),
-            expires_delta=timedelta(hours=72)
-        )
+            params = (google_username(email), email, name, google_id, profile_picture)
+            result = PostgresRDSClient.execute_prepared(GOOGLE_SIGNUP_INSERT, params, fetch_one=True)
+            if result:
+                user_id = result["data"][0]
+                user_cache.invalidate(username=params[0], email=email)
+                user_filter.add(user_id, username=params[0], email=email)
+            else:
+                # Signed up concurrently, or the username is taken by another account
+                user_id = UserModel.find_id_by_email(email)
+                if not user_id:
+                    logging.info(f"Username {params[0]} already exists for Google sign-up")
+                    return jsonify({'error': 'User with this username already exists'}), 409
+
+        # Generate JWT tokens
+        tokens = issue_tokens(user_id)
         # Redirect to frontend with token and user ID
         frontend_redirect_url =  os.getenv('BASE_URL')  # e.g., 'http://localhost:4200'
-        print(f"Frontend redirect URL: {frontend_redirect_url}")
-        redirect_url = f"{frontend_redirect_url}/auth/auth-callback?token={access_token}&userId={user_id}"
+        # The refresh token goes in the fragment, which browsers never send to servers or in Referer headers
+        redirect_url = f"{frontend_redirect_url}/auth/auth-callback?token={tokens['access_token']}&userId={user_id}#refreshToken={tokens['refresh_token']}"
         return redirect(redirect_url, code=302)
 
     except Exception as e:
@@ -293,13 +383,26 @@ def request_password_reset():
         if not email:
             logging.warning("No email provided in the request")
             return jsonify({"error": "Email is required"}), 400
+
+        retry_after = check_limits(
+            (reset_ip_limiter, client_ip()),
+            (reset_email_limiter, str(email).strip().lower())
+        )
+        if retry_after:
+            logging.warning(f"Password reset rate limited for {client_ip()}")
+            return rate_limited_response(retry_after)
         
-        user = UserModel.find_by_email(email)
-        if not user:
+        # Addresses the filter has never seen can't belong to a user
+        user_id = None
+        if user_filter.might_exist('email', email):
+            user_id = UserModel.find_id_by_email(email)
+            if not user_id:
+                user_filter.report_false_positive()
+        if not user_id:
             logging.info(f"No user found with email: {email}")
             return jsonify({"message": "No user found with this email"}), 404
 
-        token = generate_reset_token(user.email)
+        token = generate_reset_token(email)
         base_url = os.getenv('RESET_PASSWORD_BASE_URL', 'http://localhost:3000/reset_password/')  
         reset_url = f"{base_url}{token}"
         
@@ -314,12 +417,13 @@ def request_password_reset():
         msg = Message(
             subject="Password Reset Request",
             sender=mail_sender,
-            recipients=[user.email]
+            recipients=[email]
         )
         msg.body = f"Please click on the link to reset your password: {reset_url}"
         
-        mail.send(msg)
-        logging.info(f"Password reset email sent to {user.email}")
+        # Written to the outbox here and delivered by the background sender
+        mail_outbox.enqueue(msg)
+        logging.info(f"Password reset email queued for {email}")
             
         return jsonify({"message": "Check your email for the reset password link"}), 200
     except Exception as e:
@@ -335,9 +439,14 @@ def reset_password(token):
     if not user:
         return jsonify({"error": "Invalid or expired token"}), 403
 
-    new_password_hash = generate_password_hash(new_password)
+    try:
+        new_password_hash = HashingPool.generate_password_hash(new_password)
+    except HashingPoolSaturated:
+        return hashing_busy_response()
     user.update_password(user.username, new_password_hash)
-    
+    # Sign out every session that was opened with the old password
+    RefreshTokenModel.revoke_user(user.id)
+
     return jsonify({"message": "Password has been reset successfully"}), 200
 
 
@@ -0,0 +1,40 @@
+"""This module publishes the JWT verification keys as a JSON Web Key Set"""
+
+""" Step 1: Importing required libraries"""
+import os
+from flask import Blueprint, jsonify, request, current_app
+from utils.jwt_keys import get_key_ring
+from dotenv import load_dotenv
+
+"""Step 2: Configurations"""
+load_dotenv()
+# How long verifiers may cache the key set before revalidating it
+JWKS_MAX_AGE = int(os.getenv('JWKS_MAX_AGE', 300))
+
+"""Step 3: Creating a blueprint for the JWKS routes"""
+jwks_routes = Blueprint("jwks", __name__)
+
+def jwks_document():
+    """Return the serialized key set and its ETag, or None when tokens are HMAC-signed."""
+    key_ring = get_key_ring()
+    if key_ring is None:
+        return None
+    # Cached by the ring itself and rebuilt when it reloads, so a rotation changes the ETag
+    return key_ring.jwks_document()
+
+
+"""Step 4: Defining routes"""
+
+# Route serving the public keys; verifiers revalidate with If-None-Match and
+# get a 304 until a key is added or retired
+@jwks_routes.get('/.well-known/jwks.json')
+def jwks():
+    document = jwks_document()
+    if document is None:
+        return jsonify({"error": "Tokens are not signed with an asymmetric key"}), 404
+    body, etag = document
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = JWKS_MAX_AGE
+    return response.make_conditional(request)
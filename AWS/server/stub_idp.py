@@ -0,0 +1,113 @@
+""" Run a minimal OpenID Connect provider for exercising Google sign-in locally.
+
+Point the server at it with GOOGLE_DISCOVERY_URL=http://localhost:<port>/.well-known/openid-configuration.
+Every authorization request is approved at once for the configured user.
+"""
+
+""" Step 1: Import required libraries """
+import argparse
+import secrets
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify, redirect, request
+
+""" Step 2: Define the provider """
+def create_stub_idp(issuer, user):
+    """Build the provider app; ``user`` holds the claims returned for the signed-in user."""
+    app = Flask(__name__)
+    state = {"keys": []}  # [(kid, private key)], newest first
+    codes = {}  # authorization code -> (client_id, nonce)
+    requests_seen = Counter()
+    lock = threading.Lock()
+
+    def rotate_key():
+        kid = f"stub-{secrets.token_hex(4)}"
+        with lock:
+            state["keys"] = [(kid, rsa.generate_private_key(public_exponent=65537, key_size=2048))]
+        return kid
+
+    rotate_key()
+
+    @app.before_request
+    def count_request():
+        requests_seen[request.path] += 1
+
+    @app.get('/.well-known/openid-configuration')
+    def discovery():
+        return jsonify({
+            "issuer": issuer,
+            "authorization_endpoint": f"{issuer}/authorize",
+            "token_endpoint": f"{issuer}/token",
+            "userinfo_endpoint": f"{issuer}/userinfo",
+            "jwks_uri": f"{issuer}/jwks",
+            "response_types_supported": ["code"],
+            "subject_types_supported": ["public"],
+            "id_token_signing_alg_values_supported": ["RS256"],
+        })
+
+    @app.get('/jwks')
+    def jwks():
+        keys = []
+        for kid, key in state["keys"]:
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+            jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+            keys.append(jwk)
+        return jsonify({"keys": keys})
+
+    @app.get('/authorize')
+    def authorize():
+        code = secrets.token_urlsafe(16)
+        codes[code] = (request.args['client_id'], request.args.get('nonce'))
+        query = urlencode({"code": code, "state": request.args.get('state', '')})
+        return redirect(f"{request.args['redirect_uri']}?{query}")
+
+    @app.post('/token')
+    def token():
+        grant = codes.pop(request.form.get('code'), None)
+        if grant is None:
+            return jsonify({"error": "invalid_grant"}), 400
+        client_id, nonce = grant
+        kid, key = state["keys"][0]
+        now = int(time.time())
+        claims = {"iss": issuer, "aud": client_id, "iat": now, "exp": now + 3600, **user}
+        if nonce:
+            claims["nonce"] = nonce
+        return jsonify({
+            "access_token": secrets.token_urlsafe(24),
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "id_token": jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid}),
+        })
+
+    @app.get('/userinfo')
+    def userinfo():
+        return jsonify(user)
+
+    # Test helpers: switch to a new signing key, and count the requests served per path
+    @app.post('/rotate')
+    def rotate():
+        return jsonify({"kid": rotate_key()})
+
+    @app.get('/stats')
+    def stats():
+        return jsonify(dict(requests_seen))
+
+    return app
+
+
+""" Step 3: Run the provider """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip(), formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--email', default='stub.user@example.com')
+    parser.add_argument('--name', default='Stub User')
+    parser.add_argument('--sub', default='100000000000000000001', help='Subject (Google ID) of the user')
+    args = parser.parse_args()
+
+    user = {"sub": args.sub, "email": args.email, "email_verified": True, "name": args.name}
+    create_stub_idp(f"http://{args.host}:{args.port}", user).run(host=args.host, port=args.port)
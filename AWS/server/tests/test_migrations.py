@@ -0,0 +1,157 @@
+""" Tests for the migration runner: ordering, dry runs, autocommit scripts and the advisory lock """
+import pytest
+from services.migrations import MigrationRunner, ADVISORY_LOCK_KEY
+
+
+class StandInConnection:
+    """Records what a runner executes, and with which autocommit setting.
+
+    ``applied`` plays the schema_migrations table; a statement containing
+    ``fail_on`` raises like a failing migration would.
+    """
+
+    def __init__(self, applied=(), fail_on=None, invalid_indexes=()):
+        self.applied = set(applied)
+        self.fail_on = fail_on
+        self.invalid_indexes = set(invalid_indexes)
+        self.autocommit = False
+        self.executed = []  # (sql, params, autocommit)
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((query, params, self.conn.autocommit))
+        if self.conn.fail_on and self.conn.fail_on in query:
+            raise RuntimeError(f"failed: {self.conn.fail_on}")
+        if query == "SELECT version FROM schema_migrations":
+            self._result = [(version,) for version in self.conn.applied]
+        elif query.startswith("SELECT NOT indisvalid"):
+            self._result = [(True,)] if params[0] in self.conn.invalid_indexes else []
+        elif query.startswith("INSERT INTO schema_migrations"):
+            self.conn.applied.add(params[0])
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    (tmp_path / "0002_add_index.sql").write_text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email ON users (email);\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_name ON users (username);\n"
+    )
+    (tmp_path / "0001_create_users.sql").write_text("CREATE TABLE users (id SERIAL PRIMARY KEY);\n")
+    (tmp_path / "0010_add_column.sql").write_text("ALTER TABLE users ADD COLUMN age INTEGER;\n")
+    (tmp_path / "README.md").write_text("not a migration")
+    return tmp_path
+
+
+def runner_for(conn, migrations_dir):
+    return MigrationRunner(lambda: conn, migrations_dir=str(migrations_dir))
+
+
+def statements(conn):
+    return [query for query, _, _ in conn.executed]
+
+
+def test_migrations_are_discovered_in_version_order(migrations_dir):
+    runner = runner_for(StandInConnection(), migrations_dir)
+
+    assert [m.version for m in runner.discover()] == [1, 2, 10]
+
+
+def test_duplicate_versions_are_rejected(migrations_dir):
+    (migrations_dir / "0001_other.sql").write_text("SELECT 1;\n")
+
+    with pytest.raises(ValueError):
+        runner_for(StandInConnection(), migrations_dir).discover()
+
+
+def test_only_pending_migrations_run_under_the_advisory_lock(migrations_dir):
+    conn = StandInConnection(applied={1})
+
+    applied = runner_for(conn, migrations_dir).run()
+
+    assert [m.version for m in applied] == [2, 10]
+    assert conn.executed[0][:2] == ("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+    assert conn.executed[-1][:2] == ("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+    assert not any("CREATE TABLE users" in query for query in statements(conn))
+    assert conn.applied == {1, 2, 10}
+    assert conn.closed
+
+
+def test_dry_run_lists_pending_migrations_without_applying_them(migrations_dir):
+    conn = StandInConnection(applied={1})
+
+    pending = runner_for(conn, migrations_dir).run(dry_run=True)
+
+    assert [m.version for m in pending] == [2, 10]
+    assert conn.applied == {1}
+    assert not any("advisory" in query or "INDEX" in query for query in statements(conn))
+
+
+def test_concurrent_script_runs_statement_by_statement_in_autocommit(migrations_dir):
+    conn = StandInConnection(applied={1, 10}, invalid_indexes={'idx_users_email'})
+
+    runner_for(conn, migrations_dir).run()
+
+    creates = [(query, autocommit) for query, _, autocommit in conn.executed if query.startswith("CREATE INDEX")]
+    assert creates == [
+        ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email ON users (email)", True),
+        ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_name ON users (username)", True),
+    ]
+    # The INVALID leftover of an earlier failed build is dropped before the rerun
+    assert statements(conn).index("DROP INDEX CONCURRENTLY IF EXISTS idx_users_email") < statements(conn).index(creates[0][0])
+    assert conn.commits == 0
+
+
+def test_transactional_script_runs_whole_and_is_committed(migrations_dir):
+    conn = StandInConnection(applied={1, 2})
+
+    runner_for(conn, migrations_dir).run()
+
+    query, _, autocommit = next(entry for entry in conn.executed if entry[0].startswith("ALTER TABLE"))
+    assert query == "ALTER TABLE users ADD COLUMN age INTEGER;\n"
+    assert not autocommit
+    assert conn.commits == 1
+    assert conn.autocommit
+
+
+def test_failed_migration_rolls_back_and_releases_the_lock(migrations_dir):
+    conn = StandInConnection(applied={1, 2}, fail_on="ALTER TABLE")
+
+    with pytest.raises(RuntimeError):
+        runner_for(conn, migrations_dir).run()
+
+    assert conn.rollbacks == 1
+    assert 10 not in conn.applied
+    assert conn.executed[-1][0] == "SELECT pg_advisory_unlock(%s)"
+    assert conn.closed
@@ -0,0 +1,158 @@
+""" Tests for the PostgreSQL connection pool: reuse order, health checks, recycling and fork safety """
+import pytest
+from psycopg2 import extensions
+from services import postgres_rds
+from services.postgres_rds import PostgresConnectionPool, PostgresRDSClient, PoolTimeoutError
+
+
+class StandInConnection:
+    """Enough of a psycopg2 connection for the pool; ``broken`` fails its health check."""
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.broken = False
+        self.autocommit = False
+        self.in_transaction = False
+        self.health_checks = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_INTRANS if self.in_transaction else extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.health_checks += 1
+        if self.conn.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+
+class Connector:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = StandInConnection(len(self.opened) + 1)
+        self.opened.append(conn)
+        return conn
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(postgres_rds.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def make_pool(connect, **options):
+    options = {"min_size": 0, "max_size": 2, "timeout": 0.05, "health_check_interval": 30.0, "max_lifetime": 3600.0, **options}
+    return PostgresConnectionPool(connect, **options)
+
+
+def test_most_recently_returned_connection_is_reused_first(clock):
+    pool = make_pool(Connector())
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+
+    assert pool.getconn() is second
+    assert pool.getconn() is first
+
+
+def test_waiting_for_a_full_pool_times_out():
+    pool = make_pool(Connector(), max_size=1)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+
+def test_connection_idle_past_the_interval_is_health_checked(clock):
+    pool = make_pool(Connector())
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    clock.now += 10
+    assert pool.getconn() is conn and conn.health_checks == 0
+    pool.putconn(conn)
+
+    clock.now += 31
+    assert pool.getconn() is conn and conn.health_checks == 1
+
+
+def test_connection_failing_its_health_check_is_replaced(clock):
+    connect = Connector()
+    pool = make_pool(connect)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    clock.now += 31
+    replacement = pool.getconn()
+
+    assert replacement is not conn and conn.closed
+    assert pool.stats()["size"] == 1
+
+
+def test_connection_past_its_max_lifetime_is_recycled(clock):
+    pool = make_pool(Connector(), max_lifetime=600.0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    clock.now += 601
+    assert pool.getconn() is not conn
+    assert conn.closed
+
+
+def test_returned_connection_is_rolled_back_or_discarded(clock):
+    pool = make_pool(Connector())
+    open_transaction, broken = pool.getconn(), pool.getconn()
+    open_transaction.in_transaction = True
+
+    pool.putconn(open_transaction)
+    pool.putconn(broken, discard=True)
+
+    assert open_transaction.rollbacks == 1 and not open_transaction.closed
+    assert broken.closed
+    assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "max_size": 2}
+
+
+def test_pool_inherited_across_fork_is_rebuilt(monkeypatch):
+    connect = Connector()
+    monkeypatch.setattr(PostgresRDSClient, '_connect', staticmethod(connect))
+    inherited = make_pool(connect)
+    inherited.pid = -1  # created by the parent process
+    monkeypatch.setattr(PostgresRDSClient, '_pool', inherited)
+
+    pool = PostgresRDSClient.get_pool()
+
+    assert pool is not inherited
+    assert PostgresRDSClient.get_pool() is pool
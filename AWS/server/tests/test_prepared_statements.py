@@ -0,0 +1,123 @@
+""" Tests for server-side prepared statements: lazy PREPARE, reuse and recovery after a session reset """
+from contextlib import contextmanager
+import psycopg2.errors
+import pytest
+from services.postgres_rds import PostgresRDSClient
+
+
+class StandInSession:
+    """A pooled connection and the server session behind it.
+
+    ``server`` holds the statements the session has prepared; clearing it
+    plays DISCARD ALL or a pooler handing over a fresh session.
+    """
+
+    def __init__(self):
+        self.prepared = set()  # what the client believes, as on StatementTrackingConnection
+        self.server = set()
+        self.executed = []
+        self.autocommit = True
+        self.closed = False
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class StandInCursor:
+    description = [('value',)]
+
+    def __init__(self, session):
+        self.session = session
+        self._row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.session.executed.append(query)
+        keyword, name = query.split()[:2]
+        if keyword == 'PREPARE':
+            if name in self.session.server:
+                raise psycopg2.errors.DuplicatePreparedStatement(f'prepared statement "{name}" already exists')
+            self.session.server.add(name)
+        elif keyword == 'EXECUTE':
+            if name not in self.session.server:
+                raise psycopg2.errors.InvalidSqlStatementName(f'prepared statement "{name}" does not exist')
+        self._row = (params[0],) if params else None
+
+    def fetchone(self):
+        return self._row
+
+
+@pytest.fixture(autouse=True)
+def own_statements(monkeypatch):
+    # Statements registered here are dropped again after each test
+    monkeypatch.setattr(PostgresRDSClient, '_statements', dict(PostgresRDSClient._statements))
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = StandInSession()
+
+    @contextmanager
+    def connection():
+        yield session
+
+    monkeypatch.setattr(PostgresRDSClient, 'connection', staticmethod(connection))
+    monkeypatch.setattr(PostgresRDSClient, 'prepared_statements_enabled', staticmethod(lambda: True))
+    PostgresRDSClient.register_statement("test_echo", "SELECT %s AS value WHERE %s IS NOT NULL")
+    return session
+
+
+def echo(value):
+    return PostgresRDSClient.execute_prepared("test_echo", (value, value), fetch_one=True)["data"][0]
+
+
+def prepares(session):
+    return [query for query in session.executed if query.startswith('PREPARE')]
+
+
+def test_placeholders_are_numbered_for_prepare():
+    PostgresRDSClient.register_statement("test_numbered", "SELECT %s, %s")
+
+    assert PostgresRDSClient._statements["test_numbered"][1:] == ("SELECT $1, $2", 2)
+
+
+def test_statement_is_prepared_once_per_connection(session):
+    assert echo('a') == 'a'
+    assert echo('b') == 'b'
+
+    assert prepares(session) == ["PREPARE test_echo AS SELECT $1 AS value WHERE $2 IS NOT NULL"]
+    assert session.executed.count("EXECUTE test_echo (%s, %s)") == 2
+
+
+def test_session_reset_prepares_again_and_retries(session):
+    echo('a')
+    session.server.clear()  # DISCARD ALL
+
+    assert echo('b') == 'b'
+    assert len(prepares(session)) == 2
+    assert session.prepared == {'test_echo'}
+
+
+def test_statement_already_on_the_server_is_reused(session):
+    session.server.add('test_echo')  # prepared before this connection lost track of it
+
+    assert echo('a') == 'a'
+    assert session.prepared == {'test_echo'}
+
+
+def test_plain_query_when_prepared_statements_are_off(session, monkeypatch):
+    monkeypatch.setattr(PostgresRDSClient, 'prepared_statements_enabled', staticmethod(lambda: False))
+
+    assert echo('a') == 'a'
+    assert session.executed == ["SELECT %s AS value WHERE %s IS NOT NULL"]
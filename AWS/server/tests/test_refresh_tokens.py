@@ -0,0 +1,122 @@
+""" Tests for refresh-token rotation: single use, replay detection and revoking a family """
+import time
+from datetime import timedelta
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, decode_token
+from services.postgres_rds import PostgresRDSClient
+from models.refresh_token import RefreshToken
+from utils.tokens import issue_tokens
+
+
+class StandInRefreshTokens:
+    """The refresh_tokens table in memory, answering the registered statements as their SQL would."""
+
+    def __init__(self):
+        self.rows = {}  # jti -> dict
+        self.statements = []
+
+    def execute_prepared(self, name, params=None, fetch_one=False, fetch_all=False):
+        self.statements.append(name)
+        if name == "refresh_token_insert":
+            jti, family_id, user_id, expires_at = params
+            self.rows[jti] = dict(family_id=family_id, user_id=user_id, expires_at=expires_at, used=False, revoked=False)
+        elif name == "refresh_token_use":
+            row = self.rows.get(params[0])
+            if row and not row["used"] and not row["revoked"] and row["expires_at"] > time.time():
+                row["used"] = True
+                return {"data": (row["family_id"], row["user_id"]), "columns": ["family_id", "user_id"]}
+        elif name == "refresh_token_revoke_family_of":
+            if params[0] in self.rows:
+                self._revoke("family_id", self.rows[params[0]]["family_id"])
+        elif name == "refresh_token_revoke_family":
+            self._revoke("family_id", params[0])
+        elif name == "refresh_token_revoke_user":
+            self._revoke("user_id", params[0])
+        return None
+
+    def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
+        self.statements.append(query)
+        self.rows = {jti: row for jti, row in self.rows.items() if row["expires_at"] > time.time()}
+
+    def _revoke(self, field, value):
+        for row in self.rows.values():
+            if row[field] == value:
+                row["revoked"] = True
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = StandInRefreshTokens()
+    monkeypatch.setattr(PostgresRDSClient, 'execute_prepared', table.execute_prepared)
+    monkeypatch.setattr(PostgresRDSClient, 'execute_query', table.execute_query)
+    return table
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=15)
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(hours=72)
+    JWTManager(app)
+    with app.app_context():
+        yield app
+
+
+def issue(user_id, family_id=None):
+    """Issue a token pair and return the refresh token's claims."""
+    return decode_token(issue_tokens(user_id, family_id)["refresh_token"])
+
+
+def test_issued_tokens_share_the_recorded_family(app, table):
+    tokens = issue_tokens(7)
+    access, refresh = decode_token(tokens["access_token"]), decode_token(tokens["refresh_token"])
+
+    assert access["fam"] == refresh["fam"]
+    assert table.rows[refresh["jti"]]["family_id"] == refresh["fam"]
+    assert table.rows[refresh["jti"]]["user_id"] == 7
+    assert access["exp"] - access["iat"] == 15 * 60
+
+
+def test_refresh_token_is_redeemed_once_and_the_family_carries_over(app, table):
+    first = issue(7)
+
+    token = RefreshToken.rotate(first["jti"])
+    second = issue(token.user_id, token.family_id)
+
+    assert (token.family_id, token.user_id) == (first["fam"], '7')
+    assert second["fam"] == first["fam"] and second["jti"] != first["jti"]
+    assert RefreshToken.rotate(second["jti"]) is not None
+
+
+def test_replaying_a_used_token_revokes_its_family(app, table):
+    first = issue(7)
+    token = RefreshToken.rotate(first["jti"])
+    second = issue(token.user_id, token.family_id)
+    other_session = issue(7)
+
+    assert RefreshToken.rotate(first["jti"]) is None
+    # The token the legitimate client holds is dead too; other sessions are not
+    assert RefreshToken.rotate(second["jti"]) is None
+    assert RefreshToken.rotate(other_session["jti"]) is not None
+
+
+def test_logout_and_password_reset_end_sessions(app, table):
+    logged_out, kept = issue(7), issue(7)
+    RefreshToken.revoke_family(logged_out["fam"])
+
+    assert RefreshToken.rotate(logged_out["jti"]) is None
+    assert RefreshToken.rotate(kept["jti"]) is not None
+
+    sessions = [issue(7), issue(7)]
+    RefreshToken.revoke_user(7)
+    assert all(RefreshToken.rotate(claims["jti"]) is None for claims in sessions)
+
+
+def test_unknown_or_expired_token_is_rejected(app, table):
+    claims = issue(7)
+    table.rows[claims["jti"]]["expires_at"] = time.time() - 1
+
+    assert RefreshToken.rotate(claims["jti"]) is None
+    assert RefreshToken.rotate('never-issued') is None
@@ -0,0 +1,202 @@
+""" Tests for the two-level user cache and its invalidation """
+import json
+from typing import Optional
+import pytest
+from pydantic import BaseModel
+from utils.cache_backends import InMemoryCacheBackend, set_cache_backend
+from utils.user_cache import UserCache
+
+
+class StandInUser(BaseModel):
+    id: Optional[str] = None
+    username: str
+    email: str
+    password: Optional[str] = None
+
+    @classmethod
+    def from_db_row(cls, row):
+        return cls.model_construct(**row)
+
+
+def make_cache(local_only=True):
+    cache = UserCache(max_size=16, ttl=60, shared_ttl=60, negative_ttl=60, local_only=local_only)
+    cache.register_model(StandInUser)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def no_shared_backend(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    set_cache_backend(None)
+    yield
+    set_cache_backend(None)
+
+
+@pytest.fixture
+def shared_backend():
+    backend = InMemoryCacheBackend()
+    set_cache_backend(backend)
+    return backend
+
+
+alice = StandInUser(id='1', username='alice', email='alice@example.com')
+
+
+def test_put_then_get_by_any_identifier_returns_a_copy():
+    cache = make_cache()
+    cache.put(alice, cache.fill_token())
+
+    for field, value in (('id', '1'), ('email', 'alice@example.com'), ('username', 'alice')):
+        found = cache.get(field, value)
+        assert found == alice
+        assert found is not alice
+    assert cache.stats()["hits"] == 3
+
+
+def test_invalidate_drops_every_key_of_the_user():
+    cache = make_cache()
+    cache.put(alice, cache.fill_token())
+
+    cache.invalidate(email='alice@example.com')
+
+    assert cache.get('id', '1') is None
+    assert cache.get('username', 'alice') is None
+
+
+def test_nothing_is_cached_in_process_without_a_shared_backend_by_default():
+    cache = make_cache(local_only=False)
+    cache.put(alice, cache.fill_token())
+    cache.put_missing('username', 'bob', cache.fill_token())
+
+    assert cache.get('id', '1') is None
+    assert not cache.is_missing('username', 'bob')
+    assert cache.stats()["entries"] == 0
+
+
+def test_shared_backend_enables_the_local_tier_without_opting_in(shared_backend):
+    node_a, node_b = make_cache(local_only=False), make_cache(local_only=False)
+    node_a.put(alice, node_a.fill_token())
+    assert node_a.get('id', '1') == alice
+    assert node_a.stats()["hits"] == 1
+
+    node_b.invalidate(id='1')  # e.g. a password change served by another process
+
+    assert node_a.get('id', '1') is None
+
+
+def test_password_hash_is_kept_out_of_every_level(shared_backend):
+    node_a, node_b = make_cache(), make_cache()
+    node_a.put(alice.model_copy(update={'password': 'hash-1'}), node_a.fill_token())
+
+    assert node_a.get('id', '1').password is None
+    assert node_b.get('id', '1').password is None
+    assert 'password' not in json.loads(shared_backend.get('auth:user:id:1'))["row"]
+
+
+def test_least_recently_used_user_is_evicted():
+    cache = UserCache(max_size=3, ttl=60, local_only=True)
+    cache.register_model(StandInUser)
+    bob = StandInUser(id='2', username='bob', email='bob@example.com')
+    cache.put(alice, cache.fill_token())
+    cache.put(bob, cache.fill_token())  # three keys each, so alice's go
+
+    assert cache.get('id', '1') is None
+    assert cache.get('id', '2') == bob
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    from utils import user_cache as user_cache_module
+    now = [1000.0]
+    monkeypatch.setattr(user_cache_module.time, 'monotonic', lambda: now[0])
+    cache = make_cache()
+    cache.put(alice, cache.fill_token())
+
+    now[0] += 61
+    assert cache.get('id', '1') is None
+
+
+def test_other_node_serves_the_shared_copy(shared_backend):
+    node_a, node_b = make_cache(), make_cache()
+    node_a.put(alice, node_a.fill_token())
+
+    assert node_b.get('username', 'alice') == alice
+    assert node_b.stats()["shared_hits"] == 1
+
+
+def test_version_bump_makes_other_nodes_drop_their_local_copy(shared_backend):
+    node_a, node_b = make_cache(), make_cache()
+    node_a.put(alice, node_a.fill_token())
+    assert node_b.get('id', '1') == alice  # now held locally by node B too
+
+    node_a.invalidate(id='1', username='alice', email='alice@example.com')
+
+    assert node_b.get('id', '1') is None
+    assert node_b.stats()["stale"] == 1
+
+
+def test_shared_entry_from_an_old_version_is_ignored(shared_backend):
+    cache = make_cache()
+    cache.put(alice, cache.fill_token())
+    cache.clear()
+    shared_backend.incr('auth:user:ver:1')  # changed elsewhere without rewriting the row
+
+    assert cache.get('email', 'alice@example.com') is None
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_user_loaded_before_an_invalidation_is_not_stored(shared):
+    set_cache_backend(InMemoryCacheBackend() if shared else None)
+    cache = make_cache()
+    token = cache.fill_token()  # taken before the database read
+    cache.invalidate(id='1', email='alice@example.com')  # e.g. a password change in between
+
+    cache.put(alice, token)
+
+    assert cache.get('id', '1') is None
+    assert cache.stats()["fill_races"] == 1
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_missing_entry_raced_by_a_signup_is_not_stored(shared):
+    set_cache_backend(InMemoryCacheBackend() if shared else None)
+    cache = make_cache()
+    token = cache.fill_token()
+    cache.invalidate(username='bob', email='bob@example.com')  # signup lands during the lookup
+
+    cache.put_missing('username', 'bob', token)
+
+    assert not cache.is_missing('username', 'bob')
+
+
+def test_any_invalidation_voids_shared_missing_entries(shared_backend):
+    node_a, node_b = make_cache(), make_cache()
+    node_a.put_missing('email', 'bob@example.com', node_a.fill_token())
+    assert node_b.is_missing('email', 'bob@example.com')
+
+    node_b.invalidate(username='bob', email='bob@example.com')
+
+    assert not node_a.is_missing('email', 'bob@example.com')
+
+
+def test_batch_lookup_mixes_local_shared_and_missing_users(shared_backend):
+    bob = StandInUser(id='2', username='bob', email='bob@example.com')
+    node_a, node_b = make_cache(), make_cache()
+    node_a.put_many([alice, bob], node_a.fill_token())
+    node_b.put(alice, node_b.fill_token())
+
+    found = node_b.get_many('id', ['1', '2', '3'])
+
+    assert found == {'1': alice, '2': bob}
+    stats = node_b.stats()
+    assert (stats["hits"], stats["shared_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_batch_fill_raced_by_an_invalidation_is_not_stored(shared_backend):
+    cache = make_cache()
+    token = cache.fill_token()
+    cache.invalidate(id='1')
+
+    cache.put_many([alice], token)
+
+    assert cache.get_many('id', ['1']) == {}
@@ -0,0 +1,87 @@
+""" Tests for the projected user queries: which columns each lookup reads and how rows map to models """
+import re
+import pytest
+from services.postgres_rds import PostgresRDSClient
+from utils.cache_backends import set_cache_backend
+from models.user import User, UserCredentials, USER_COLUMNS, PROFILE_COLUMNS, CREDENTIAL_COLUMNS
+
+QUERY = re.compile(r"SELECT (?P<columns>.+?) FROM users WHERE (?P<field>\w+) = (?P<any>ANY\()?%s", re.DOTALL)
+
+
+def columns(projection):
+    """[(source column, result name)] for a column list like USER_COLUMNS."""
+    pairs = []
+    for column in projection.split(','):
+        source, _, alias = column.strip().partition(' AS ')
+        pairs.append((source, alias.strip('"') or source))
+    return pairs
+
+
+class StandInUsersTable:
+    """Answers the registered user statements from rows in memory, projecting them as the SQL would."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute_prepared(self, name, params=None, fetch_one=False, fetch_all=False):
+        self.statements.append(name)
+        match = QUERY.match(PostgresRDSClient._statements[name][0].strip())
+        wanted = params[0] if match['any'] else [params[0]]
+        projection = columns(match['columns'])
+        found = [tuple(row[source] for source, _ in projection) for row in self.rows if row[match['field']] in wanted]
+        if not found:
+            return None
+        names = [name for _, name in projection]
+        return {"data": found[0] if fetch_one else found, "columns": names}
+
+
+@pytest.fixture(autouse=True)
+def no_shared_backend(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    set_cache_backend(None)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    table = StandInUsersTable([
+        dict(id=1, username='alice', email='alice@example.com', password='hash-1', name='Alice', age=30,
+             gender='female', preferred_language='fr', profile_picture='a.png', google_id=None),
+        dict(id=2, username='bob', email='bob@example.com', password=None, name='Bob', age=None,
+             gender=None, preferred_language=None, profile_picture=None, google_id='g-2'),
+    ])
+    monkeypatch.setattr(PostgresRDSClient, 'execute_prepared', table.execute_prepared)
+    return table
+
+
+def test_user_columns_cover_every_model_field():
+    assert {name for _, name in columns(USER_COLUMNS)} == set(User.model_fields)
+    assert {name for _, name in columns(PROFILE_COLUMNS)} == set(User.model_fields) - {'password'}
+
+
+def test_user_lookups_name_their_columns():
+    for name, (query, _, _) in PostgresRDSClient._statements.items():
+        if name.startswith(('user_', 'users_')):
+            assert '*' not in query, name
+
+
+def test_full_lookup_maps_the_aliased_columns(users):
+    user = User.find_by_username('alice')
+
+    assert (user.id, user.email, user.preferredLanguage, user.age) == ('1', 'alice@example.com', 'fr', 30)
+    assert users.statements == ['user_by_username']
+
+
+def test_credentials_lookup_reads_only_what_a_login_needs(users):
+    credentials = User.find_credentials_by_email('alice@example.com')
+
+    assert credentials == UserCredentials('1', 'alice', 'hash-1', 'fr')
+    assert [name for _, name in columns(CREDENTIAL_COLUMNS)] == ['id', 'username', 'password', 'preferred_language']
+    assert User.find_credentials_by_username('nobody') is None
+
+
+def test_batch_lookup_keeps_the_input_order(users):
+    found = User.find_many_by_ids(['2', 'not-a-number', '1', '99'])
+
+    assert [user.username if user else None for user in found] == ['bob', None, 'alice', None]
+    assert users.statements == ['users_by_ids']
@@ -0,0 +1,79 @@
+""" Bloom filter for cheap negative membership checks """
+""" Step 1: Importing required libraries"""
+import math
+import hashlib
+
+""" Step 2: Define the BloomFilter class """
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Sized for ``capacity`` items at a false-positive rate of ``error_rate``.
+    A negative answer is always right; a positive one must be confirmed
+    against the real store. The bit positions come from double hashing of a
+    single blake2b digest.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def expected_error_rate(self):
+        """False-positive rate for the number of items added so far."""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class CountingBloomFilter(BloomFilter):
+    """Bloom filter with an 8-bit counter per position instead of a bit, so items can be removed.
+
+    It takes eight times the memory of a BloomFilter of the same capacity.
+    A counter that reaches 255 stays there, since its true count is no
+    longer known; removing an item that was never added can cause false
+    negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        super().__init__(capacity, error_rate)
+        self._bits = None
+        self._counters = bytearray(self.size)
+
+    def add(self, item):
+        for position in self._positions(item):
+            if self._counters[position] < 255:
+                self._counters[position] += 1
+        self.count += 1
+
+    def remove(self, item):
+        """Remove an added item; returns False if the filter doesn't contain it."""
+        positions = self._positions(item)
+        if not all(self._counters[position] for position in positions):
+            return False
+        for position in positions:
+            if self._counters[position] < 255:
+                self._counters[position] -= 1
+        self.count -= 1
+        return True
+
+    def __contains__(self, item):
+        return all(self._counters[position] for position in self._positions(item))
+
+    def memory_bytes(self):
+        return len(self._counters)
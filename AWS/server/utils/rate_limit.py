@@ -0,0 +1,181 @@
+""" Rate limiting for the authentication routes """
+""" Step 1: Importing required libraries"""
+import os
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request, jsonify
+from dotenv import load_dotenv
+from utils.cache_backends import get_cache_backend
+from utils.metrics import register_metrics
+
+load_dotenv()
+
+""" Step 2: Define the stores """
+class InMemoryRateLimitStore:
+    """Token buckets in process memory; limits are per worker process.
+
+    A bucket holds up to ``limit`` tokens and refills at ``limit / period``
+    tokens per second, so bursts are allowed up to the limit and the average
+    rate can't exceed it. Only the ``max_keys`` most recently seen keys are
+    kept, so a flood of distinct IPs or identifiers can't grow memory without
+    bound; an evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        """Take a token; returns 0 if allowed, else the seconds until one is available."""
+        rate = limit / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit, now))
+            tokens = min(limit, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def size(self):
+        return len(self._buckets)
+
+
+class CacheRateLimitStore:
+    """Sliding-window counters in the shared cache backend (CACHE_BACKEND); limits hold across processes and nodes.
+
+    The backend only offers atomic increments, so instead of a token bucket
+    each key counts hits per fixed window and the rate over the last
+    ``period`` seconds is estimated as the current window's count plus the
+    previous window's, weighted by how much of it still overlaps.
+    """
+    PREFIX = 'auth:ratelimit'
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, limit, period):
+        """Count a hit; returns 0 if allowed, else the seconds until the estimate drops below the limit."""
+        now = time.time()
+        window = int(now // period)
+        elapsed = (now % period) / period
+        current = self.backend.incr(f"{self.PREFIX}:{key}:{window}", ttl=2 * period)
+        previous = int(self.backend.get(f"{self.PREFIX}:{key}:{window - 1}") or 0)
+        if previous * (1 - elapsed) + current <= limit:
+            return 0.0
+        room = limit - 1  # one more hit fits once the estimate is down to this
+        if current <= room:
+            # The previous window's weight has to decay enough
+            return (1 - (room - current) / previous - elapsed) * period
+        # Not within this window; in the next one its weight has to decay enough
+        return (2 - elapsed - room / current) * period
+
+    def size(self):
+        return None  # Not tracked by the backend
+
+
+""" Step 3: Define the RateLimiter class """
+class RateLimiter:
+    """Allows ``limit`` hits per ``period`` seconds for each key (an IP, an identifier...)."""
+
+    def __init__(self, name, limit, period, store):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.store = store
+        self._stats_lock = threading.Lock()
+        self._stats = {"checks": 0, "rejected": 0}
+
+    def hit(self, key):
+        """Record a request for key; returns 0 if it may proceed, else the seconds to wait."""
+        # Keys are hashed so identifiers aren't stored as given and every key has the same size
+        digest = hashlib.blake2b(f"{self.name}:{key}".encode(), digest_size=16).hexdigest()
+        retry_after = self.store.hit(digest, self.limit, self.period)
+        with self._stats_lock:
+            self._stats["checks"] += 1
+            if retry_after:
+                self._stats["rejected"] += 1
+        return retry_after
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["limit"] = f"{self.limit}/{self.period:g}s"
+        stats["keys"] = self.store.size()
+        return stats
+
+
+""" Step 4: Create the configured limiters """
+def create_store(kind):
+    if kind == 'memory':
+        return InMemoryRateLimitStore(int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000)))
+    if kind == 'cache':
+        backend = get_cache_backend()
+        if backend is None:
+            raise ValueError("RATE_LIMIT_STORE=cache requires CACHE_BACKEND")
+        return CacheRateLimitStore(backend)
+    raise ValueError(f"Unknown RATE_LIMIT_STORE '{kind}'")
+
+
+def create_limiter(name, env_var, default):
+    """Build a limiter from a "<hits>/<seconds>" setting; an empty setting or 0 hits disables it."""
+    setting = os.getenv(env_var, default).strip()
+    if not setting or os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'true':
+        return None
+    limit, period = setting.split('/')
+    if int(limit) <= 0:
+        return None
+    limiter = RateLimiter(name, int(limit), float(period), _store)
+    _limiters.append(limiter)
+    return limiter
+
+
+def client_ip():
+    """The caller's address; with RATE_LIMIT_TRUSTED_PROXIES=n it is read from X-Forwarded-For as set by the last n proxies."""
+    trusted_proxies = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))
+    if trusted_proxies:
+        forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',') if address.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.remote_addr or 'unknown'
+
+
+def check_limits(*checks):
+    """Hit each (limiter, key) pair in order; returns the first non-zero wait, or 0 if all allow the request.
+
+    Disabled limiters (None) and empty keys are skipped. Later limiters are not
+    hit once one rejects, so a blocked IP doesn't use up an identifier's budget.
+    """
+    for limiter, key in checks:
+        if limiter is None or not key:
+            continue
+        retry_after = limiter.hit(key)
+        if retry_after:
+            return retry_after
+    return 0
+
+
+def rate_limited_response(retry_after):
+    response = jsonify({"error": "Too many requests, please try again later"})
+    response.headers['Retry-After'] = str(max(int(math.ceil(retry_after)), 1))
+    return response, 429
+
+
+_store = create_store(os.getenv('RATE_LIMIT_STORE', 'memory').lower())
+_limiters = []
+
+login_ip_limiter = create_limiter("login_ip", 'RATE_LIMIT_LOGIN_IP', '30/60')
+login_identifier_limiter = create_limiter("login_identifier", 'RATE_LIMIT_LOGIN_IDENTIFIER', '10/300')
+reset_ip_limiter = create_limiter("reset_ip", 'RATE_LIMIT_RESET_IP', '10/600')
+reset_email_limiter = create_limiter("reset_email", 'RATE_LIMIT_RESET_EMAIL', '3/3600')
+
+register_metrics("rate_limits", lambda: {limiter.name: limiter.stats() for limiter in _limiters})
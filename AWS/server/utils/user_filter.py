@@ -0,0 +1,286 @@
+""" Existence filter over usernames and emails, for answering "no such user" without a query """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from services.postgres_rds import PostgresRDSClient
+from utils.bloom import CountingBloomFilter
+from utils.cache_backends import get_cache_backend
+from utils.metrics import register_metrics
+
+load_dotenv()
+
+""" Step 2: Define the source """
+class PostgresUserIdentifiers:
+    """Usernames and emails from the users table, read in id order.
+
+    Positions are user ids. Reading "after" a position re-reads the last
+    ``overlap`` ids too: ids are handed out when a row is inserted, not when
+    it commits, so a row can become visible after one with a higher id.
+    """
+
+    def __init__(self, overlap=100):
+        self.overlap = overlap
+
+    def overlaps(self, position, last):
+        """Return True if reading after last can return position again."""
+        return position > last - self.overlap
+
+    def iter_after(self, position=None, batch_size=5000):
+        """Yield (position, username, email) for every user, or for users added after position."""
+        query, params = "SELECT id, username, email FROM users", None
+        if position is not None:
+            query, params = query + " WHERE id > %s", (position - self.overlap,)
+        for result in PostgresRDSClient.iter_query(query + " ORDER BY id", params, batch_size=batch_size):
+            for user_id, username, email in result["data"]:
+                yield user_id, username, email
+
+
+""" Step 3: Define the UserFilter class """
+class UserFilter:
+    """Counting Bloom filter of every username and email, answering "might this user exist?".
+
+    A False from might_exist is definite, so lookups of identifiers nobody
+    has skip the database; True means the lookup must still be made. A
+    background thread (start) builds the filter, reads the users added since
+    (by any node or import) every ``refresh`` seconds, and rebuilds it from
+    scratch every ``rebuild_interval`` seconds, or sooner when
+    rebuild_user_filter.py asks for it through the shared cache backend.
+
+    Signups made here are added at once and also marked in the shared backend
+    for a while, so other nodes find them before their next read of the store;
+    for that reason the filter only answers False when a shared backend
+    (CACHE_BACKEND) is configured, and only while its last read of the store
+    is at most ``3 * refresh`` seconds old. Users added by imports are seen
+    after the next read. Otherwise, and until the filter is built, every
+    lookup goes to the database.
+    """
+    GENERATION_KEY = 'auth:user_filter:generation'
+    ADDED_PREFIX = 'auth:user_filter:added'
+
+    def __init__(self, source, capacity=0, error_rate=0.01, refresh=5.0, rebuild_interval=3600.0):
+        self.source = source
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh = refresh
+        self.rebuild_interval = rebuild_interval
+        self.max_age = 3 * refresh
+        self._filter = None
+        self._position = None  # last position read from the source
+        self._seen = set()  # positions counted that a read of the store could return again
+        self._generation = None  # rebuild generation in the shared backend when last built
+        self._recent = None  # (position, items) added here while a rebuild reads the store
+        self._read_at = None  # when the last read of the store that the filter reflects started
+        self._rebuild_at = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checks": 0, "negatives": 0, "false_positives": 0, "unavailable": 0,
+            "recently_added": 0, "rebuilds": 0, "refreshes": 0, "errors": 0,
+        }
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    @staticmethod
+    def _items(username=None, email=None):
+        return [f"{field}:{value}" for field, value in (('username', username), ('email', email)) if value]
+
+    def add(self, position, username=None, email=None):
+        """Record the identifiers of a user just added at position (its id)."""
+        if not self.enabled:
+            return
+        items = self._items(username, email)
+        backend = get_cache_backend()
+        if backend is not None:
+            try:
+                backend.set_many({f"{self.ADDED_PREFIX}:{item}": '1' for item in items}, ttl=2 * self.max_age)
+            except Exception as e:
+                logging.error(f"Failed to publish new user to other nodes: {str(e)}")
+        with self._lock:
+            if self._recent is not None:
+                self._recent.append((position, items))
+            if self._filter is not None:
+                self._add_user(self._filter, self._seen, position, items)
+
+    def remove(self, username=None, email=None):
+        """Forget a deleted user's identifiers."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._filter is not None:
+                for item in self._items(username, email):
+                    self._filter.remove(item)
+
+    @staticmethod
+    def _add_user(bloom, seen, position, items):
+        # Reads of the store overlap, so a user already counted isn't counted again
+        if position in seen:
+            return
+        seen.add(position)
+        for item in items:
+            bloom.add(item)
+
+    def might_exist(self, field, value):
+        """Return False only if no user has this username or email."""
+        if not self.enabled or not value:
+            return True
+        self._count("checks")
+        bloom, read_at = self._filter, self._read_at
+        backend = get_cache_backend()
+        if bloom is None or backend is None or read_at is None or time.monotonic() - read_at > self.max_age:
+            self._count("unavailable")
+            return True
+        item = f"{field}:{value}"
+        if item in bloom:
+            return True
+        try:
+            # Added on another node since this one last read the store?
+            added = backend.get(f"{self.ADDED_PREFIX}:{item}") is not None
+        except Exception as e:
+            logging.warning(f"Shared cache unavailable for the user filter: {str(e)}")
+            self._count("unavailable")
+            return True
+        if added:
+            self._count("recently_added")
+            return True
+        self._count("negatives")
+        return False
+
+    def report_false_positive(self):
+        """Call when a lookup might_exist let through found no user."""
+        if self._filter is not None:
+            self._count("false_positives")
+
+    def start(self, app):
+        """Start the thread that builds and refreshes the filter for this process (once)."""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        if get_cache_backend() is None:
+            logging.warning("USER_FILTER_CAPACITY is set but CACHE_BACKEND is none; every lookup will go to the database")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="user-filter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, app):
+        """Keep the filter current until stop() is called."""
+        while not self._stopping.is_set():
+            with app.app_context():
+                self._update()
+            self._stopping.wait(self.refresh)
+
+    def _update(self):
+        try:
+            generation = self._shared_generation()
+            if self._filter is None or time.monotonic() >= self._rebuild_at or generation != self._generation:
+                self.rebuild()
+            self._catch_up()
+        except Exception as e:
+            # Without a current filter every lookup goes to the database
+            logging.error(f"Failed to update user filter: {str(e)}")
+            self._count("errors")
+            with self._lock:
+                self._filter = None
+
+    def _shared_generation(self):
+        backend = get_cache_backend()
+        return backend.get(self.GENERATION_KEY) if backend is not None else None
+
+    def rebuild(self):
+        """Build a new filter from every user in the store and start using it."""
+        generation = self._shared_generation()
+        read_at = time.monotonic()
+        with self._lock:
+            self._recent = []
+        try:
+            bloom = CountingBloomFilter(self.capacity, self.error_rate)
+            position, window = None, deque()  # positions read that a later read could return again
+            for position, username, email in self.source.iter_after(None):
+                for item in self._items(username, email):
+                    bloom.add(item)
+                window.append(position)
+                while not self.source.overlaps(window[0], position):
+                    window.popleft()
+            seen = set(window)
+            with self._lock:
+                # Signups that landed while the store was being read; older ones were read with it
+                for recent_position, items in self._recent:
+                    if position is None or self.source.overlaps(recent_position, position):
+                        self._add_user(bloom, seen, recent_position, items)
+                self._filter, self._position, self._seen = bloom, position, seen
+                self._read_at = read_at
+        finally:
+            with self._lock:
+                self._recent = None
+        self._generation = generation
+        self._rebuild_at = time.monotonic() + self.rebuild_interval
+        self._count("rebuilds")
+        if bloom.count > bloom.capacity:
+            logging.warning(f"User filter holds {bloom.count} identifiers, over its capacity of {bloom.capacity}; raise USER_FILTER_CAPACITY")
+        return bloom
+
+    def _catch_up(self):
+        read_at = time.monotonic()
+        position = self._position
+        for position, username, email in self.source.iter_after(self._position):
+            items = self._items(username, email)
+            with self._lock:
+                self._add_user(self._filter, self._seen, position, items)
+        with self._lock:
+            if position is not None:
+                self._seen = {seen for seen in self._seen if self.source.overlaps(seen, position)}
+            self._position = position
+            self._read_at = read_at
+        self._count("refreshes")
+
+    def request_rebuild(self):
+        """Make every node rebuild its filter on its next refresh; returns False without a shared backend."""
+        backend = get_cache_backend()
+        if backend is None:
+            return False
+        backend.incr(self.GENERATION_KEY)
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        # Share of lookups for identifiers nobody has that the filter let through
+        absent = stats["negatives"] + stats["false_positives"]
+        stats["observed_false_positive_rate"] = stats["false_positives"] / absent if absent else 0.0
+        bloom = self._filter
+        stats["ready"] = bloom is not None
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        if bloom is not None:
+            stats["entries"] = bloom.count
+            stats["capacity"] = bloom.capacity
+            stats["memory_bytes"] = bloom.memory_bytes()
+            stats["expected_false_positive_rate"] = bloom.expected_error_rate()
+        if self._read_at is not None:
+            stats["age_seconds"] = time.monotonic() - self._read_at
+        return stats
+
+
+""" Step 4: Create the configured filter """
+user_filter = UserFilter(
+    PostgresUserIdentifiers(int(os.getenv('USER_FILTER_OVERLAP', 100))),
+    capacity=int(os.getenv('USER_FILTER_CAPACITY', 0)),
+    error_rate=float(os.getenv('USER_FILTER_ERROR_RATE', 0.01)),
+    refresh=float(os.getenv('USER_FILTER_REFRESH', 5)),
+    rebuild_interval=float(os.getenv('USER_FILTER_REBUILD_INTERVAL', 3600))
+)
+register_metrics("user_filter", user_filter.stats)
@@ -0,0 +1,33 @@
+""" Report missing MongoDB indexes and confirm the hot queries use them. """
+
+""" Step 1: Import required libraries """
+import argparse
+import json
+import sys
+from services.azure_mongodb import MongoDBClient
+
+""" Step 2: Run the check """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--create', action='store_true', help='Create missing indexes before checking')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    if args.create:
+        MongoDBClient.ensure_indexes(db)
+    report = MongoDBClient.check_indexes(db)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for coll_name, index_name in report["missing"]:
+            print(f"MISSING  {coll_name}.{index_name}")
+        for query in report["queries"]:
+            status = "OK      " if query["uses_index"] else "NO INDEX"
+            detail = query.get("error") or f"{' > '.join(query['stages'])} via {', '.join(query['indexes']) or '-'}"
+            print(f"{status} {query['collection']}.{query['query']}: {detail}")
+
+    # Non-zero exit lets deploy pipelines fail on a missing index
+    healthy = not report["missing"] and all(query["uses_index"] for query in report["queries"])
+    sys.exit(0 if healthy else 1)
@@ -0,0 +1,177 @@
+""" Bulk-import users from a CSV or NDJSON file. """
+
+""" Step 1: Import required libraries """
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+import email_validator
+from pydantic import ValidationError
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from models.user import User
+from services.azure_mongodb import MongoDBClient
+from utils.hashing_pool import HashingPool, HashingPoolSaturated
+from utils.password_hasher import hash_password, get_hash_method
+
+""" Step 2: Define the import helpers """
+def read_rows(path, fmt):
+    """Yield (line number, row) pairs one at a time; row is None if it can't be parsed."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Empty cells mean the field is not set
+                yield reader.line_num, {key: value for key, value in row.items() if value not in ('', None)}
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def validate_chunk(chunk):
+    """Validate rows with the User model; return (line, user) pairs and (line, reason) rejects."""
+    users, rejected = [], []
+    seen = set()
+    for line_number, row in chunk:
+        if not isinstance(row, dict):
+            rejected.append((line_number, "not a JSON object"))
+            continue
+        row.pop('id', None)
+        try:
+            user = User(**row)
+        except ValidationError as ve:
+            reason = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in ve.errors())
+            rejected.append((line_number, reason))
+            continue
+        # Repeats within a chunk would be indistinguishable once inserted
+        if ('username', user.username) in seen or ('email', user.email) in seen:
+            rejected.append((line_number, "duplicate username or email in file"))
+            continue
+        seen.update({('username', user.username), ('email', user.email)})
+        users.append((line_number, user))
+    return users, rejected
+
+
+def hash_passwords(passwords, prehashed=False):
+    """Hash a chunk of passwords across the hashing pool; None stays None (OAuth users)."""
+    if prehashed:
+        return list(passwords)
+    method = get_hash_method()
+    if HashingPool.workers() == 0:
+        return [hash_password(password, method) if password else None for password in passwords]
+    futures = []
+    for password in passwords:
+        while password:
+            try:
+                futures.append(HashingPool.submit(hash_password, password, method))
+                break
+            except HashingPoolSaturated:
+                continue  # This command is the pool's only client; wait for a slot
+        else:
+            futures.append(None)
+    return [future.result() if future else None for future in futures]
+
+
+# Cosmos DB's "request rate is large"; the message carries RetryAfterMs
+THROTTLED = 16500
+
+
+def is_throttled(error):
+    return error.get('code') == THROTTLED or 'RetryAfterMs=' in error.get('errmsg', '')
+
+
+def load_chunk(db, users, hashes):
+    """Insert a chunk with an unordered bulk write and return {position: reason} for the rows rejected.
+
+    Only throttled rows are retried; duplicates and other write errors (e.g.
+    document validation) won't succeed on a retry and are reported instead.
+    """
+    documents = [
+        dict(user.model_dump(exclude={'id'}, exclude_none=True), password=password_hash)
+        for user, password_hash in zip(users, hashes)
+    ]
+    for document in documents:
+        if document['password'] is None:
+            del document['password']
+    pending = list(range(len(documents)))
+    rejected = {}
+
+    def bulk_write_operation():
+        batch = list(pending)
+        try:
+            db.users.bulk_write([InsertOne(documents[i]) for i in batch], ordered=False)
+            pending.clear()
+        except BulkWriteError as e:
+            throttled = set()
+            for error in e.details.get('writeErrors', []):
+                position = batch[error['index']]
+                if error.get('code') == 11000:
+                    rejected[position] = "username or email already exists"
+                elif is_throttled(error):
+                    throttled.add(position)
+                else:
+                    rejected[position] = f"write error {error.get('code')}: {error.get('errmsg', '')}"
+            pending[:] = [i for i in batch if i in throttled]
+            if pending:
+                raise
+
+    MongoDBClient.execute_with_retries(bulk_write_operation)
+    return rejected
+
+
+""" Step 3: Run the import """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('path', help='CSV (with a header row) or NDJSON file of users')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated, hashed and loaded together')
+    parser.add_argument('--prehashed', action='store_true', help='Passwords are already hashed; store them as-is')
+    parser.add_argument('--rejects', help='Write rejected rows (line and reason) to this NDJSON file')
+    parser.add_argument('--check-deliverability', action='store_true',
+                        help='Look up each email domain in DNS while validating (slow)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    if not args.check_deliverability:
+        email_validator.CHECK_DELIVERABILITY = False
+
+    rejects_file = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    read = imported = rejected = 0
+    started_at = time.perf_counter()
+    try:
+        for chunk in chunked(read_rows(args.path, fmt), args.chunk_size):
+            users, rejects = validate_chunk(chunk)
+            hashes = hash_passwords([user.password for _, user in users], args.prehashed)
+            failed = load_chunk(db, [user for _, user in users], hashes)
+            rejects += [(users[i][0], reason) for i, reason in sorted(failed.items())]
+
+            read += len(chunk)
+            imported += len(users) - len(failed)
+            rejected += len(rejects)
+            if rejects_file:
+                for line_number, reason in rejects:
+                    rejects_file.write(json.dumps({"line": line_number, "reason": reason}) + "\n")
+            elapsed = time.perf_counter() - started_at
+            print(f"{read} rows read, {imported} imported, {rejected} rejected ({read / elapsed:.0f} rows/s)")
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    elapsed = time.perf_counter() - started_at
+    print(f"Imported {imported} of {read} users in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} users/s); "
+          f"{rejected} rejected")
+    sys.exit(1 if rejected else 0)
@@ -0,0 +1,45 @@
+""" Deliver queued mail from the outbox, for deployments that set MAIL_OUTBOX_SENDER=off in the web processes.
+
+For local testing, run an SMTP sink that prints every message it receives:
+    pip install aiosmtpd && python -m aiosmtpd -n -l localhost:8025
+and set MAIL_SERVER=localhost, MAIL_PORT=8025, MAIL_USE_TLS=false.
+"""
+
+""" Step 1: Import required libraries """
+import argparse
+import os
+import logging
+
+# This process is the sender; keep create_app from starting another one
+os.environ['MAIL_OUTBOX_SENDER'] = 'off'
+
+from app import create_app
+from utils.mail_outbox import mail_outbox
+
+""" Step 2: Define the worker """
+def drain(app):
+    """Send every message that is due now; returns how many were claimed."""
+    total = 0
+    with app.app_context():
+        while True:
+            claimed = mail_outbox.drain_once()
+            if not claimed:
+                return total
+            total += claimed
+
+
+""" Step 3: Run the worker """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip(), formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='Send what is due and exit')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.once:
+        claimed = drain(app)
+        print(f"Processed {claimed} messages: {mail_outbox.stats()}")
+    else:
+        try:
+            mail_outbox.run(app)
+        except KeyboardInterrupt:
+            logging.info("Mail outbox sender stopped")
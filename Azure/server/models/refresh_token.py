@@ -0,0 +1,64 @@
+"""This module defines the server-side record of issued refresh tokens."""
+""" Step 1: Import required libraries """
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from services.azure_mongodb import MongoDBClient
+
+""" Step 2: Define the RefreshToken model """
+class RefreshToken:
+    """A refresh token that was redeemed; its family and user carry over to the next one.
+
+    Tokens live in the refresh_tokens collection, keyed by jti; the TTL index
+    in REQUIRED_INDEXES deletes them once they have expired.
+    """
+    COLLECTION = 'refresh_tokens'
+
+    def __init__(self, family_id, user_id):
+        self.family_id = family_id
+        self.user_id = user_id
+
+    @staticmethod
+    def _collection():
+        return MongoDBClient.get_client()[MongoDBClient.get_db_name()][RefreshToken.COLLECTION]
+
+    # Define a class method to record a newly issued refresh token
+    @classmethod
+    def create(cls, jti, family_id, user_id, expires_at):
+        cls._collection().insert_one({
+            "_id": jti,
+            "family_id": family_id,
+            "user_id": str(user_id),
+            "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc),
+            "used_at": None,
+            "revoked": False,
+        })
+
+    # Define a class method to redeem a refresh token exactly once. Presenting
+    # a token that was already used means it leaked (or the client replayed
+    # it), so every token of its family is revoked and None is returned
+    @classmethod
+    def rotate(cls, jti):
+        now = datetime.now(timezone.utc)
+        # Marking a token used is the rotation itself: of two concurrent refreshes only one matches
+        document = cls._collection().find_one_and_update(
+            {"_id": jti, "used_at": None, "revoked": False, "expires_at": {"$gt": now}},
+            {"$set": {"used_at": now}},
+            projection={"family_id": 1, "user_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if document:
+            return cls(document["family_id"], document["user_id"])
+        document = cls._collection().find_one({"_id": jti}, projection={"family_id": 1})
+        if document:
+            cls.revoke_family(document["family_id"])
+        return None
+
+    # Define a class method to end one session (e.g. on logout)
+    @classmethod
+    def revoke_family(cls, family_id):
+        cls._collection().update_many({"family_id": family_id, "revoked": False}, {"$set": {"revoked": True}})
+
+    # Define a class method to end every session of a user (e.g. on password reset)
+    @classmethod
+    def revoke_user(cls, user_id):
+        cls._collection().update_many({"user_id": str(user_id), "revoked": False}, {"$set": {"revoked": True}})
@@ -2,10 +2,14 @@
 """ Step 1: Import required libraries """
 from pydantic import BaseModel, EmailStr, Field, field_validator, validator
 from services.azure_mongodb import MongoDBClient
+from utils.user_cache import user_cache
 from bson import ObjectId
 from email_validator import validate_email, EmailNotValidError
 from typing import Optional
 
+# Fields a login reads; the full document is never needed to check a password
+CREDENTIAL_FIELDS = {"username": 1, "password": 1, "preferredLanguage": 1}
+
 """ Step 2: Define the User model """
 class User(BaseModel):
     id: str = None
@@ -51,15 +55,29 @@ class User(BaseModel):
         except EmailNotValidError as e:
             raise ValueError(str(e))
 
+    # Build a User from a stored document without re-running the validators;
+    # documents were validated when they were inserted, so this only maps the ID
+    @classmethod
+    def from_db_row(cls, document):
+        fields = {name: document[name] for name in cls.model_fields if name in document}
+        if '_id' in document:
+            fields['id'] = str(document['_id'])
+        return cls.model_construct(**fields)
+
     # Define a class method to find a user by username
     @classmethod
     def find_by_username(cls, username):
+        cached = user_cache.get('username', username)
+        if cached:
+            return cached
         db_client = MongoDBClient.get_client()
         db = db_client[MongoDBClient.get_db_name()]
+        token = user_cache.fill_token()
         user_data = db.users.find_one({"username": username})  # 'users' is the collection name
         if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
+            user = cls.from_db_row(user_data)
+            user_cache.put(user, token)
+            return user
         return None
     
     # Define a class method to find a user by email
@@ -67,27 +85,89 @@ class User(BaseModel):
     def update_password(cls, username, new_hashed_password):
         db_client = MongoDBClient.get_client()
         db = db_client[MongoDBClient.get_db_name()]
-        result = db.users.update_one({"username": username}, {"$set": {"password": new_hashed_password}})
-        return result.modified_count == 1
+        result = db.users.find_one_and_update(
+            {"username": username}, {"$set": {"password": new_hashed_password}}, projection={"_id": 1}
+        )
+        # Invalidating by id also bumps the shared version seen by every node
+        user_cache.invalidate(id=str(result['_id']) if result else None, username=username)
+        return result is not None
     
     # Define a class method to find a user by ID
     @classmethod
     def find_by_id(cls, user_id):
+        cached = user_cache.get('id', user_id)
+        if cached:
+            return cached
         db_client = MongoDBClient.get_client()
         db = db_client[MongoDBClient.get_db_name()]
+        token = user_cache.fill_token()
         user_data = db.users.find_one({"_id": ObjectId(user_id)})
         if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
+            user = cls.from_db_row(user_data)
+            user_cache.put(user, token)
+            return user
         return None
     
     # Define a class method to find a user by email
     @classmethod
     def find_by_email(cls, email):
+        cached = user_cache.get('email', email)
+        if cached:
+            return cached
         db_client = MongoDBClient.get_client()
         db = db_client[MongoDBClient.get_db_name()]
+        token = user_cache.fill_token()
         user_data = db.users.find_one({"email": email})
         if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
-        return None
\ No newline at end of file
+            user = cls.from_db_row(user_data)
+            user_cache.put(user, token)
+            return user
+        return None
+
+    # Define class methods to fetch only the credentials needed to log in;
+    # these always read the database, as the cache never holds password hashes
+    @classmethod
+    def find_credentials_by_username(cls, username):
+        return cls._find_credentials({"username": username})
+
+    @classmethod
+    def find_credentials_by_email(cls, email):
+        return cls._find_credentials({"email": email})
+
+    @classmethod
+    def _find_credentials(cls, query):
+        db_client = MongoDBClient.get_client()
+        db = db_client[MongoDBClient.get_db_name()]
+        user_data = db.users.find_one(query, projection=CREDENTIAL_FIELDS)
+        return cls.from_db_row(user_data) if user_data else None
+
+    # Define class methods to find many users in one round-trip; the results
+    # follow the input order, with None for each value that matched no user
+    @classmethod
+    def find_many_by_ids(cls, user_ids):
+        ids = {str(user_id): ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)}
+        users = cls._find_many('id', ids, '_id')
+        return [users.get(str(user_id)) for user_id in user_ids]
+
+    @classmethod
+    def find_many_by_emails(cls, emails):
+        users = cls._find_many('email', {email: email for email in emails}, 'email')
+        return [users.get(email) for email in emails]
+
+    # Serve what the cache holds and fetch the rest with a single $in query;
+    # keys maps each lookup key to the value sent to the database
+    @classmethod
+    def _find_many(cls, field, keys, db_field):
+        users = user_cache.get_many(field, keys)
+        missing = [value for key, value in keys.items() if key not in users]
+        if missing:
+            db_client = MongoDBClient.get_client()
+            db = db_client[MongoDBClient.get_db_name()]
+            token = user_cache.fill_token()
+            found = [cls.from_db_row(user_data) for user_data in db.users.find({db_field: {"$in": missing}})]
+            user_cache.put_many(found, token)
+            users.update({str(getattr(user, field)): user for user in found})
+        return users
+
+
+user_cache.register_model(User)
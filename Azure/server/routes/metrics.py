@@ -0,0 +1,16 @@
+"""This module exposes in-process performance metrics"""
+
+""" Step 1: Importing required libraries"""
+from flask import Blueprint, jsonify
+from utils.metrics import collect_metrics
+
+"""Step 2: Creating a blueprint for the metrics routes"""
+metrics_routes = Blueprint("metrics", __name__)
+
+
+"""Step 3: Defining routes"""
+
+# Route returning a snapshot of every registered metrics provider
+@metrics_routes.get('/metrics')
+def metrics():
+    return jsonify(collect_metrics()), 200
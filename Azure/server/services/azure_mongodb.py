@@ -10,12 +10,18 @@ Methods:
     clear_collections(db, collection_names): Clears the specified collections in the given database.
     load_products(db, dataset, Model, coll_name): Loads products into the specified collection from a dataset URL, using the provided model for validation.
     execute_with_retries(operation, max_retries=5): Executes a given operation with retries, handling specific MongoDB write errors and retrying with exponential backoff.
+    ensure_indexes(db): Creates the indexes listed in REQUIRED_INDEXES one by one; returns those that failed. Safe to call on every startup.
+    unique_user_indexes_present(db): Returns True once the unique username and email indexes signup relies on exist.
+    check_indexes(db): Reports missing required indexes and runs explain() on the hot lookup queries.
+    duplicate_key_fields(error): Returns the fields whose unique index a DuplicateKeyError violated.
+    iter_collection(db, coll_name, query, projection, batch_size): Yields the matching documents in batches, paging by _id so memory stays bounded.
 """
 
 """ Step 1: Import required libraries """
 import os
 import time
 import random
+import re
 import logging
 import requests
 import pymongo
@@ -30,10 +36,48 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-""" Step 3: Define the MongoDBClient class and its methods """
+""" Step 3: Define the indexes the application relies on """
+# Index specs per collection, passed to create_index; names are fixed so they can be checked
+REQUIRED_INDEXES = {
+    "users": [
+        {"name": "username_1", "keys": [("username", 1)], "unique": True},
+        {"name": "email_1", "keys": [("email", 1)], "unique": True},
+        # Password users have no google_id, so only documents that set one are indexed
+        {"name": "google_id_1", "keys": [("google_id", 1)], "unique": True,
+         "partialFilterExpression": {"google_id": {"$exists": True}}},
+    ],
+    # Revoked JWTs are deleted by the TTL monitor once the token has expired
+    "revoked_tokens": [
+        {"name": "expires_at_ttl", "keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    # Refresh tokens are looked up by family (rotation, logout) and user (password reset)
+    "refresh_tokens": [
+        {"name": "family_id_1", "keys": [("family_id", 1)]},
+        {"name": "user_id_1", "keys": [("user_id", 1)]},
+        {"name": "expires_at_ttl", "keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    # Senders look up due messages; sent ones are kept for a week
+    "mail_outbox": [
+        {"name": "sent_at_1_next_attempt_at_1", "keys": [("sent_at", 1), ("next_attempt_at", 1)]},
+        {"name": "sent_at_ttl", "keys": [("sent_at", 1)], "expireAfterSeconds": 7 * 86400},
+    ],
+}
+
+# Signup relies on these to reject duplicate usernames and emails
+UNIQUE_USER_INDEXES = ("username_1", "email_1")
+
+# (collection, description, sample filter) for the lookups on the request path
+HOT_QUERIES = [
+    ("users", "find_by_username", {"username": "__index_check__"}),
+    ("users", "find_by_email", {"email": "__index_check__"}),
+    ("users", "find_by_google_id", {"google_id": "__index_check__"}),
+]
+
+""" Step 4: Define the MongoDBClient class and its methods """
 class MongoDBClient:
     _client = None
     _db_name = None
+    _unique_indexes_verified = False
 
     @staticmethod
     def get_mongodb_variables():
@@ -78,6 +122,87 @@ class MongoDBClient:
 
         return cls._db_name
 
+    @staticmethod
+    def ensure_indexes(db):
+        """Create every index in REQUIRED_INDEXES; existing identical indexes are left alone.
+
+        Each index is created on its own, so one the server rejects (e.g. Cosmos DB
+        refuses a unique index on a non-empty collection, or a partial index) doesn't
+        stop the rest. Returns the (collection, index name) pairs that failed.
+        """
+        failed = []
+        for coll_name, specs in REQUIRED_INDEXES.items():
+            for spec in specs:
+                options = {key: value for key, value in spec.items() if key != "keys"}
+                try:
+                    db[coll_name].create_index(spec["keys"], **options)
+                except pymongo.errors.PyMongoError as e:
+                    logger.error(f"Could not create index {coll_name}.{spec['name']}: {str(e)}")
+                    failed.append((coll_name, spec["name"]))
+        if failed:
+            logger.error(f"Failed to create {len(failed)} required index(es); see check_indexes.py")
+        else:
+            logger.info("Ensured required indexes on all collections")
+        return failed
+
+    @classmethod
+    def unique_user_indexes_present(cls, db):
+        """Return True if users has unique username_1 and email_1 indexes; a positive answer is remembered."""
+        if not cls._unique_indexes_verified:
+            existing = db["users"].index_information()
+            cls._unique_indexes_verified = all(
+                existing.get(name, {}).get("unique") for name in UNIQUE_USER_INDEXES
+            )
+        return cls._unique_indexes_verified
+
+    @staticmethod
+    def check_indexes(db):
+        """Report missing required indexes and how the hot queries are executed.
+
+        Returns a dict with ``missing`` (collection, index name) pairs and one
+        ``queries`` entry per HOT_QUERIES item describing its winning plan.
+        """
+        missing = []
+        for coll_name, specs in REQUIRED_INDEXES.items():
+            existing = db[coll_name].index_information()
+            missing.extend((coll_name, spec["name"]) for spec in specs if spec["name"] not in existing)
+
+        queries = []
+        for coll_name, description, query in HOT_QUERIES:
+            report = {"collection": coll_name, "query": description}
+            try:
+                plan = db[coll_name].find(query).explain().get("queryPlanner", {}).get("winningPlan", {})
+                # Servers using the slot-based engine nest the classic plan under queryPlan
+                plan = plan.get("queryPlan", plan)
+                stages = MongoDBClient._plan_stages(plan)
+                report["stages"] = [stage for stage, _ in stages]
+                report["indexes"] = [index for _, index in stages if index]
+                report["uses_index"] = "COLLSCAN" not in report["stages"] and bool(report["indexes"])
+            except Exception as e:
+                report["error"] = str(e)
+                report["uses_index"] = False
+            queries.append(report)
+        return {"missing": missing, "queries": queries}
+
+    @staticmethod
+    def _plan_stages(plan):
+        """Flatten an explain() plan tree into (stage, index name) pairs."""
+        stages = [(plan.get("stage"), plan.get("indexName"))]
+        children = [plan["inputStage"]] if "inputStage" in plan else plan.get("inputStages", [])
+        for child in children:
+            stages.extend(MongoDBClient._plan_stages(child))
+        return stages
+
+    @staticmethod
+    def duplicate_key_fields(error):
+        """Return the field names whose unique index a DuplicateKeyError violated."""
+        details = getattr(error, 'details', None) or {}
+        if details.get('keyPattern'):
+            return list(details['keyPattern'].keys())
+        # Some servers (e.g. Cosmos DB) only report the index name in the message
+        match = re.search(r'index: (\w+?)_-?1', details.get('errmsg', str(error)))
+        return [match.group(1)] if match else []
+
     @staticmethod
     def clear_collections(db, collection_names):
         try:
@@ -143,4 +268,28 @@ class MongoDBClient:
             except Exception as e:
                 print(f"Error during operation: {e}")
                 raise
-        raise Exception("Maximum retries exceeded")
\ No newline at end of file
+        raise Exception("Maximum retries exceeded")
+
+    @staticmethod
+    def iter_collection(db, coll_name, query=None, projection=None, batch_size=1000):
+        """Yield lists of at most batch_size documents in _id order.
+
+        Each batch is a separate query resuming after the last _id seen, so no
+        cursor is held open between batches (server-side cursors can time out
+        during long exports).
+        """
+        last_id = None
+        while True:
+            page_query = dict(query or {})
+            if last_id is not None:
+                page_query["_id"] = {"$gt": last_id}
+
+            def find_operation():
+                cursor = db[coll_name].find(page_query, projection).sort("_id", pymongo.ASCENDING).limit(batch_size)
+                return list(cursor)
+
+            batch = MongoDBClient.execute_with_retries(find_operation)
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]["_id"]
@@ -0,0 +1,81 @@
+""" Tests for the JWKS route: conditional requests and key rotation """
+import os
+import importlib.util
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from flask import Flask
+from utils import jwt_keys
+from utils.jwt_keys import KeyRing
+
+# Load the route module on its own: the routes package imports every
+# blueprint, and with them clients that need the LangChain agents
+_spec = importlib.util.spec_from_file_location(
+    "jwks_route", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "routes", "jwks.py")
+)
+_jwks_route = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_jwks_route)
+jwks_routes = _jwks_route.jwks_routes
+
+
+def write_key(key_dir, kid):
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    (key_dir / f"{kid}.pem").write_bytes(pem)
+
+
+@pytest.fixture
+def key_ring(tmp_path, monkeypatch):
+    write_key(tmp_path, '2024-01')
+    ring = KeyRing.load(str(tmp_path), 'ES256')
+    monkeypatch.setenv('JWT_ALGORITHM', 'ES256')
+    monkeypatch.setattr(jwt_keys, '_key_ring', ring)
+    return ring
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(jwks_routes)
+    return app.test_client()
+
+
+def kids(response):
+    return [key['kid'] for key in response.get_json()['keys']]
+
+
+def test_key_set_is_served_with_an_etag(key_ring, client):
+    response = client.get('/.well-known/jwks.json')
+
+    assert response.status_code == 200
+    assert kids(response) == ['2024-01']
+    assert response.headers['ETag']
+    assert 'max-age' in response.headers['Cache-Control']
+
+
+def test_matching_etag_gets_a_304(key_ring, client):
+    etag = client.get('/.well-known/jwks.json').headers['ETag']
+
+    response = client.get('/.well-known/jwks.json', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_reloaded_key_ring_changes_the_key_set_and_its_etag(key_ring, client, tmp_path):
+    etag = client.get('/.well-known/jwks.json').headers['ETag']
+
+    write_key(tmp_path, '2024-02')
+    key_ring.reload()
+    response = client.get('/.well-known/jwks.json', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert kids(response) == ['2024-01', '2024-02']
+    assert response.headers['ETag'] != etag
+    assert key_ring.active_kid == '2024-02'
+
+
+def test_hmac_signing_has_no_key_set(client, monkeypatch):
+    monkeypatch.setenv('JWT_ALGORITHM', 'HS256')
+
+    assert client.get('/.well-known/jwks.json').status_code == 404
@@ -0,0 +1,307 @@
+""" Tests for the mail outbox sender: claiming, retry backoff and giving up """
+import sys
+import types
+import socket
+import smtplib
+import pytest
+from flask import Flask
+
+# The sender never touches MongoDB here; stand in for the client so importing
+# the outbox doesn't pull in the rest of the database layer
+_mongodb = types.ModuleType("services.azure_mongodb")
+_mongodb.MongoDBClient = type("MongoDBClient", (), {})
+sys.modules.setdefault("services.azure_mongodb", _mongodb)
+
+from utils import mail_outbox as outbox_module
+from utils.mail_outbox import MailOutbox, OutboxMessage
+from utils.smtp_pool import PooledMail
+
+
+class StandInStore:
+    """Outbox store in memory with the claim semantics of MongoOutboxStore.
+
+    A claim takes due, unsent messages that have been tried fewer than
+    max_attempts times, bumps their attempt count and leases them.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.rows = {}  # id -> dict
+        self.claims = []
+
+    def add(self, subject, sender, recipients, body, html):
+        message_id = len(self.rows) + 1
+        self.rows[message_id] = dict(
+            subject=subject, sender=sender, recipients=list(recipients), body=body, html=html,
+            attempts=0, due=self.now, sent=False, error=None
+        )
+        return message_id
+
+    def claim(self, limit, max_attempts):
+        self.claims.append((limit, max_attempts))
+        due = sorted(
+            (row["due"], message_id) for message_id, row in self.rows.items()
+            if not row["sent"] and row["attempts"] < max_attempts and row["due"] <= self.now
+        )[:limit]
+        batch = []
+        for _, message_id in due:
+            row = self.rows[message_id]
+            row["attempts"] += 1
+            row["due"] = self.now + 300  # lease
+            batch.append(OutboxMessage(message_id, row["subject"], row["sender"], row["recipients"],
+                                       row["body"], row["html"], row["attempts"]))
+        return batch
+
+    def mark_sent(self, message_ids):
+        for message_id in message_ids:
+            self.rows[message_id]["sent"] = True
+
+    def mark_failed(self, message_id, retry_in, error):
+        self.rows[message_id]["due"] = self.now + retry_in
+        self.rows[message_id]["error"] = error
+        self.rows[message_id]["retry_in"] = retry_in
+
+    def purge_sent(self, older_than_seconds):
+        pass
+
+
+class StandInMail:
+    """Replaces the pooled Flask-Mail instance; fails sends as configured."""
+
+    def __init__(self):
+        self.sent = []
+        self.refuse = set()  # recipients refused with a per-message error
+        self.disconnect = set()  # recipients whose send finds the connection dropped
+        self.connect_error = None
+
+    def connect(self):
+        if self.connect_error is not None:
+            raise self.connect_error
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send(self, message):
+        if message.recipients[0] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({message.recipients[0]: (550, b'no such mailbox')})
+        if message.recipients[0] in self.disconnect:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.append(message.recipients[0])
+
+
+@pytest.fixture
+def mail(monkeypatch):
+    mail = StandInMail()
+    monkeypatch.setattr(outbox_module, 'mail', mail)
+    # Take the longest wait in the jitter range so backoff is deterministic
+    monkeypatch.setattr(outbox_module.random, 'uniform', lambda low, high: high)
+    return mail
+
+
+def make_outbox(store, **options):
+    options = {"batch_size": 10, "max_attempts": 3, "backoff_base": 30.0, "backoff_max": 100.0, **options}
+    return MailOutbox(store, **options)
+
+
+def enqueue(store, *recipients):
+    return [store.add("subject", "noreply@example.com", [recipient], "body", None) for recipient in recipients]
+
+
+def test_claims_up_to_a_batch_and_marks_sent(mail):
+    store = StandInStore()
+    enqueue(store, *[f"user{i}@example.com" for i in range(5)])
+    outbox = make_outbox(store, batch_size=3)
+
+    assert outbox.drain_once() == 3
+    assert outbox.drain_once() == 2
+    assert outbox.drain_once() == 0
+
+    assert store.claims[0] == (3, 3)
+    assert len(mail.sent) == 5
+    assert all(row["sent"] for row in store.rows.values())
+    assert outbox.stats()["sent"] == 5
+
+
+def test_failed_message_backs_off_exponentially_up_to_the_cap(mail):
+    store = StandInStore()
+    (message_id,) = enqueue(store, "gone@example.com")
+    mail.refuse.add("gone@example.com")
+    outbox = make_outbox(store, max_attempts=5)
+
+    waits = []
+    for _ in range(4):
+        store.now = store.rows[message_id]["due"]
+        assert outbox.drain_once() == 1
+        waits.append(store.rows[message_id]["retry_in"])
+
+    assert waits == [30.0, 60.0, 100.0, 100.0]
+    assert store.rows[message_id]["error"]
+
+
+def test_failed_message_is_not_claimed_before_its_backoff(mail):
+    store = StandInStore()
+    enqueue(store, "gone@example.com")
+    mail.refuse.add("gone@example.com")
+    outbox = make_outbox(store)
+
+    outbox.drain_once()
+    store.now += 29.0
+    assert outbox.drain_once() == 0
+    store.now += 1.0
+    assert outbox.drain_once() == 1
+
+
+def test_gives_up_after_max_attempts(mail):
+    store = StandInStore()
+    (message_id,) = enqueue(store, "gone@example.com")
+    mail.refuse.add("gone@example.com")
+    outbox = make_outbox(store, max_attempts=3)
+
+    for _ in range(5):
+        store.now += 1000.0
+        outbox.drain_once()
+
+    assert store.rows[message_id]["attempts"] == 3
+    assert not store.rows[message_id]["sent"]
+    stats = outbox.stats()
+    assert (stats["failed"], stats["gave_up"]) == (3, 1)
+
+
+def test_one_refused_recipient_does_not_hold_back_the_batch(mail):
+    store = StandInStore()
+    good, bad, other = enqueue(store, "a@example.com", "gone@example.com", "b@example.com")
+    mail.refuse.add("gone@example.com")
+
+    make_outbox(store).drain_once()
+
+    assert store.rows[good]["sent"] and store.rows[other]["sent"]
+    assert not store.rows[bad]["sent"]
+
+
+def test_connection_failure_retries_the_whole_batch_later(mail):
+    store = StandInStore()
+    ids = enqueue(store, "a@example.com", "b@example.com")
+    mail.connect_error = smtplib.SMTPConnectError(421, b'try later')
+    outbox = make_outbox(store)
+
+    outbox.drain_once()
+
+    assert mail.sent == []
+    assert [store.rows[message_id]["retry_in"] for message_id in ids] == [30.0, 30.0]
+
+    mail.connect_error = None
+    store.now += 30.0
+    assert outbox.drain_once() == 2
+    assert sorted(mail.sent) == ["a@example.com", "b@example.com"]
+
+
+def test_dropped_connection_leaves_the_rest_of_the_batch_for_later(mail):
+    store = StandInStore()
+    first, dropped, last = enqueue(store, "a@example.com", "drop@example.com", "b@example.com")
+    mail.disconnect.add("drop@example.com")
+
+    make_outbox(store).drain_once()
+
+    assert mail.sent == ["a@example.com"]
+    assert store.rows[first]["sent"]
+    assert [store.rows[message_id]["retry_in"] for message_id in (dropped, last)] == [30.0, 30.0]
+
+
+# Against a real SMTP server
+class SinkHandler:
+    """aiosmtpd handler that keeps each message with the SMTP session it came over."""
+
+    def __init__(self):
+        self.messages = []  # (session id, recipient)
+        self.refuse = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return '550 No such mailbox'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((id(session), envelope.rcpt_tos[0]))
+        return '250 Message accepted'
+
+    def sessions(self):
+        return {session for session, _ in self.messages}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink(monkeypatch):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    handler = SinkHandler()
+    port = free_port()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False)
+    pooled_mail = PooledMail()
+    pooled_mail.init_app(app)
+    monkeypatch.setattr(outbox_module, 'mail', pooled_mail)
+    with app.app_context():
+        yield handler
+    pooled_mail.pool.close()
+    controller.stop()
+
+
+def test_batch_is_sent_over_one_smtp_session(smtp_sink):
+    store = StandInStore()
+    enqueue(store, *[f"user{i}@example.com" for i in range(5)])
+
+    assert make_outbox(store).drain_once() == 5
+
+    assert [recipient for _, recipient in smtp_sink.messages] == [f"user{i}@example.com" for i in range(5)]
+    assert len(smtp_sink.sessions()) == 1
+    assert all(row["sent"] for row in store.rows.values())
+
+
+def test_refused_recipient_fails_alone_and_the_session_carries_on(smtp_sink):
+    store = StandInStore()
+    good, bad, other = enqueue(store, "a@example.com", "gone@example.com", "b@example.com")
+    smtp_sink.refuse.add("gone@example.com")
+
+    make_outbox(store).drain_once()
+
+    assert [recipient for _, recipient in smtp_sink.messages] == ["a@example.com", "b@example.com"]
+    assert len(smtp_sink.sessions()) == 1
+    assert store.rows[good]["sent"] and store.rows[other]["sent"]
+    assert not store.rows[bad]["sent"] and "550" in store.rows[bad]["error"]
+
+
+def test_malformed_message_fails_alone_and_the_session_carries_on(smtp_sink):
+    store = StandInStore()
+    (good,) = enqueue(store, "a@example.com")
+    bad = store.add("subject\r\nBcc: everyone@example.com", "noreply@example.com", ["c@example.com"], "body", None)
+    (other,) = enqueue(store, "b@example.com")
+
+    make_outbox(store).drain_once()
+
+    assert [recipient for _, recipient in smtp_sink.messages] == ["a@example.com", "b@example.com"]
+    assert len(smtp_sink.sessions()) == 1
+    assert store.rows[good]["sent"] and store.rows[other]["sent"]
+    assert not store.rows[bad]["sent"] and store.rows[bad]["retry_in"] > 0
+
+def test_next_batch_reuses_the_pooled_session(smtp_sink):
+    store = StandInStore()
+    outbox = make_outbox(store)
+    enqueue(store, "a@example.com")
+    outbox.drain_once()
+    enqueue(store, "b@example.com")
+    outbox.drain_once()
+
+    assert len(smtp_sink.messages) == 2
+    assert len(smtp_sink.sessions()) == 1
@@ -0,0 +1,133 @@
+""" Tests for refresh-token rotation: single use, replay detection and revoking a family """
+import sys
+import types
+from datetime import datetime, timedelta, timezone
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, decode_token
+
+# The tokens are kept in a stand-in collection here; stand in for the client
+# so importing the model doesn't pull in the rest of the database layer
+_mongodb = types.ModuleType("services.azure_mongodb")
+_mongodb.MongoDBClient = type("MongoDBClient", (), {})
+sys.modules.setdefault("services.azure_mongodb", _mongodb)
+
+from models import refresh_token as refresh_token_module
+from models.refresh_token import RefreshToken
+from utils.tokens import issue_tokens
+
+
+def matches(document, query):
+    for field, wanted in query.items():
+        value = document.get(field)
+        if isinstance(wanted, dict):
+            if not all(op == "$gt" and value is not None and value > bound for op, bound in wanted.items()):
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+class StandInCollection:
+    """The refresh_tokens collection in memory, supporting the queries RefreshToken makes."""
+
+    def __init__(self):
+        self.rows = {}  # _id -> document
+
+    def insert_one(self, document):
+        self.rows[document["_id"]] = dict(document)
+
+    def find_one(self, query, projection=None):
+        return next((dict(document) for document in self.rows.values() if matches(document, query)), None)
+
+    def find_one_and_update(self, query, update, projection=None, return_document=None):
+        for document in self.rows.values():
+            if matches(document, query):
+                document.update(update["$set"])
+                return dict(document)
+        return None
+
+    def update_many(self, query, update):
+        for document in self.rows.values():
+            if matches(document, query):
+                document.update(update["$set"])
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = StandInCollection()
+    client = type("StandInMongoDBClient", (), {
+        "get_client": staticmethod(lambda: {"authtest": {RefreshToken.COLLECTION: table}}),
+        "get_db_name": staticmethod(lambda: "authtest"),
+    })
+    monkeypatch.setattr(refresh_token_module, 'MongoDBClient', client)
+    return table
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=15)
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(hours=72)
+    JWTManager(app)
+    with app.app_context():
+        yield app
+
+
+def issue(user_id, family_id=None):
+    """Issue a token pair and return the refresh token's claims."""
+    return decode_token(issue_tokens(user_id, family_id)["refresh_token"])
+
+
+def test_issued_tokens_share_the_recorded_family(app, table):
+    tokens = issue_tokens(7)
+    access, refresh = decode_token(tokens["access_token"]), decode_token(tokens["refresh_token"])
+
+    assert access["fam"] == refresh["fam"]
+    assert table.rows[refresh["jti"]]["family_id"] == refresh["fam"]
+    assert table.rows[refresh["jti"]]["user_id"] == '7'
+    assert access["exp"] - access["iat"] == 15 * 60
+
+
+def test_refresh_token_is_redeemed_once_and_the_family_carries_over(app, table):
+    first = issue(7)
+
+    token = RefreshToken.rotate(first["jti"])
+    second = issue(token.user_id, token.family_id)
+
+    assert (token.family_id, token.user_id) == (first["fam"], '7')
+    assert second["fam"] == first["fam"] and second["jti"] != first["jti"]
+    assert RefreshToken.rotate(second["jti"]) is not None
+
+
+def test_replaying_a_used_token_revokes_its_family(app, table):
+    first = issue(7)
+    token = RefreshToken.rotate(first["jti"])
+    second = issue(token.user_id, token.family_id)
+    other_session = issue(7)
+
+    assert RefreshToken.rotate(first["jti"]) is None
+    # The token the legitimate client holds is dead too; other sessions are not
+    assert RefreshToken.rotate(second["jti"]) is None
+    assert RefreshToken.rotate(other_session["jti"]) is not None
+
+
+def test_logout_and_password_reset_end_sessions(app, table):
+    logged_out, kept = issue(7), issue(7)
+    RefreshToken.revoke_family(logged_out["fam"])
+
+    assert RefreshToken.rotate(logged_out["jti"]) is None
+    assert RefreshToken.rotate(kept["jti"]) is not None
+
+    sessions = [issue(7), issue(7)]
+    RefreshToken.revoke_user(7)
+    assert all(RefreshToken.rotate(claims["jti"]) is None for claims in sessions)
+
+
+def test_unknown_or_expired_token_is_rejected(app, table):
+    claims = issue(7)
+    table.rows[claims["jti"]]["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    assert RefreshToken.rotate(claims["jti"]) is None
+    assert RefreshToken.rotate('never-issued') is None
@@ -0,0 +1,118 @@
+""" Tests for the revoked-token denylist and the Bloom filter in front of it """
+import sys
+import time
+import types
+import pytest
+
+# The blocklist is only given stand-in stores here; stand in for the client
+# so importing it doesn't pull in the rest of the database layer
+_mongodb = types.ModuleType("services.azure_mongodb")
+_mongodb.MongoDBClient = type("MongoDBClient", (), {})
+sys.modules.setdefault("services.azure_mongodb", _mongodb)
+
+from utils import token_blocklist as blocklist_module
+from utils.cache_backends import InMemoryCacheBackend, set_cache_backend
+from utils.token_blocklist import TokenBlocklist, InMemoryBlocklistStore, CacheBlocklistStore, bloom_capacity_for
+
+
+class StandInSharedStore:
+    """Store shared by every node, like MongoBlocklistStore, counting its lookups."""
+
+    def __init__(self):
+        self.expires = {}
+        self.lookups = 0
+
+    def add(self, jti, expires_at):
+        self.expires[jti] = expires_at
+
+    def contains(self, jti):
+        self.lookups += 1
+        return self.expires.get(jti, 0) > time.time()
+
+    def iter_active(self):
+        return [jti for jti, expires_at in self.expires.items() if expires_at > time.time()]
+
+
+@pytest.fixture(autouse=True)
+def no_shared_backend(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    monkeypatch.delenv('TOKEN_BLOCKLIST_BLOOM_CAPACITY', raising=False)
+    set_cache_backend(None)
+    yield
+    set_cache_backend(None)
+
+
+@pytest.fixture
+def shared_backend():
+    backend = InMemoryCacheBackend()
+    set_cache_backend(backend)
+    return backend
+
+
+def in_an_hour():
+    return time.time() + 3600
+
+
+def test_revoked_token_is_denied_until_it_expires():
+    blocklist = TokenBlocklist(InMemoryBlocklistStore())
+    blocklist.revoke('live', in_an_hour())
+    blocklist.revoke('expired', time.time() - 1)
+
+    assert blocklist.is_revoked('live')
+    assert not blocklist.is_revoked('expired')
+    assert not blocklist.is_revoked('never-revoked')
+
+
+def test_bloom_front_answers_unknown_tokens_without_the_store(shared_backend):
+    store = StandInSharedStore()
+    blocklist = TokenBlocklist(store, bloom_capacity=100)
+    blocklist.revoke('revoked', in_an_hour())
+    blocklist._rebuild_bloom()
+
+    for i in range(50):
+        assert not blocklist.is_revoked(f"other-{i}")
+    assert blocklist.is_revoked('revoked')
+    assert store.lookups < 5
+    assert blocklist.stats()["bloom_negatives"] > 45
+
+
+def test_revocation_on_another_node_reaches_a_filter_built_before_it(shared_backend):
+    store = StandInSharedStore()
+    node_a = TokenBlocklist(store, bloom_capacity=100)
+    node_b = TokenBlocklist(store, bloom_capacity=100)
+    node_b._rebuild_bloom()
+
+    node_a.revoke('revoked', in_an_hour())
+
+    assert node_b.is_revoked('revoked')
+    assert node_b.stats()["recently_revoked"] == 1
+
+
+def test_stale_filter_sends_every_check_to_the_store(shared_backend, monkeypatch):
+    store = StandInSharedStore()
+    blocklist = TokenBlocklist(store, bloom_capacity=100, bloom_refresh=30)
+    blocklist._rebuild_bloom()
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(blocklist_module.time, 'monotonic', lambda: later)
+    blocklist.is_revoked('other')
+
+    assert store.lookups == 1
+
+
+def test_shared_store_needs_a_cache_backend_for_the_filter():
+    with pytest.raises(ValueError):
+        TokenBlocklist(StandInSharedStore(), bloom_capacity=100)
+
+
+def test_filter_is_on_by_default_wherever_it_can_be_used(shared_backend, monkeypatch):
+    assert bloom_capacity_for(StandInSharedStore()) == blocklist_module.DEFAULT_BLOOM_CAPACITY
+    assert bloom_capacity_for(InMemoryBlocklistStore()) == blocklist_module.DEFAULT_BLOOM_CAPACITY
+    assert bloom_capacity_for(CacheBlocklistStore(shared_backend)) == 0
+    assert bloom_capacity_for(None) == 0
+
+    set_cache_backend(None)
+    assert bloom_capacity_for(StandInSharedStore()) == 0
+
+    monkeypatch.setenv('TOKEN_BLOCKLIST_BLOOM_CAPACITY', '0')
+    assert bloom_capacity_for(InMemoryBlocklistStore()) == 0
@@ -0,0 +1,182 @@
+""" Tests for the user existence filter: definite negatives, catching up with the store and staying safe when unsure """
+import sys
+import types
+import pytest
+
+# The filter reads a stand-in source here; stand in for the client so
+# importing it doesn't pull in the rest of the database layer
+_mongodb = types.ModuleType("services.azure_mongodb")
+_mongodb.MongoDBClient = type("MongoDBClient", (), {})
+sys.modules.setdefault("services.azure_mongodb", _mongodb)
+
+from utils.cache_backends import InMemoryCacheBackend, set_cache_backend
+from utils.user_filter import UserFilter
+
+
+class StandInIdentifiers:
+    """The users collection in memory, read in position order with an overlap like MongoUserIdentifiers.
+
+    Positions are plain numbers here rather than ObjectIds. ``during_read``
+    is called once part-way through a full read, as a signup
+    landing while a rebuild scans the store would.
+    """
+
+    def __init__(self, users, overlap=2):
+        self.users = list(users)  # (position, username, email)
+        self.overlap = overlap
+        self.reads = 0
+        self.failing = False
+        self.during_read = None
+
+    def overlaps(self, position, last):
+        return position > last - self.overlap
+
+    def iter_after(self, position=None, batch_size=5000):
+        self.reads += 1
+        if self.failing:
+            raise RuntimeError("connection refused")
+        rows = sorted(user for user in self.users if position is None or user[0] > position - self.overlap)
+        for index, row in enumerate(rows):
+            if index == len(rows) // 2 and self.during_read is not None:
+                during_read, self.during_read = self.during_read, None
+                during_read()
+            yield row
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    backend = InMemoryCacheBackend()
+    set_cache_backend(backend)
+    yield backend
+    set_cache_backend(None)
+
+
+@pytest.fixture
+def store():
+    return StandInIdentifiers([(1, 'alice', 'alice@example.com'), (2, 'bob', 'bob@example.com')])
+
+
+def make_filter(store):
+    return UserFilter(store, capacity=1000, error_rate=0.01, refresh=5.0)
+
+
+def test_unknown_identifiers_are_definite_negatives(backend, store):
+    user_filter = make_filter(store)
+    user_filter.rebuild()
+
+    assert user_filter.might_exist('username', 'alice')
+    assert user_filter.might_exist('email', 'bob@example.com')
+    assert not user_filter.might_exist('username', 'mallory')
+    # Usernames and emails are kept apart
+    assert not user_filter.might_exist('email', 'alice')
+    assert user_filter.stats()["negatives"] == 2
+
+
+def test_every_lookup_goes_to_the_database_when_unsure(monkeypatch, backend, store):
+    user_filter = make_filter(store)
+    assert user_filter.might_exist('username', 'mallory')  # not built yet
+
+    user_filter.rebuild()
+    user_filter._read_at -= user_filter.max_age + 1  # the store hasn't been read for too long
+    assert user_filter.might_exist('username', 'mallory')
+
+    user_filter.rebuild()
+    set_cache_backend(None)  # other nodes' signups can't be seen
+    assert user_filter.might_exist('username', 'mallory')
+    assert user_filter.stats()["unavailable"] == 3
+
+
+def test_signup_on_another_node_is_seen_before_the_next_read(backend, store):
+    here, there = make_filter(store), make_filter(store)
+    here.rebuild()
+    there.rebuild()
+
+    store.users.append((3, 'carol', 'carol@example.com'))
+    there.add(3, username='carol', email='carol@example.com')
+
+    assert there.might_exist('username', 'carol')
+    assert here.might_exist('email', 'carol@example.com')
+    assert here.stats()["recently_added"] == 1
+
+
+def test_catching_up_reads_new_users_without_counting_any_twice(backend, store):
+    user_filter = make_filter(store)
+    user_filter.rebuild()
+    store.users.append((3, 'carol', 'carol@example.com'))
+    user_filter.add(3, username='carol', email='carol@example.com')
+
+    # Each read re-reads the last ids, which must not add them again
+    user_filter._catch_up()
+    store.users.append((4, 'dave', 'dave@example.com'))
+    user_filter._catch_up()
+
+    assert user_filter.stats()["entries"] == 8
+    assert user_filter.might_exist('username', 'dave')
+
+
+def test_signup_during_a_rebuild_is_kept(backend, store):
+    user_filter = make_filter(store)
+
+    def signup():
+        store.users.append((3, 'carol', 'carol@example.com'))
+        user_filter.add(3, username='carol', email='carol@example.com')
+
+    store.during_read = signup
+    user_filter.rebuild()
+
+    assert user_filter.might_exist('username', 'carol')
+    assert user_filter.stats()["entries"] == 6
+
+
+def test_deleted_user_is_forgotten(backend, store):
+    user_filter = make_filter(store)
+    user_filter.rebuild()
+
+    user_filter.remove(username='bob', email='bob@example.com')
+
+    assert not user_filter.might_exist('username', 'bob')
+    assert user_filter.might_exist('username', 'alice')
+
+
+def test_requested_rebuild_reaches_every_node(backend, store):
+    user_filter = make_filter(store)
+    user_filter._update()
+    user_filter._update()
+    assert user_filter.stats()["rebuilds"] == 1
+
+    assert make_filter(store).request_rebuild()
+    user_filter._update()
+    assert user_filter.stats()["rebuilds"] == 2
+
+
+def test_failed_read_drops_the_filter(backend, store):
+    user_filter = make_filter(store)
+    user_filter._update()
+
+    store.failing = True
+    user_filter._update()
+
+    assert user_filter.might_exist('username', 'mallory')
+    assert user_filter.stats()["errors"] == 1 and not user_filter.stats()["ready"]
+
+
+def test_false_positive_rate_is_reported(backend, store):
+    user_filter = make_filter(store)
+    user_filter.rebuild()
+
+    for name in ('mallory', 'trent', 'eve'):
+        user_filter.might_exist('username', name)
+    user_filter.report_false_positive()
+
+    stats = user_filter.stats()
+    assert stats["observed_false_positive_rate"] == 0.25
+    assert 0 < stats["expected_false_positive_rate"] < 0.01
+
+
+def test_zero_capacity_disables_the_filter(backend, store):
+    user_filter = UserFilter(store, capacity=0)
+    user_filter.add(3, username='carol')
+
+    assert user_filter.might_exist('username', 'mallory')
+    assert store.reads == 0
@@ -0,0 +1,151 @@
+""" Shared cache backends used across worker processes and nodes """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import threading
+import logging
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:  # redis is only needed when CACHE_BACKEND=redis
+    redis = None
+
+load_dotenv()
+
+""" Step 2: Define the backend interface and implementations """
+class CacheBackend:
+    """Minimal key/value interface every shared cache backend implements.
+
+    Values are strings. ``ttl`` is in seconds; None means no expiry.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def set_many(self, mapping, ttl=None):
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def incr(self, key, amount=1, ttl=None):
+        """Add amount to an integer value; ``ttl`` applies when the increment creates the key."""
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local stand-in with Redis semantics, for tests and single-process runs."""
+
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (str(value), expires_at)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            current = self._live(key)
+            value = int(current or 0) + amount
+            if current is None:
+                expires_at = time.monotonic() + ttl if ttl else None
+            else:
+                expires_at = self._data[key][1]
+            self._data[key] = (str(value), expires_at)
+            return value
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend for Redis or any client exposing the redis-py API (e.g. fakeredis)."""
+
+    def __init__(self, client=None, url=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def get_many(self, keys):
+        return self.client.mget(keys) if keys else []
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def set_many(self, mapping, ttl=None):
+        pipeline = self.client.pipeline()
+        for key, value in mapping.items():
+            pipeline.set(key, value, ex=int(ttl) if ttl else None)
+        pipeline.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def incr(self, key, amount=1, ttl=None):
+        value = self.client.incr(key, amount)
+        if ttl and value == amount:
+            self.client.expire(key, int(ttl))
+        return value
+
+
+""" Step 3: Resolve the configured backend """
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend():
+    """Return the shared backend selected by CACHE_BACKEND, or None if disabled."""
+    global _backend
+    if _backend is not None:
+        return _backend
+    kind = os.getenv('CACHE_BACKEND', 'none').lower()
+    if kind == 'none':
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if kind == 'redis':
+                _backend = RedisCacheBackend(url=os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+            elif kind == 'memory':
+                _backend = InMemoryCacheBackend()
+            else:
+                raise ValueError(f"Unknown CACHE_BACKEND '{kind}'")
+            logging.info(f"Using {type(_backend).__name__} for the shared cache")
+    return _backend
+
+
+def set_cache_backend(backend):
+    """Install a backend explicitly, e.g. a fakeredis-backed one in tests."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,150 @@
+""" Bounded worker pool for CPU-bound password hashing """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.metrics import register_metrics
+from utils.password_hasher import hash_password, verify_password, get_hash_method
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing queue is full; routes answer with 503."""
+
+
+""" Step 2: Define the HashingPool class """
+class HashingPool:
+    """Runs password hashing in a process pool so it escapes the GIL.
+
+    At most ``HASHING_POOL_WORKERS + HASHING_POOL_MAX_QUEUE`` jobs are admitted
+    at once. A caller that cannot get a slot within ``HASHING_POOL_QUEUE_TIMEOUT``
+    seconds gets HashingPoolSaturated instead of queueing without bound.
+    Setting ``HASHING_POOL_WORKERS=0`` hashes inline on the calling thread.
+    If a worker process dies (e.g. OOM-killed) the pool is replaced and the
+    affected jobs are retried once on the new one.
+    """
+    _executor = None
+    _slots = None
+    _pid = None
+    _lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats = {
+        "submitted": 0,
+        "completed": 0,
+        "rejected": 0,
+        "in_flight": 0,
+        "total_seconds": 0.0,
+        "max_seconds": 0.0,
+        "restarts": 0,
+    }
+
+    @staticmethod
+    def workers():
+        return int(os.getenv("HASHING_POOL_WORKERS", os.cpu_count() or 1))
+
+    @classmethod
+    def _get_executor(cls):
+        # A pool inherited across fork() has no live worker processes; rebuild it
+        if cls._executor is not None and cls._pid == os.getpid():
+            return cls._executor
+        with cls._lock:
+            if cls._executor is None or cls._pid != os.getpid():
+                workers = cls.workers()
+                max_queue = int(os.getenv("HASHING_POOL_MAX_QUEUE", workers * 4))
+                cls._executor = ProcessPoolExecutor(max_workers=workers)
+                cls._slots = threading.BoundedSemaphore(workers + max_queue)
+                cls._pid = os.getpid()
+                logging.info(f"Started hashing pool with {workers} workers and queue of {max_queue}")
+            return cls._executor
+
+    @classmethod
+    def _replace_executor(cls, broken):
+        """Swap a pool broken by a dead worker for a new one (once, however many callers notice)."""
+        with cls._lock:
+            if cls._executor is broken:
+                logging.error("A hashing pool worker died; starting a new pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+                with cls._stats_lock:
+                    cls._stats["restarts"] += 1
+        return cls._get_executor()
+
+    @classmethod
+    def _record(cls, started_at):
+        elapsed = time.perf_counter() - started_at
+        with cls._stats_lock:
+            cls._stats["completed"] += 1
+            cls._stats["in_flight"] -= 1
+            cls._stats["total_seconds"] += elapsed
+            cls._stats["max_seconds"] = max(cls._stats["max_seconds"], elapsed)
+
+    @classmethod
+    def submit(cls, fn, *args):
+        """Submit fn(*args) to the pool and return a concurrent.futures.Future."""
+        executor = cls._get_executor()
+        try:
+            return cls._submit(executor, fn, *args)
+        except BrokenProcessPool:
+            return cls._submit(cls._replace_executor(executor), fn, *args)
+
+    @classmethod
+    def _submit(cls, executor, fn, *args):
+        slots = cls._slots
+        timeout = float(os.getenv("HASHING_POOL_QUEUE_TIMEOUT", 0.5))
+        if not slots.acquire(timeout=timeout):
+            with cls._stats_lock:
+                cls._stats["rejected"] += 1
+            raise HashingPoolSaturated("Password hashing queue is full")
+
+        started_at = time.perf_counter()
+        with cls._stats_lock:
+            cls._stats["submitted"] += 1
+            cls._stats["in_flight"] += 1
+
+        def _done(_):
+            slots.release()
+            cls._record(started_at)
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            _done(None)
+            raise
+        future.add_done_callback(_done)
+        return future
+
+    # A job running when its worker died fails with BrokenProcessPool; it is retried once
+    @classmethod
+    def _run(cls, fn, *args):
+        if cls.workers() == 0:
+            return fn(*args)
+        executor = cls._get_executor()
+        try:
+            return cls.submit(fn, *args).result()
+        except BrokenProcessPool:
+            cls._replace_executor(executor)
+            return cls.submit(fn, *args).result()
+
+    # The method is resolved here so worker processes never read configuration
+    @classmethod
+    def generate_password_hash(cls, password):
+        return cls._run(hash_password, password, get_hash_method())
+
+    @classmethod
+    def check_password_hash(cls, pwhash, password):
+        return cls._run(verify_password, pwhash, password)
+
+    @classmethod
+    def get_metrics(cls):
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        completed = stats["completed"]
+        stats["avg_seconds"] = stats["total_seconds"] / completed if completed else 0.0
+        # Jobs admitted beyond the number of workers are waiting in the queue
+        stats["queue_depth"] = max(stats["in_flight"] - cls.workers(), 0)
+        return stats
+
+
+register_metrics("hashing_pool", HashingPool.get_metrics)
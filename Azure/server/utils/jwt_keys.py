@@ -0,0 +1,118 @@
+""" Asymmetric key ring for signing and verifying JWTs """
+""" Step 1: Importing required libraries"""
+import os
+import json
+import hashlib
+import threading
+import logging
+import jwt
+from cryptography.hazmat.primitives import serialization
+from dotenv import load_dotenv
+
+load_dotenv()
+
+""" Step 2: Define the key ring """
+class KeyRing:
+    """Parsed JWT keys, identified by key id (``kid``).
+
+    Keys are read once from a directory: ``<kid>.pem`` holds a private key,
+    which signs and verifies, and ``<kid>.pub.pem`` a public key that only
+    verifies (e.g. a retired key whose tokens have not expired yet). The
+    active key signs new tokens and its kid is put in their header, so a
+    verifier picks the right public key without trying each one.
+
+    reload() re-reads the directory in place after a key was added or
+    retired, so everything holding the ring (the JWTManager, the JWKS
+    route) sees the new key set at once.
+    """
+
+    def __init__(self, algorithm, private_keys, public_keys, active_kid, key_dir=None, requested_kid=None):
+        self.algorithm = algorithm
+        self._private_keys = private_keys
+        self._public_keys = public_keys
+        self.active_kid = active_kid
+        self.key_dir = key_dir
+        self.requested_kid = requested_kid
+        self._jwks_document = None  # (public_keys it was built from, (body, etag))
+
+    @classmethod
+    def load(cls, key_dir, algorithm, active_kid=None):
+        """Parse every key in key_dir; the active key defaults to the last private key by name."""
+        requested_kid = active_kid
+        private_keys, public_keys = {}, {}
+        for filename in sorted(os.listdir(key_dir)):
+            with open(os.path.join(key_dir, filename), 'rb') as f:
+                data = f.read()
+            if filename.endswith('.pub.pem'):
+                public_keys[filename[:-len('.pub.pem')]] = serialization.load_pem_public_key(data)
+            elif filename.endswith('.pem'):
+                kid = filename[:-len('.pem')]
+                private_keys[kid] = serialization.load_pem_private_key(data, password=None)
+                public_keys[kid] = private_keys[kid].public_key()
+        if not private_keys:
+            raise ValueError(f"No private JWT keys found in {key_dir}")
+        active_kid = active_kid or list(private_keys)[-1]
+        if active_kid not in private_keys:
+            raise ValueError(f"Active JWT key '{active_kid}' has no private key in {key_dir}")
+        return cls(algorithm, private_keys, public_keys, active_kid, key_dir, requested_kid)
+
+    def reload(self):
+        """Re-read key_dir, keeping the requested active kid (or the new last private key)."""
+        ring = KeyRing.load(self.key_dir, self.algorithm, active_kid=self.requested_kid)
+        self._private_keys, self._public_keys = ring._private_keys, ring._public_keys
+        self.active_kid = ring.active_kid
+        logging.info(f"Reloaded {len(self._public_keys)} JWT keys; signing with '{self.active_kid}'")
+
+    def signing_key(self):
+        return self._private_keys[self.active_kid]
+
+    def verification_key(self, kid):
+        if kid is None and len(self._public_keys) == 1:
+            return next(iter(self._public_keys.values()))
+        try:
+            return self._public_keys[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError(f"Unknown JWT key id '{kid}'")
+
+    def public_keys(self):
+        return dict(self._public_keys)
+
+    def jwks(self):
+        """The public keys as a JSON Web Key Set, for services that verify tokens themselves."""
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys = []
+        for kid, public_key in self._public_keys.items():
+            key = algorithm.to_jwk(public_key, as_dict=True)
+            key.update({'kid': kid, 'use': 'sig', 'alg': self.algorithm})
+            keys.append(key)
+        return {'keys': keys}
+
+    def jwks_document(self):
+        """The serialized key set and its ETag, built once per key set."""
+        public_keys, cached = self._public_keys, self._jwks_document
+        if cached is not None and cached[0] is public_keys:
+            return cached[1]
+        body = json.dumps(self.jwks(), sort_keys=True, separators=(',', ':'))
+        document = (body, hashlib.sha256(body.encode()).hexdigest()[:32])
+        self._jwks_document = (public_keys, document)
+        return document
+
+
+""" Step 3: Load the configured key ring """
+_key_ring = None
+_key_ring_lock = threading.Lock()
+
+
+def get_key_ring():
+    """Return the key ring for JWT_ALGORITHM, or None for HMAC (JWT_SECRET_KEY) signing."""
+    global _key_ring
+    algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
+    if algorithm.startswith('HS'):
+        return None
+    with _key_ring_lock:
+        if _key_ring is None:
+            _key_ring = KeyRing.load(
+                os.getenv('JWT_KEY_DIR', 'keys'), algorithm, active_kid=os.getenv('JWT_ACTIVE_KID')
+            )
+            logging.info(f"Loaded {len(_key_ring.public_keys())} JWT keys; signing with '{_key_ring.active_kid}'")
+    return _key_ring
@@ -0,0 +1,94 @@
+""" JWTManager with key-ring signing and a verified-token cache """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from flask_jwt_extended import JWTManager
+from dotenv import load_dotenv
+from utils.jwt_keys import get_key_ring
+
+load_dotenv()
+
+""" Step 2: Define the CachingJWTManager class """
+class CachingJWTManager(JWTManager):
+    """JWTManager that signs with the key ring and remembers verified tokens.
+
+    When JWT_ALGORITHM is asymmetric (e.g. RS256, EdDSA) tokens are signed by
+    the active key of the key ring and verified by the key named in their
+    ``kid`` header. Decoded claims are cached under the SHA-256 of the token,
+    for at most JWT_VERIFY_CACHE_TTL seconds and never past the token's
+    expiry, so a bearer token presented again skips parsing and signature
+    verification. Checks that run after decoding (e.g. the blocklist) still
+    run on every request.
+
+    flask_jwt_extended has no public hook that can skip decoding, so the
+    cache overrides its private ``_decode_jwt_from_config``; requirements.txt
+    pins the version this was written against. If a release drops the
+    method, tokens are just verified on every request again.
+    """
+
+    def __init__(self, app=None, add_context_processor=False, key_ring=None, cache_size=None):
+        self.key_ring = key_ring
+        self.cache_size = int(os.getenv('JWT_VERIFY_CACHE_SIZE', 1024)) if cache_size is None else cache_size
+        self.cache_ttl = float(os.getenv('JWT_VERIFY_CACHE_TTL', 60))
+        self._verified = OrderedDict()  # sha256(token) -> (expires_at, claims)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        super().__init__(app, add_context_processor)
+
+    def init_app(self, app, add_context_processor=False):
+        super().init_app(app, add_context_processor)
+        if not hasattr(JWTManager, '_decode_jwt_from_config'):
+            logging.warning("flask_jwt_extended no longer calls _decode_jwt_from_config; the verified-token cache is unused")
+        key_ring = self.key_ring or get_key_ring()
+        if key_ring is None:
+            return  # HMAC with JWT_SECRET_KEY, flask_jwt_extended's default
+        self.key_ring = key_ring
+        app.config['JWT_ALGORITHM'] = key_ring.algorithm
+        app.config['JWT_DECODE_ALGORITHMS'] = [key_ring.algorithm]
+        self.encode_key_loader(lambda identity: key_ring.signing_key())
+        self.decode_key_loader(lambda headers, claims: key_ring.verification_key(headers.get('kid')))
+        self.additional_headers_loader(lambda identity: {'kid': key_ring.active_kid})
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Cookie tokens (CSRF) and expired-token lookups always take the full path
+        if self.cache_size <= 0 or csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(key)
+            if entry is not None:
+                expires_at, claims = entry
+                if expires_at > now:
+                    self._verified.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(claims)
+                del self._verified[key]
+            self._stats["misses"] += 1
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        expires_at = min(now + self.cache_ttl, claims.get('exp', float('inf')))
+        with self._lock:
+            self._verified[key] = (expires_at, dict(claims))
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+                self._stats["evictions"] += 1
+        return claims
+
+    def clear_cache(self):
+        with self._lock:
+            self._verified.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._verified)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,242 @@
+""" Durable outbox for outgoing mail, delivered by a background sender """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import random
+import smtplib
+import logging
+import threading
+from typing import NamedTuple, Optional
+from datetime import datetime, timedelta, timezone
+from flask_mail import Message
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+from services.azure_mongodb import MongoDBClient
+from utils.extensions import mail
+from utils.metrics import register_metrics
+
+load_dotenv()
+
+""" Step 2: Define the store """
+class OutboxMessage(NamedTuple):
+    id: object
+    subject: str
+    sender: str
+    recipients: list
+    body: Optional[str]
+    html: Optional[str]
+    attempts: int
+
+
+class MongoOutboxStore:
+    """Messages in the mail_outbox collection.
+
+    Each message is claimed with its own find_one_and_update, so any number
+    of senders (one per worker process, or mail_worker.py) can drain the
+    collection without sending a message twice. Sent messages are deleted by
+    the sent_at TTL index in REQUIRED_INDEXES.
+    """
+    COLLECTION = 'mail_outbox'
+
+    def __init__(self, lease_seconds=300.0):
+        self.lease_seconds = lease_seconds
+
+    @staticmethod
+    def _collection():
+        return MongoDBClient.get_client()[MongoDBClient.get_db_name()][MongoOutboxStore.COLLECTION]
+
+    def add(self, subject, sender, recipients, body, html):
+        result = self._collection().insert_one({
+            "subject": subject,
+            "sender": sender,
+            "recipients": list(recipients),
+            "body": body,
+            "html": html,
+            "attempts": 0,
+            "next_attempt_at": datetime.now(timezone.utc),
+            "last_error": None,
+            "sent_at": None,
+        })
+        return result.inserted_id
+
+    def claim(self, limit, max_attempts):
+        batch = []
+        for _ in range(limit):
+            now = datetime.now(timezone.utc)
+            document = self._collection().find_one_and_update(
+                {"sent_at": None, "attempts": {"$lt": max_attempts}, "next_attempt_at": {"$lte": now}},
+                {"$inc": {"attempts": 1}, "$set": {"next_attempt_at": now + timedelta(seconds=self.lease_seconds)}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if document is None:
+                break
+            batch.append(OutboxMessage(
+                document["_id"], document["subject"], document["sender"], document["recipients"],
+                document.get("body"), document.get("html"), document["attempts"]
+            ))
+        return batch
+
+    def mark_sent(self, message_ids):
+        self._collection().update_many(
+            {"_id": {"$in": list(message_ids)}},
+            {"$set": {"sent_at": datetime.now(timezone.utc), "last_error": None}}
+        )
+
+    def mark_failed(self, message_id, retry_in, error):
+        next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=retry_in)
+        self._collection().update_one(
+            {"_id": message_id}, {"$set": {"next_attempt_at": next_attempt_at, "last_error": error[:1000]}}
+        )
+
+    def purge_sent(self, older_than_seconds):
+        pass  # The TTL index on sent_at removes sent messages
+
+
+""" Step 3: Define the MailOutbox class """
+# SMTP errors that concern one message. SMTPException subclasses OSError, so
+# they are checked before CONNECTION_ERRORS, which end the session and leave
+# the rest of the batch for later; anything else (e.g. BadHeaderError or a
+# UnicodeEncodeError while building the message) only fails its message
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+
+
+class MailOutbox:
+    """Writes messages to the store in the request and delivers them in the background.
+
+    The sender thread claims up to ``batch_size`` due messages at a time and
+    sends them over one pooled SMTP session. A failed message is retried after an
+    exponential backoff (``backoff_base`` doubling per attempt, capped at
+    ``backoff_max``, with jitter) until it has been tried ``max_attempts``
+    times; it then stays in the store with its last error. Messages enqueued
+    by this process wake the sender at once; others are picked up within
+    ``poll_interval`` seconds.
+    """
+
+    def __init__(self, store, batch_size=50, poll_interval=5.0, max_attempts=8,
+                 backoff_base=30.0, backoff_max=3600.0, retention=7 * 86400.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention = retention
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._next_purge = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "batches": 0, "sent": 0, "failed": 0, "gave_up": 0}
+
+    def _count(self, stat, n=1):
+        with self._stats_lock:
+            self._stats[stat] += n
+
+    def enqueue(self, message):
+        """Store a flask_mail Message for delivery; returns its outbox id."""
+        message_id = self.store.add(
+            message.subject, message.sender, message.recipients, message.body, message.html
+        )
+        self._count("enqueued")
+        self._wakeup.set()
+        return message_id
+
+    def start(self, app):
+        """Start the sender thread for this process (once)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="mail-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, app):
+        """Deliver due messages until stop() is called."""
+        logging.info("Mail outbox sender started")
+        while not self._stopping.is_set():
+            try:
+                with app.app_context():
+                    claimed = self.drain_once()
+            except Exception as e:
+                logging.error(f"Mail outbox sender error: {str(e)}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self):
+        """Claim and send one batch; returns the number of messages claimed."""
+        batch = self.store.claim(self.batch_size, self.max_attempts)
+        if batch:
+            self._count("batches")
+            self._send_batch(batch)
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + 3600.0
+            self.store.purge_sent(self.retention)
+        return len(batch)
+
+    def _send_batch(self, batch):
+        sent = []
+        remaining = list(batch)
+        try:
+            with mail.connect() as connection:
+                while remaining:
+                    outbox_message = remaining[0]
+                    try:
+                        connection.send(Message(
+                            subject=outbox_message.subject,
+                            sender=outbox_message.sender,
+                            recipients=list(outbox_message.recipients),
+                            body=outbox_message.body,
+                            html=outbox_message.html
+                        ))
+                        sent.append(outbox_message.id)
+                    except MESSAGE_ERRORS as e:
+                        self._failed(outbox_message, e)
+                    except CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        self._failed(outbox_message, e)
+                    remaining.pop(0)
+        except Exception as e:
+            # Connecting failed or the connection broke: retry the rest later
+            for outbox_message in remaining:
+                self._failed(outbox_message, e)
+        if sent:
+            self.store.mark_sent(sent)
+            self._count("sent", len(sent))
+
+    def _failed(self, outbox_message, error):
+        self._count("failed")
+        if outbox_message.attempts >= self.max_attempts:
+            self._count("gave_up")
+            logging.error(f"Giving up on outbox message {outbox_message.id} after {outbox_message.attempts} attempts: {str(error)}")
+        else:
+            logging.warning(f"Outbox message {outbox_message.id} failed (attempt {outbox_message.attempts}): {str(error)}")
+        retry_in = min(self.backoff_base * 2 ** (outbox_message.attempts - 1), self.backoff_max)
+        self.store.mark_failed(outbox_message.id, retry_in * random.uniform(0.5, 1.0), str(error))
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+""" Step 4: Create the configured outbox """
+mail_outbox = MailOutbox(
+    MongoOutboxStore(float(os.getenv('MAIL_OUTBOX_LEASE', 300))),
+    batch_size=int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50)),
+    poll_interval=float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 5)),
+    max_attempts=int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 8)),
+    backoff_base=float(os.getenv('MAIL_OUTBOX_BACKOFF_BASE', 30)),
+    backoff_max=float(os.getenv('MAIL_OUTBOX_BACKOFF_MAX', 3600))
+)
+register_metrics("mail_outbox", mail_outbox.stats)
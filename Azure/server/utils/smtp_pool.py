@@ -0,0 +1,169 @@
+""" Pooled SMTP connections for Flask-Mail """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import atexit
+import smtplib
+import logging
+import threading
+from flask import current_app
+from flask_mail import Mail, Connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+""" Step 2: Define the connection pool """
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open between sends.
+
+    Up to ``max_idle_connections`` sessions wait in the pool; a session that
+    has been idle for ``noop_after`` seconds is checked with NOOP before it
+    is reused, one idle for ``max_idle`` seconds is closed instead (servers
+    drop quiet clients), and one that has sent ``max_messages`` messages is
+    replaced so no session lives forever.
+    """
+
+    def __init__(self, state, max_idle_connections=4, max_messages=100, max_idle=60.0, noop_after=5.0):
+        self.state = state  # Flask-Mail settings of the app
+        self.max_idle_connections = max_idle_connections
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self.noop_after = noop_after
+        self._idle = []  # [(host, messages sent, idle since)], most recently used last
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "reused": 0, "noop_failures": 0, "expired": 0, "recycled": 0, "discarded": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def acquire(self):
+        """Return (host, messages sent) for an open, healthy session."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                host, sent, idle_since = self._idle.pop()
+            idle_for = time.monotonic() - idle_since
+            if idle_for >= self.max_idle:
+                self._count("expired")
+                self._quit(host)
+                continue
+            if idle_for >= self.noop_after:
+                try:
+                    if host.noop()[0] != 250:
+                        raise smtplib.SMTPResponseException(421, "NOOP refused")
+                except (smtplib.SMTPException, OSError) as e:
+                    logging.info(f"Pooled SMTP session failed its NOOP check, reconnecting: {str(e)}")
+                    self._count("noop_failures")
+                    self._close(host)
+                    continue
+            self._count("reused")
+            return host, sent
+        host = Connection(self.state).configure_host()
+        self._count("opened")
+        return host, 0
+
+    def release(self, host, sent):
+        """Give a session back after a clean send; it is closed if it is spent or the pool is full."""
+        if sent >= self.max_messages:
+            self._count("recycled")
+            self._quit(host)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle_connections:
+                self._idle.append((host, sent, time.monotonic()))
+                return
+        self._quit(host)
+
+    def discard(self, host):
+        """Drop a session whose state is unknown (a send failed on it)."""
+        logging.warning("Discarding pooled SMTP session after a failed send")
+        self._count("discarded")
+        self._close(host)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for host, _, _ in idle:
+            self._quit(host)
+
+    @staticmethod
+    def _quit(host):
+        try:
+            host.quit()
+        except (smtplib.SMTPException, OSError):
+            SMTPConnectionPool._close(host)
+
+    @staticmethod
+    def _close(host):
+        try:
+            host.close()
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        return stats
+
+
+""" Step 3: Plug the pool into Flask-Mail """
+class PooledConnection(Connection):
+    """Flask-Mail connection that borrows its SMTP session from the pool."""
+
+    def __init__(self, mail, pool):
+        super().__init__(mail)
+        self.pool = pool
+        self._sent = 0
+
+    def __enter__(self):
+        self.host = None
+        self.num_emails = 0
+        if not self.mail.suppress:
+            self.host, self._sent = self.pool.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.host is None:
+            return
+        if exc_type is None:
+            self.pool.release(self.host, self._sent)
+        else:
+            self.pool.discard(self.host)
+        self.host = None
+
+    def send(self, message, envelope_from=None):
+        super().send(message, envelope_from)
+        # Flask-Mail itself reconnects every MAIL_MAX_EMAILS messages, if that is set
+        self._sent = 0 if self.mail.max_emails and self.num_emails == 0 else self._sent + 1
+
+
+class PooledMail(Mail):
+    """Mail whose connections come from an SMTPConnectionPool (MAIL_POOL_* settings)."""
+
+    def init_app(self, app):
+        state = super().init_app(app)
+        pool = SMTPConnectionPool(
+            state,
+            max_idle_connections=int(os.getenv('MAIL_POOL_SIZE', 4)),
+            max_messages=int(os.getenv('MAIL_POOL_MAX_MESSAGES', 100)),
+            max_idle=float(os.getenv('MAIL_POOL_MAX_IDLE', 60)),
+            noop_after=float(os.getenv('MAIL_POOL_NOOP_AFTER', 5))
+        )
+        app.extensions['smtp_pool'] = pool
+        self.pool = pool
+        atexit.register(pool.close)
+        return state
+
+    def connect(self):
+        app = getattr(self, "app", None) or current_app
+        try:
+            return PooledConnection(app.extensions["mail"], app.extensions["smtp_pool"])
+        except KeyError:
+            raise RuntimeError("The current application was not configured with PooledMail")
+
+    def stats(self):
+        pool = getattr(self, 'pool', None)
+        return pool.stats() if pool is not None else {}
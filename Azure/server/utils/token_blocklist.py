@@ -0,0 +1,305 @@
+""" Revoked-token (jti) denylist with pluggable stores """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from services.azure_mongodb import MongoDBClient
+from utils.bloom import BloomFilter
+from utils.cache_backends import get_cache_backend
+from utils.metrics import register_metrics
+
+load_dotenv()
+
+""" Step 2: Define the stores """
+class InMemoryBlocklistStore:
+    """Process-local store; revoked jtis are dropped by an expiry wheel.
+
+    Each jti is also filed in a bucket for the ``slot_seconds``-wide slot its
+    token expires in. Buckets are swept once their slot has passed, so memory
+    only holds tokens that could still be used and no full scan is needed.
+    """
+
+    def __init__(self, slot_seconds=60):
+        self.slot_seconds = slot_seconds
+        self._expires = {}  # jti -> expires_at
+        self._buckets = {}  # slot -> set of jti
+        self._slots = []  # heap of slots that have a bucket
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        # Caller holds the lock
+        current_slot = int(now // self.slot_seconds)
+        while self._slots and self._slots[0] < current_slot:
+            for jti in self._buckets.pop(heapq.heappop(self._slots)):
+                self._expires.pop(jti, None)
+
+    def add(self, jti, expires_at):
+        slot = int(expires_at // self.slot_seconds)
+        with self._lock:
+            self._sweep(time.time())
+            self._expires[jti] = expires_at
+            if slot not in self._buckets:
+                self._buckets[slot] = set()
+                heapq.heappush(self._slots, slot)
+            self._buckets[slot].add(jti)
+
+    def contains(self, jti):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            expires_at = self._expires.get(jti)
+        return expires_at is not None and expires_at > now
+
+    def iter_active(self):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            return [jti for jti, expires_at in self._expires.items() if expires_at > now]
+
+
+class CacheBlocklistStore:
+    """Store in the shared cache backend (CACHE_BACKEND); entries expire with their token."""
+    PREFIX = 'auth:revoked'
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def add(self, jti, expires_at):
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self.backend.set(f"{self.PREFIX}:{jti}", '1', ttl=max(int(ttl) + 1, 1))
+
+    def contains(self, jti):
+        return self.backend.get(f"{self.PREFIX}:{jti}") is not None
+
+    # No iter_active: key scans are not part of the backend interface, so the Bloom front can't be used
+
+
+class MongoBlocklistStore:
+    """Store in the revoked_tokens collection; its TTL index (see REQUIRED_INDEXES) deletes expired entries."""
+    COLLECTION = 'revoked_tokens'
+
+    @staticmethod
+    def _collection():
+        return MongoDBClient.get_client()[MongoDBClient.get_db_name()][MongoBlocklistStore.COLLECTION]
+
+    def add(self, jti, expires_at):
+        expires_at = datetime.fromtimestamp(expires_at, tz=timezone.utc)
+        self._collection().update_one({"_id": jti}, {"$setOnInsert": {"expires_at": expires_at}}, upsert=True)
+
+    def contains(self, jti):
+        # The TTL monitor only runs periodically, so expiry is checked here too
+        now = datetime.now(timezone.utc)
+        return self._collection().find_one({"_id": jti, "expires_at": {"$gt": now}}, projection={"_id": 1}) is not None
+
+    def iter_active(self):
+        db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+        query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+        for batch in MongoDBClient.iter_collection(db, self.COLLECTION, query, projection={"_id": 1}):
+            for document in batch:
+                yield document["_id"]
+
+
+""" Step 3: Define the TokenBlocklist class """
+class TokenBlocklist:
+    """Answers "is this jti revoked?" from a store, optionally behind a Bloom filter.
+
+    With a Bloom filter (TOKEN_BLOCKLIST_BLOOM_CAPACITY > 0, the default
+    whenever the store can be listed and, for a shared store, CACHE_BACKEND
+    is set) most checks are answered in memory: only jtis the filter might contain reach the store.
+    A background thread (start) rebuilds the filter from the store every
+    ``bloom_refresh`` seconds. Revocations made here are added at once; for a
+    store shared with other nodes they are also marked in the shared cache
+    backend (CACHE_BACKEND, required in that case) until every node's next
+    rebuild, and a jti the filter doesn't contain is only let through if it
+    isn't marked. Checks go to the store while the filter isn't built, or its
+    last rebuild started more than ``2 * bloom_refresh`` seconds ago. Without
+    a store (TOKEN_BLOCKLIST_STORE=none) nothing is denied.
+    """
+    MARK_PREFIX = 'auth:revoked_recently'
+
+    def __init__(self, store, bloom_capacity=0, bloom_error_rate=0.01, bloom_refresh=30.0):
+        if bloom_capacity > 0 and store is not None:
+            if not hasattr(store, 'iter_active'):
+                raise ValueError(f"TOKEN_BLOCKLIST_BLOOM_CAPACITY can't be used with {type(store).__name__}, which can't list revoked tokens")
+            if not isinstance(store, InMemoryBlocklistStore) and get_cache_backend() is None:
+                raise ValueError("TOKEN_BLOCKLIST_BLOOM_CAPACITY requires CACHE_BACKEND to share revocations between nodes")
+        self.store = store
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_refresh = bloom_refresh
+        self.max_age = 2 * bloom_refresh
+        self._shared_store = not isinstance(store, InMemoryBlocklistStore)
+        self._bloom = None
+        self._bloom_read_at = None  # when the rebuild the filter came from started
+        self._recent = None  # jtis revoked here while a rebuild reads the store
+        self._bloom_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checks": 0, "revoked": 0, "bloom_negatives": 0, "store_lookups": 0,
+            "recently_revoked": 0, "bloom_rebuilds": 0, "bloom_errors": 0,
+        }
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    def revoke(self, jti, expires_at):
+        """Deny the token with this jti until expires_at (a UNIX timestamp)."""
+        if self.store is None:
+            return
+        self.store.add(jti, expires_at)
+        if self.bloom_capacity <= 0:
+            return
+        if self._shared_store:
+            ttl = min(expires_at - time.time(), 2 * self.max_age)
+            try:
+                if ttl > 0:
+                    get_cache_backend().set(f"{self.MARK_PREFIX}:{jti}", '1', ttl=max(int(ttl) + 1, 1))
+            except Exception as e:
+                logging.error(f"Failed to publish revocation to other nodes: {str(e)}")
+        with self._bloom_lock:
+            if self._recent is not None:
+                self._recent.append(jti)
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        if self.store is None:
+            return False
+        self._count("checks")
+        if self._bloom_says_not_revoked(jti):
+            self._count("bloom_negatives")
+            return False
+        self._count("store_lookups")
+        revoked = self.store.contains(jti)
+        if revoked:
+            self._count("revoked")
+        return revoked
+
+    def _bloom_says_not_revoked(self, jti):
+        bloom, read_at = self._bloom, self._bloom_read_at
+        if bloom is None or jti in bloom:
+            return False
+        if not self._shared_store:
+            # Every revocation goes through this process's revoke()
+            return True
+        if time.monotonic() - read_at > self.max_age:
+            return False
+        try:
+            # Revoked on another node since the filter was rebuilt?
+            marked = get_cache_backend().get(f"{self.MARK_PREFIX}:{jti}") is not None
+        except Exception as e:
+            logging.warning(f"Shared cache unavailable for the token blocklist: {str(e)}")
+            return False
+        if marked:
+            self._count("recently_revoked")
+        return not marked
+
+    def start(self, app):
+        """Start the thread that rebuilds the Bloom filter for this process (once)."""
+        if self.store is None or self.bloom_capacity <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="token-blocklist", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, app):
+        """Rebuild the filter every bloom_refresh seconds until stop() is called."""
+        while not self._stopping.is_set():
+            with app.app_context():
+                self._rebuild_bloom()
+            self._stopping.wait(self.bloom_refresh)
+
+    def _rebuild_bloom(self):
+        read_at = time.monotonic()
+        with self._bloom_lock:
+            self._recent = []
+        try:
+            bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+            for jti in self.store.iter_active():
+                bloom.add(jti)
+            with self._bloom_lock:
+                # Revocations that landed while the store was being read
+                for jti in self._recent:
+                    bloom.add(jti)
+                self._bloom, self._bloom_read_at = bloom, read_at
+            self._count("bloom_rebuilds")
+        except Exception as e:
+            # Without a current filter every check goes to the store
+            logging.error(f"Failed to rebuild token blocklist filter: {str(e)}")
+            self._count("bloom_errors")
+            with self._bloom_lock:
+                self._bloom = None
+        finally:
+            with self._bloom_lock:
+                self._recent = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        bloom = self._bloom
+        stats["bloom_running"] = self._thread is not None and self._thread.is_alive()
+        if bloom is not None:
+            stats["bloom_entries"] = bloom.count
+            stats["bloom_error_rate"] = bloom.expected_error_rate()
+            stats["bloom_age_seconds"] = time.monotonic() - self._bloom_read_at
+        return stats
+
+
+""" Step 4: Create the configured blocklist """
+# Filter size used unless TOKEN_BLOCKLIST_BLOOM_CAPACITY is set; about 117 KiB at a 1% error rate
+DEFAULT_BLOOM_CAPACITY = 100000
+
+
+def create_store(kind):
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return InMemoryBlocklistStore()
+    if kind == 'cache':
+        backend = get_cache_backend()
+        if backend is None:
+            raise ValueError("TOKEN_BLOCKLIST_STORE=cache requires CACHE_BACKEND")
+        return CacheBlocklistStore(backend)
+    if kind == 'mongo':
+        return MongoBlocklistStore()
+    raise ValueError(f"Unknown TOKEN_BLOCKLIST_STORE '{kind}'")
+
+
+def bloom_capacity_for(store):
+    """TOKEN_BLOCKLIST_BLOOM_CAPACITY if set, else a filter of DEFAULT_BLOOM_CAPACITY wherever one can be used."""
+    capacity = os.getenv('TOKEN_BLOCKLIST_BLOOM_CAPACITY', '')
+    if capacity:
+        return int(capacity)
+    if store is None or not hasattr(store, 'iter_active'):
+        return 0
+    if not isinstance(store, InMemoryBlocklistStore) and get_cache_backend() is None:
+        logging.warning("Token blocklist filter off without CACHE_BACKEND; every token check reads the store")
+        return 0
+    return DEFAULT_BLOOM_CAPACITY
+
+
+blocklist_store = create_store(os.getenv('TOKEN_BLOCKLIST_STORE', 'mongo').lower())
+token_blocklist = TokenBlocklist(
+    blocklist_store,
+    bloom_capacity=bloom_capacity_for(blocklist_store),
+    bloom_error_rate=float(os.getenv('TOKEN_BLOCKLIST_BLOOM_ERROR_RATE', 0.01)),
+    bloom_refresh=float(os.getenv('TOKEN_BLOCKLIST_BLOOM_REFRESH', 30))
+)
+register_metrics("token_blocklist", token_blocklist.stats)
@@ -0,0 +1,472 @@
+""" Read-through cache for user lookups """
+""" Step 1: Importing required libraries"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils.metrics import register_metrics
+from utils.cache_backends import get_cache_backend
+
+load_dotenv()
+
+""" Step 2: Define the cache levels """
+# Fields a user can be looked up by; every cached user is stored under all of them
+LOOKUP_FIELDS = ('id', 'email', 'username')
+
+
+class SharedUserCache:
+    """Second-level cache of serialized user rows in a shared backend.
+
+    Each user has a version counter at ``auth:user:ver:<id>``. Rows are stored
+    as ``{"ver": n, "row": {...}}`` under their id, email and username keys and
+    are only served while ``n`` matches the counter, so bumping it on a
+    password change invalidates the user on every node at once. Lookups that
+    found no user are remembered under ``auth:user:missing:<field>:<value>``,
+    holding the epoch taken before the lookup; they only count while the
+    epoch is unchanged, so any signup voids them on every node at once.
+
+    ``auth:user:epoch`` moves on every invalidation. A loader reads it before
+    its query and only publishes the row if it hasn't moved by the time it
+    reads the user's version, so a row read just before a password change is
+    never stored under the version that change created.
+
+    Rows are stored without the password hash; logins read it with their
+    own query rather than through the cache.
+    """
+    PREFIX = 'auth:user'
+
+    def __init__(self, backend, ttl=300.0):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, field, value):
+        return f"{self.PREFIX}:{field}:{value}"
+
+    def version(self, user_id):
+        return int(self.backend.get(self._key('ver', user_id)) or 0)
+
+    def epoch(self):
+        return int(self.backend.get(f"{self.PREFIX}:epoch") or 0)
+
+    def version_and_epoch(self, user_id):
+        version, epoch = self.backend.get_many([self._key('ver', user_id), f"{self.PREFIX}:epoch"])
+        return int(version or 0), int(epoch or 0)
+
+    def versions_and_epoch(self, user_ids):
+        """Return ({str(user_id): version}, epoch) in one round trip."""
+        user_ids = [str(user_id) for user_id in user_ids]
+        *versions, epoch = self.backend.get_many([self._key('ver', user_id) for user_id in user_ids] + [f"{self.PREFIX}:epoch"])
+        return {user_id: int(version or 0) for user_id, version in zip(user_ids, versions)}, int(epoch or 0)
+
+    def get(self, field, value):
+        """Return (row, version) if a current entry exists, else None."""
+        payload = self.backend.get(self._key(field, value))
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        version = self.version(entry["row"]["id"])
+        if entry["ver"] != version:
+            return None
+        return entry["row"], version
+
+    def get_many(self, field, values):
+        """Return {value: (row, version)} for the values with an entry, not yet checked against the counters."""
+        found = {}
+        for value, payload in zip(values, self.backend.get_many([self._key(field, value) for value in values])):
+            if payload is not None:
+                entry = json.loads(payload)
+                found[value] = (entry["row"], entry["ver"])
+        return found
+
+    def put(self, row, version):
+        self.put_many([(row, version)])
+
+    def put_many(self, rows):
+        """Store (row, version) pairs with one round trip."""
+        mapping = {}
+        for row, version in rows:
+            payload = json.dumps({"ver": version, "row": row})
+            mapping.update({self._key(field, row[field]): payload for field in LOOKUP_FIELDS if row.get(field) is not None})
+        self.backend.set_many(mapping, ttl=self.ttl)
+
+    def is_missing(self, field, value):
+        marker, epoch = self.backend.get_many([self._key(f'missing:{field}', value), f"{self.PREFIX}:epoch"])
+        return marker is not None and int(marker) == int(epoch or 0)
+
+    def put_missing(self, field, value, epoch, ttl):
+        self.backend.set(self._key(f'missing:{field}', value), str(epoch), ttl=ttl)
+
+    def bump_epoch(self):
+        self.backend.incr(f"{self.PREFIX}:epoch")
+
+    def bump(self, user_id):
+        self.backend.incr(self._key('ver', user_id))
+
+    def delete(self, **identifiers):
+        keys = []
+        for field, value in identifiers.items():
+            if value is not None:
+                keys += [self._key(field, value), self._key(f'missing:{field}', value)]
+        self.backend.delete(*keys)
+
+
+class UserCache:
+    """In-process LRU cache with a per-entry TTL, keyed by user id, email and username.
+
+    The same user object is stored under each of its lookup keys, so
+    invalidating a user by any one identifier drops all of its entries.
+    Callers always receive a copy, never the cached instance, and cached
+    users never carry the password hash. When a shared backend is configured
+    (CACHE_BACKEND), misses fall through to a SharedUserCache and local hits
+    are checked against the user's version.
+    Loaders take a fill_token() before querying the database and hand it to
+    put(), which drops the user if an invalidation happened in between.
+
+    Lookups that found no user can be remembered for ``negative_ttl``
+    seconds (put_missing/is_missing), so repeated attempts with an unknown
+    identifier don't reach the database. With a shared backend they are only
+    kept there, checked against the shared epoch; otherwise they are kept
+    here. Either way a lookup that raced an invalidation (e.g. a signup) is
+    not remembered.
+
+    Without a shared backend nothing is cached unless ``local_only`` is set:
+    other processes couldn't invalidate this one's entries, so a user changed
+    elsewhere would be served stale here for up to ``ttl`` seconds.
+    Set it only when a single process serves the app.
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0, shared_ttl=300.0, negative_ttl=10.0, local_only=False):
+        self.max_size = max_size
+        self.local_only = local_only
+        self.ttl = ttl
+        self.shared_ttl = shared_ttl
+        self.negative_ttl = negative_ttl
+        self.model = None
+        self._shared_cache = None
+        self._entries = OrderedDict()  # (field, value) -> (expires_at, user, version)
+        self._missing = OrderedDict()  # (field, value) -> expires_at
+        self._epoch = 0  # moved by every invalidate()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+            "stale": 0, "shared_hits": 0, "shared_errors": 0, "negative_hits": 0, "fill_races": 0,
+        }
+
+    def register_model(self, model):
+        """Set the model class used to rebuild users from shared rows.
+
+        Rows are rebuilt with ``model.from_db_row``, which skips validation;
+        they were serialized from users that had already been validated.
+        """
+        self.model = model
+
+    def _shared(self):
+        backend = get_cache_backend()
+        if backend is None or self.model is None:
+            return None
+        if self._shared_cache is None or self._shared_cache.backend is not backend:
+            self._shared_cache = SharedUserCache(backend, self.shared_ttl)
+        return self._shared_cache
+
+    def _usable(self):
+        return self.max_size > 0 and (self.local_only or self._shared() is not None)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    @staticmethod
+    def _keys(user):
+        for field in LOOKUP_FIELDS:
+            value = getattr(user, field, None)
+            if value is not None:
+                yield (field, str(value))
+
+    def get(self, field, value):
+        """Return a copy of the cached user, or None on a miss or expiry."""
+        if value is None or not self._usable():
+            return None
+        key = (field, str(value))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(entry[1])
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        shared = self._shared()
+        if entry is not None:
+            _, user, version = entry
+            try:
+                current = shared.version(user.id) if shared else version
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                current = None
+            if current == version:
+                self._count("hits")
+                return user.model_copy()
+            # Changed on another node (or unverifiable); forget the local copy
+            with self._lock:
+                self._drop(user)
+                self._stats["stale"] += 1
+
+        if shared is not None:
+            try:
+                found = shared.get(field, value)
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                found = None
+            if found is not None:
+                row, version = found
+                user = self.model.from_db_row(row)
+                self._store(user, version)
+                self._count("shared_hits")
+                return user.model_copy()
+
+        self._count("misses")
+        return None
+
+    def get_many(self, field, values):
+        """Return {value: copy of the cached user} for the values found.
+
+        Like get() for each value, but the shared level is read with two
+        round trips however many values are asked for.
+        """
+        if not self._usable():
+            return {}
+        values = list(dict.fromkeys(str(value) for value in values if value is not None))
+        local = {}
+        with self._lock:
+            now = time.monotonic()
+            for value in values:
+                entry = self._entries.get((field, value))
+                if entry is not None and entry[0] < now:
+                    self._drop(entry[1])
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end((field, value))
+                    local[value] = entry
+
+        shared = self._shared()
+        rows, versions = {}, {}
+        if shared is not None:
+            try:
+                rows = shared.get_many(field, [value for value in values if value not in local])
+                user_ids = [entry[1].id for entry in local.values()] + [row["id"] for row, _ in rows.values()]
+                versions, _ = shared.versions_and_epoch(user_ids)
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                rows, versions = {}, {}
+
+        users = {}
+        with self._lock:
+            for value, (_, user, version) in local.items():
+                current = versions.get(str(user.id)) if shared is not None else version
+                if current == version:
+                    users[value] = user.model_copy()
+                    self._stats["hits"] += 1
+                else:
+                    # Changed on another node (or unverifiable); forget the local copy
+                    self._drop(user)
+                    self._stats["stale"] += 1
+        for value, (row, version) in rows.items():
+            if versions.get(str(row["id"])) == version:
+                user = self.model.from_db_row(row)
+                self._store(user, version)
+                users[value] = user.model_copy()
+                self._count("shared_hits")
+        with self._lock:
+            self._stats["misses"] += len(values) - len(users)
+        return users
+
+    def fill_token(self):
+        """Return the invalidation epochs to pass to put(); take it before querying the database."""
+        if not self._usable():
+            return None
+        shared_epoch = None
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared_epoch = shared.epoch()
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                return None
+        return self._epoch, shared_epoch
+
+    def put(self, user, token):
+        """Cache a user loaded after fill_token() returned token in every level.
+
+        Nothing is stored if an invalidation happened since the token was
+        taken, as the user may have been read before the change it made.
+        """
+        if user is None or token is None or self.max_size <= 0:
+            return
+        local_epoch, shared_epoch = token
+        version = 0
+        shared = self._shared()
+        if shared is not None:
+            try:
+                version, epoch = shared.version_and_epoch(user.id)
+                if epoch != shared_epoch:
+                    self._count("fill_races")
+                    return
+                shared.put(user.model_dump(exclude={'password'}), version)
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                return
+        self._store(user, version, local_epoch)
+
+    def put_many(self, users, token):
+        """Like put() for each user, with one round trip to read and one to write the shared level."""
+        users = [user for user in users if user is not None]
+        if not users or token is None or self.max_size <= 0:
+            return
+        local_epoch, shared_epoch = token
+        versions = {}
+        shared = self._shared()
+        if shared is not None:
+            try:
+                versions, epoch = shared.versions_and_epoch([user.id for user in users])
+                if epoch != shared_epoch:
+                    self._count("fill_races")
+                    return
+                shared.put_many([(user.model_dump(exclude={'password'}), versions[str(user.id)]) for user in users])
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                return
+        for user in users:
+            self._store(user, versions.get(str(user.id), 0), local_epoch)
+
+    def _store(self, user, version, epoch=None):
+        user = user.model_copy(update={'password': None})
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                self._stats["fill_races"] += 1
+                return
+            for key in self._keys(user):
+                self._entries[key] = (expires_at, user, version)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._drop(evicted)
+                self._stats["evictions"] += 1
+
+    def is_missing(self, field, value):
+        """Return True if a recent lookup by this identifier found no user."""
+        if value is None or self.negative_ttl <= 0 or not self._usable():
+            return False
+        shared = self._shared()
+        if shared is not None:
+            try:
+                missing = shared.is_missing(field, value)
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+                missing = False
+        else:
+            key = (field, str(value))
+            with self._lock:
+                expires_at = self._missing.get(key)
+                if expires_at is not None and expires_at < time.monotonic():
+                    del self._missing[key]
+                    expires_at = None
+            missing = expires_at is not None
+        if missing:
+            self._count("negative_hits")
+        return missing
+
+    def put_missing(self, field, value, token):
+        """Remember for negative_ttl seconds that a lookup started after fill_token() returned token found no user."""
+        if value is None or token is None or self.max_size <= 0 or self.negative_ttl <= 0:
+            return
+        local_epoch, shared_epoch = token
+        shared = self._shared()
+        if shared is not None:
+            if shared_epoch is None:
+                return
+            try:
+                shared.put_missing(field, value, shared_epoch, self.negative_ttl)
+            except Exception as e:
+                logging.warning(f"Shared user cache unavailable: {str(e)}")
+                self._count("shared_errors")
+            return
+        with self._lock:
+            if local_epoch != self._epoch:
+                self._stats["fill_races"] += 1
+                return
+            self._missing[(field, str(value))] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end((field, str(value)))
+            while len(self._missing) > self.max_size:
+                self._missing.popitem(last=False)
+
+    def invalidate(self, **identifiers):
+        """Drop every entry of the users matching the given id/email/username.
+
+        Passing ``id`` also bumps the shared version so other nodes drop
+        their copies on their next lookup. The epochs move first, so a load
+        that sees the new version also sees that it raced the invalidation.
+        """
+        with self._lock:
+            self._epoch += 1
+            for field, value in identifiers.items():
+                if value is None:
+                    continue
+                self._missing.pop((field, str(value)), None)
+                entry = self._entries.pop((field, str(value)), None)
+                if entry is not None:
+                    self._drop(entry[1])
+                    self._stats["invalidations"] += 1
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.bump_epoch()
+                if identifiers.get('id') is not None:
+                    shared.bump(identifiers['id'])
+                shared.delete(**identifiers)
+            except Exception as e:
+                logging.error(f"Failed to invalidate shared user cache: {str(e)}")
+                self._count("shared_errors")
+
+    def _drop(self, user):
+        # Caller holds the lock; only remove keys that still point at this user
+        for key in self._keys(user):
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is user:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["missing_entries"] = len(self._missing)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+""" Step 3: Create the shared cache instance """
+user_cache = UserCache(
+    max_size=int(os.getenv('USER_CACHE_MAX_SIZE', 1024)) if os.getenv('USER_CACHE_ENABLED', 'true').lower() == 'true' else 0,
+    ttl=float(os.getenv('USER_CACHE_TTL', 30)),
+    shared_ttl=float(os.getenv('SHARED_CACHE_TTL', 300)),
+    negative_ttl=float(os.getenv('USER_CACHE_NEGATIVE_TTL', 10)),
+    local_only=os.getenv('USER_CACHE_LOCAL_ONLY', 'false').lower() == 'true'
+)
+register_metrics("user_cache", user_cache.stats)
@@ -0,0 +1,48 @@
+""" Compare the cost of building users from database rows with and without validation. """
+
+""" Step 1: Import required libraries """
+import argparse
+import timeit
+import email_validator
+from models.user import User, UserCredentials
+
+""" Step 2: Define the benchmark """
+# A row as returned by a full user lookup
+SAMPLE_ROW = {
+    "id": 42,
+    "username": "alice",
+    "email": "alice@example.com",
+    "password": "scrypt:32768:8:1$abcdefghijklmnop$" + "0" * 128,
+    "name": "Alice Example",
+    "age": 30,
+    "gender": "female",
+    "preferredLanguage": "en",
+    "profile_picture": "https://example.com/alice.png",
+    "google_id": None,
+}
+CREDENTIAL_ROW = (42, "alice", SAMPLE_ROW["password"], "en")
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<34} {seconds * 1e6:8.2f} us")
+    return seconds
+
+
+""" Step 3: Run the benchmark """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=20000, help='Constructions per timing run')
+    parser.add_argument('--check-deliverability', action='store_true',
+                        help='Let validated construction do DNS lookups as it does by default')
+    args = parser.parse_args()
+
+    if not args.check_deliverability:
+        # Time CPU work only; with DNS, validated construction is slower still
+        email_validator.CHECK_DELIVERABILITY = False
+
+    validated = bench("User(**row) (validated)", lambda: User(**SAMPLE_ROW), args.number)
+    trusted = bench("User.from_db_row(row) (trusted)", lambda: User.from_db_row(SAMPLE_ROW), args.number)
+    bench("UserCredentials.from_row(row)", lambda: UserCredentials.from_row(CREDENTIAL_ROW), args.number)
+    print(f"Trusted construction saves {(validated - trusted) * 1e6:.2f} us per lookup "
+          f"({validated / trusted:.1f}x faster)")
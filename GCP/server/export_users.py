@@ -0,0 +1,50 @@
+""" Stream every user to NDJSON or CSV in bounded memory. """
+
+""" Step 1: Import required libraries """
+import argparse
+import csv
+import json
+import sys
+import time
+from models.user import USER_COLUMNS, PROFILE_COLUMNS
+from services.postgres_rds import PostgresRDSClient
+
+""" Step 2: Define the export helpers """
+def iter_users(batch_size, with_password_hashes=False):
+    """Yield users as dicts, reading batch_size rows at a time from a server-side cursor."""
+    columns = USER_COLUMNS if with_password_hashes else PROFILE_COLUMNS
+    for result in PostgresRDSClient.iter_query(f"SELECT {columns} FROM users ORDER BY id", batch_size=batch_size):
+        for row in result["data"]:
+            yield dict(zip(result["columns"], row))
+
+
+""" Step 3: Run the export """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--output', help='File to write; defaults to stdout')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched per round-trip')
+    parser.add_argument('--with-password-hashes', action='store_true',
+                        help='Include password hashes, e.g. to re-import with import_users.py --prehashed')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    exported = 0
+    started_at = time.perf_counter()
+    try:
+        writer = None
+        for user in iter_users(args.batch_size, args.with_password_hashes):
+            if args.format == 'csv':
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(user))
+                    writer.writeheader()
+                writer.writerow(user)
+            else:
+                out.write(json.dumps(user, default=str) + "\n")
+            exported += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    # Progress goes to stderr so stdout stays a clean export
+    print(f"Exported {exported} users in {time.perf_counter() - started_at:.1f}s", file=sys.stderr)
@@ -0,0 +1,173 @@
+""" Bulk-import users from a CSV or NDJSON file. """
+
+""" Step 1: Import required libraries """
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from itertools import islice
+import email_validator
+from pydantic import ValidationError
+from models.user import User
+from services.postgres_rds import PostgresRDSClient
+from utils.hashing_pool import HashingPool, HashingPoolSaturated
+from utils.password_hasher import hash_password, get_hash_method
+
+""" Step 2: Define the import helpers """
+# Model field -> users column, in COPY order
+COLUMNS = {
+    "username": "username",
+    "email": "email",
+    "password": "password",
+    "name": "name",
+    "age": "age",
+    "gender": "gender",
+    "preferredLanguage": "preferred_language",
+    "profile_picture": "profile_picture",
+    "google_id": "google_id",
+}
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row) pairs one at a time; row is None if it can't be parsed."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Empty cells mean the field is not set
+                yield reader.line_num, {key: value for key, value in row.items() if value not in ('', None)}
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def validate_chunk(chunk):
+    """Validate rows with the User model; return (line, user) pairs and (line, reason) rejects."""
+    users, rejected = [], []
+    seen = set()
+    for line_number, row in chunk:
+        if not isinstance(row, dict):
+            rejected.append((line_number, "not a JSON object"))
+            continue
+        row.pop('id', None)
+        try:
+            user = User(**row)
+        except ValidationError as ve:
+            reason = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in ve.errors())
+            rejected.append((line_number, reason))
+            continue
+        # Repeats within a chunk would be indistinguishable once inserted
+        if ('username', user.username) in seen or ('email', user.email) in seen:
+            rejected.append((line_number, "duplicate username or email in file"))
+            continue
+        seen.update({('username', user.username), ('email', user.email)})
+        users.append((line_number, user))
+    return users, rejected
+
+
+def hash_passwords(passwords, prehashed=False):
+    """Hash a chunk of passwords across the hashing pool; None stays None (OAuth users)."""
+    if prehashed:
+        return list(passwords)
+    method = get_hash_method()
+    if HashingPool.workers() == 0:
+        return [hash_password(password, method) if password else None for password in passwords]
+    futures = []
+    for password in passwords:
+        while password:
+            try:
+                futures.append(HashingPool.submit(hash_password, password, method))
+                break
+            except HashingPoolSaturated:
+                continue  # This command is the pool's only client; wait for a slot
+        else:
+            futures.append(None)
+    return [future.result() if future else None for future in futures]
+
+
+def load_chunk(conn, users, hashes):
+    """COPY a chunk into a staging table, insert the rows that don't conflict and return their usernames."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user, password_hash in zip(users, hashes):
+        values = dict(user.model_dump(include=set(COLUMNS)), password=password_hash)
+        # An unquoted empty field is NULL in COPY's csv format
+        writer.writerow(['' if values[field] is None else values[field] for field in COLUMNS])
+    buffer.seek(0)
+
+    columns = ", ".join(COLUMNS.values())
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE import_users ON COMMIT DROP AS SELECT {columns} FROM users WITH NO DATA")
+            cursor.copy_expert(f"COPY import_users ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f"""
+                INSERT INTO users ({columns})
+                SELECT {columns} FROM import_users
+                ON CONFLICT DO NOTHING
+                RETURNING username
+            """)
+            inserted = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted
+
+
+""" Step 3: Run the import """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('path', help='CSV (with a header row) or NDJSON file of users')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated, hashed and loaded together')
+    parser.add_argument('--prehashed', action='store_true', help='Passwords are already hashed; store them as-is')
+    parser.add_argument('--rejects', help='Write rejected rows (line and reason) to this NDJSON file')
+    parser.add_argument('--check-deliverability', action='store_true',
+                        help='Look up each email domain in DNS while validating (slow)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    if not args.check_deliverability:
+        email_validator.CHECK_DELIVERABILITY = False
+
+    rejects_file = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+    conn = PostgresRDSClient._connect()
+    read = imported = rejected = 0
+    started_at = time.perf_counter()
+    try:
+        for chunk in chunked(read_rows(args.path, fmt), args.chunk_size):
+            users, rejects = validate_chunk(chunk)
+            hashes = hash_passwords([user.password for _, user in users], args.prehashed)
+            inserted = load_chunk(conn, [user for _, user in users], hashes)
+            rejects += [(line, "username or email already exists") for line, user in users if user.username not in inserted]
+
+            read += len(chunk)
+            imported += len(inserted)
+            rejected += len(rejects)
+            if rejects_file:
+                for line_number, reason in rejects:
+                    rejects_file.write(json.dumps({"line": line_number, "reason": reason}) + "\n")
+            elapsed = time.perf_counter() - started_at
+            print(f"{read} rows read, {imported} imported, {rejected} rejected ({read / elapsed:.0f} rows/s)")
+    finally:
+        conn.close()
+        if rejects_file:
+            rejects_file.close()
+
+    elapsed = time.perf_counter() - started_at
+    print(f"Imported {imported} of {read} users in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} users/s); "
+          f"{rejected} rejected")
+    sys.exit(1 if rejected else 0)
@@ -0,0 +1,27 @@
+""" Apply or preview the versioned PostgreSQL schema migrations. """
+
+""" Step 1: Import required libraries """
+import argparse
+import sys
+from services.postgres_rds import PostgresRDSClient
+from services.migrations import MigrationRunner
+
+""" Step 2: Run the migrations """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--dry-run', action='store_true', help='List pending migrations without applying them')
+    args = parser.parse_args()
+
+    runner = MigrationRunner(PostgresRDSClient._connect)
+    try:
+        migrations = runner.run(dry_run=args.dry_run)
+    except Exception as e:
+        print(f"Migration failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    verb = "Pending" if args.dry_run else "Applied"
+    for migration in migrations:
+        mode = "transaction" if migration.transactional else "autocommit"
+        print(f"{verb}: {migration.version:04d}_{migration.name} ({mode})")
+    if not migrations:
+        print("Database schema is up to date")
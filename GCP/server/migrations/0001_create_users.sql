@@ -0,0 +1,13 @@
+-- Initial users table (previously created by PostgresRDSClient._initialize_schema)
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(20) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password VARCHAR(255),
+    name VARCHAR(255),
+    age INTEGER,
+    gender VARCHAR(10),
+    preferred_language VARCHAR(2),
+    profile_picture VARCHAR(255),
+    google_id VARCHAR(255)
+);
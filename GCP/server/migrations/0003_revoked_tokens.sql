@@ -0,0 +1,8 @@
+-- Denylist of revoked JWTs (utils/token_blocklist.py), keyed by jti.
+-- Rows are only needed until the token would have expired anyway.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens (expires_at);
@@ -0,0 +1,14 @@
+-- Refresh tokens issued by utils/tokens.py, keyed by jti. Each login starts a
+-- family; a refresh marks its token used and adds the next one to the family.
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    family_id VARCHAR(64) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    expires_at TIMESTAMPTZ NOT NULL,
+    used_at TIMESTAMPTZ,
+    revoked BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family_id ON refresh_tokens (family_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens (user_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at ON refresh_tokens (expires_at);
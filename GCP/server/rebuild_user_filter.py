@@ -0,0 +1,50 @@
+""" Rebuild the username/email existence filter and report its false-positive rate.
+
+The filter is built from the users table with the configured (or given)
+capacity and error rate, then probed with identifiers nobody has to measure
+how often it would let a lookup through. Unless --dry-run is given, running
+servers sharing CACHE_BACKEND are asked to rebuild their own filters on
+their next refresh.
+"""
+
+""" Step 1: Import required libraries """
+import argparse
+import os
+import secrets
+import time
+from utils.user_filter import UserFilter, user_filter
+
+""" Step 2: Define the report helpers """
+def measure_false_positive_rate(bloom, probes):
+    """Share of random identifiers nobody has that the filter reports as present."""
+    hits = sum(f"email:{secrets.token_hex(12)}@probe.invalid" in bloom for _ in range(probes))
+    return hits / probes if probes else 0.0
+
+
+""" Step 3: Run the rebuild """
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip(), formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capacity', type=int, default=int(os.getenv('USER_FILTER_CAPACITY', 0)) or 100000,
+                        help='Identifiers the filter is sized for (two per user); defaults to USER_FILTER_CAPACITY')
+    parser.add_argument('--error-rate', type=float, default=user_filter.error_rate,
+                        help='Target false-positive rate; defaults to USER_FILTER_ERROR_RATE')
+    parser.add_argument('--probes', type=int, default=100000, help='Absent identifiers checked to measure the rate')
+    parser.add_argument('--dry-run', action='store_true', help="Only report; don't ask running servers to rebuild")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    bloom = UserFilter(user_filter.source, capacity=args.capacity, error_rate=args.error_rate).rebuild()
+    elapsed = time.perf_counter() - started_at
+
+    print(f"Loaded {bloom.count} identifiers in {elapsed:.1f}s")
+    print(f"Capacity {bloom.capacity}, {bloom.size} counters ({bloom.memory_bytes() / 1024:.0f} KiB), {bloom.hash_count} hashes")
+    print(f"False-positive rate: target {args.error_rate:.4%}, expected {bloom.expected_error_rate():.4%}, "
+          f"measured {measure_false_positive_rate(bloom, args.probes):.4%} over {args.probes} probes")
+    if bloom.count > bloom.capacity:
+        print(f"Over capacity: set USER_FILTER_CAPACITY to at least {bloom.count}")
+
+    if not args.dry_run:
+        if user_filter.request_rebuild():
+            print("Asked running servers to rebuild on their next refresh")
+        else:
+            print("No CACHE_BACKEND configured; running servers rebuild every USER_FILTER_REBUILD_INTERVAL seconds")
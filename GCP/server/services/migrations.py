@@ -0,0 +1,173 @@
+"""Versioned schema migrations for PostgreSQL.
+
+Migrations are SQL files in ``migrations/`` named ``<version>_<name>.sql`` and
+are applied in version order, each recorded in the ``schema_migrations`` table.
+A script is run inside a transaction unless it uses ``CONCURRENTLY`` (which
+PostgreSQL forbids in a transaction block); such scripts run in autocommit
+mode one statement at a time, split on semicolons that end a line. A failed
+``CREATE INDEX CONCURRENTLY`` leaves an INVALID index behind, which ``IF NOT
+EXISTS`` would then skip; the runner drops such leftovers of the indexes a
+script creates before (re)running it and after it fails.
+"""
+import os
+import re
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+CONCURRENTLY = re.compile(r"\bCONCURRENTLY\b", re.IGNORECASE)
+STATEMENT_END = re.compile(r";\s*$", re.MULTILINE)
+CREATE_INDEX = re.compile(
+    r"\bCREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.\"]+)", re.IGNORECASE
+)
+# Arbitrary key for pg_advisory_lock so only one process migrates at a time
+ADVISORY_LOCK_KEY = 720_001
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def sql(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    @property
+    def transactional(self):
+        return not CONCURRENTLY.search(self.sql)
+
+    def statements(self):
+        return [stmt.strip() for stmt in STATEMENT_END.split(self.sql) if stmt.strip()]
+
+    def concurrent_indexes(self):
+        """Names of the indexes the script creates CONCURRENTLY."""
+        return CREATE_INDEX.findall(self.sql)
+
+
+class MigrationRunner:
+    def __init__(self, connect, migrations_dir=MIGRATIONS_DIR):
+        self._connect = connect
+        self.migrations_dir = migrations_dir
+
+    def discover(self):
+        """Return all migrations on disk, ordered by version."""
+        migrations = {}
+        for filename in os.listdir(self.migrations_dir):
+            match = MIGRATION_FILE.match(filename)
+            if not match:
+                continue
+            version = int(match.group(1))
+            if version in migrations:
+                raise ValueError(f"Duplicate migration version {version}: {filename}")
+            migrations[version] = Migration(version, match.group(2), os.path.join(self.migrations_dir, filename))
+        return [migrations[version] for version in sorted(migrations)]
+
+    @staticmethod
+    def _ensure_table(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+
+    @staticmethod
+    def _applied_versions(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM schema_migrations")
+            return {row[0] for row in cursor.fetchall()}
+
+    def pending(self):
+        """Return migrations not yet applied to the database."""
+        conn = self._connect()
+        try:
+            conn.autocommit = True
+            self._ensure_table(conn)
+            applied = self._applied_versions(conn)
+        finally:
+            conn.close()
+        return [m for m in self.discover() if m.version not in applied]
+
+    def run(self, dry_run=False):
+        """Apply pending migrations and return them; with dry_run, only list them."""
+        if dry_run:
+            pending = self.pending()
+            for migration in pending:
+                mode = "transaction" if migration.transactional else "autocommit"
+                logger.info(f"[dry-run] Would apply migration {migration.version:04d}_{migration.name} ({mode})")
+            return pending
+
+        conn = self._connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+            try:
+                self._ensure_table(conn)
+                # Re-read under the lock; another process may have just migrated
+                applied = self._applied_versions(conn)
+                pending = [m for m in self.discover() if m.version not in applied]
+                for migration in pending:
+                    self._apply(conn, migration)
+                if pending:
+                    logger.info(f"Applied {len(pending)} migration(s)")
+                return pending
+            finally:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _drop_invalid_indexes(conn, names):
+        """Drop any of the named indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY."""
+        with conn.cursor() as cursor:
+            for name in names:
+                cursor.execute(
+                    "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,)
+                )
+                row = cursor.fetchone()
+                if row and row[0]:
+                    logger.warning(f"Dropping invalid index {name} left by an earlier failed build")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    @classmethod
+    def _apply(cls, conn, migration):
+        logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+        record = "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)"
+        try:
+            if migration.transactional:
+                conn.autocommit = False
+                with conn.cursor() as cursor:
+                    cursor.execute(migration.sql)
+                    cursor.execute(record, (migration.version, migration.name))
+                conn.commit()
+            else:
+                cls._drop_invalid_indexes(conn, migration.concurrent_indexes())
+                with conn.cursor() as cursor:
+                    for statement in migration.statements():
+                        cursor.execute(statement)
+                    cursor.execute(record, (migration.version, migration.name))
+        except Exception as e:
+            if not conn.autocommit:
+                conn.rollback()
+            logger.error(f"Migration {migration.version:04d}_{migration.name} failed: {str(e)}")
+            if not migration.transactional:
+                try:
+                    cls._drop_invalid_indexes(conn, migration.concurrent_indexes())
+                except Exception as cleanup_error:
+                    logger.error(f"Could not drop invalid indexes (retried on the next run): {str(cleanup_error)}")
+            raise
+        finally:
+            conn.autocommit = True
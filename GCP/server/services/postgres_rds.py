@@ -1,6 +1,14 @@
 import os
+import time
+import threading
+import uuid
+from collections import deque
+from contextlib import closing, contextmanager
 import psycopg2
+import psycopg2.errors
 from psycopg2 import sql
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
 from dotenv import load_dotenv
 import logging
 
@@ -9,8 +17,160 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the wait timeout."""
+
+
+class StatementTrackingConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared.
+
+    Prepared statements live only as long as the server session, so a fresh
+    (or recycled) connection starts with an empty set and prepares on demand.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PostgresConnectionPool:
+    """Thread-safe PostgreSQL connection pool.
+
+    Connections are checked out per query and returned afterwards. Idle
+    connections are health-checked before reuse once they have been idle for
+    longer than ``health_check_interval`` seconds, and callers wait at most
+    ``timeout`` seconds for a free connection when ``max_size`` is reached.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=30.0, max_lifetime=3600.0):
+        if min_size > max_size:
+            raise ValueError("min_size cannot be greater than max_size")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self._idle = deque()  # (connection, last_used_at)
+        self._created_at = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(min_size):
+            conn = self._open()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+
+    def _open(self):
+        conn = self._connect()
+        conn.autocommit = True
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, last_used_at):
+        """Return True if an idle connection can be handed out again."""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        created_at = self._created_at.get(id(conn), now)
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding stale pooled connection: {str(e)}")
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds."""
+        deadline = time.monotonic() + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    # LIFO keeps the hottest connections in use and lets idle ones age out
+                    conn, last_used_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            if self._is_usable(conn, last_used_at):
+                return conn
+            # Replace the stale connection in place; the slot stays reserved
+            self._close(conn)
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, or drop it if it is broken."""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._close(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
 class PostgresRDSClient:
     _connection = None
+    _statements = {}  # name -> (query, query with $n placeholders, parameter count)
+    _pool = None
+    _pool_lock = threading.Lock()
 
     @staticmethod
     def get_connection():
@@ -29,12 +189,6 @@ class PostgresRDSClient:
                 PostgresRDSClient._connection = connection
                 
                 logger.info("Connected to Google Cloud SQL PostgreSQL")
-                
-                # Check if required tables exist and create them if they don't
-                if not PostgresRDSClient._check_table_exists("users"):
-                    logger.info("Required tables don't exist. Initializing schema...")
-                    PostgresRDSClient._initialize_schema()
-                    
             except psycopg2.OperationalError as e:
                 # Check if the error is because the database doesn't exist
                 if "does not exist" in str(e):
@@ -52,9 +206,6 @@ class PostgresRDSClient:
                     connection.autocommit = True
                     PostgresRDSClient._connection = connection
                     logger.info(f"Connected to newly created database {os.getenv('CLOUDSQL_DB_NAME')}")
-                    
-                    # Initialize schema in the new database
-                    PostgresRDSClient._initialize_schema()
                 else:
                     logger.error(f"Error connecting to PostgreSQL: {str(e)}")
                     raise
@@ -64,37 +215,78 @@ class PostgresRDSClient:
         return PostgresRDSClient._connection
 
     @staticmethod
-    def _check_table_exists(table_name):
-        """Check if a specific table exists in the current database."""
+    def _connect():
+        """Open a new connection, creating the database on first use if needed."""
+        params = dict(
+            dbname=os.getenv("CLOUDSQL_DB_NAME"),
+            user=os.getenv("CLOUDSQL_USERNAME"),
+            password=os.getenv("CLOUDSQL_PASSWORD"),
+            host=os.getenv("CLOUDSQL_HOST"),
+            port=os.getenv("CLOUDSQL_PORT")
+        )
+        params["connection_factory"] = StatementTrackingConnection
         try:
-            # Create a separate connection just for checking table existence
-            # This avoids transaction conflicts with the main connection
-            conn = psycopg2.connect(
-                dbname=os.getenv("CLOUDSQL_DB_NAME"),
-                user=os.getenv("CLOUDSQL_USERNAME"),
-                password=os.getenv("CLOUDSQL_PASSWORD"),
-                host=os.getenv("CLOUDSQL_HOST"),
-                port=os.getenv("CLOUDSQL_PORT")
-            )
-            conn.autocommit = True
-                
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = %s
-                    )
-                """, (table_name,))
-                
-                exists = cursor.fetchone()[0]
-            
-            # Close the temporary connection
-            conn.close()
-            return exists
-        except Exception as e:
-            logger.error(f"Error checking if table exists: {str(e)}")
-            return False
+            return psycopg2.connect(**params)
+        except psycopg2.OperationalError as e:
+            if "does not exist" not in str(e):
+                raise
+            logger.info(f"Database {os.getenv('CLOUDSQL_DB_NAME')} does not exist. Attempting to create it.")
+            PostgresRDSClient._create_database()
+            return psycopg2.connect(**params)
+
+    @staticmethod
+    def pool_enabled():
+        return os.getenv("CLOUDSQL_POOL_ENABLED", "true").lower() == "true"
+
+    @classmethod
+    def get_pool(cls):
+        """Return the process-wide connection pool, creating it on first use."""
+        pool = cls._pool
+        # A pool inherited across fork() shares sockets with the parent; rebuild it
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+        with cls._pool_lock:
+            if cls._pool is None or cls._pool.pid != os.getpid():
+                cls._pool = PostgresConnectionPool(
+                    PostgresRDSClient._connect,
+                    min_size=int(os.getenv("CLOUDSQL_POOL_MIN_SIZE", 1)),
+                    max_size=int(os.getenv("CLOUDSQL_POOL_MAX_SIZE", 10)),
+                    timeout=float(os.getenv("CLOUDSQL_POOL_TIMEOUT", 30)),
+                    health_check_interval=float(os.getenv("CLOUDSQL_POOL_HEALTHCHECK_INTERVAL", 30)),
+                    max_lifetime=float(os.getenv("CLOUDSQL_POOL_MAX_LIFETIME", 3600))
+                )
+                logger.info(f"Created PostgreSQL connection pool: {cls._pool.stats()}")
+            return cls._pool
+
+    @classmethod
+    def close_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.closeall()
+                cls._pool = None
+
+    @staticmethod
+    @contextmanager
+    def connection():
+        """Check out a connection for the duration of the block.
+
+        Uses the pool unless CLOUDSQL_POOL_ENABLED is false, in which case the
+        legacy shared connection is returned.
+        """
+        if not PostgresRDSClient.pool_enabled():
+            yield PostgresRDSClient.get_connection()
+            return
+        pool = PostgresRDSClient.get_pool()
+        conn = pool.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The connection itself is likely broken; don't hand it out again
+            discard = True
+            raise
+        finally:
+            pool.putconn(conn, discard=discard)
 
     @staticmethod
     def _create_database():
@@ -126,47 +318,6 @@ class PostgresRDSClient:
             if conn:
                 conn.close()
 
-    @staticmethod
-    def _initialize_schema():
-        """Initialize database schema with required tables."""
-        conn = None
-        try:
-            # Create a fresh connection for schema initialization
-            # to avoid transaction conflicts
-            conn = psycopg2.connect(
-                dbname=os.getenv("CLOUDSQL_DB_NAME"),
-                user=os.getenv("CLOUDSQL_USERNAME"),
-                password=os.getenv("CLOUDSQL_PASSWORD"),
-                host=os.getenv("CLOUDSQL_HOST"),
-                port=os.getenv("CLOUDSQL_PORT")
-            )
-            conn.autocommit = True
-            
-            with conn.cursor() as cursor:
-                # Create users table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
-                        username VARCHAR(20) UNIQUE NOT NULL,
-                        email VARCHAR(255) UNIQUE NOT NULL,
-                        password VARCHAR(255),
-                        name VARCHAR(255),
-                        age INTEGER,
-                        gender VARCHAR(10),
-                        preferred_language VARCHAR(2),
-                        profile_picture VARCHAR(255),
-                        google_id VARCHAR(255)
-                    )
-                """)
-                logger.info("Database schema initialized successfully")
-        except Exception as e:
-            logger.error(f"Error initializing schema: {str(e)}")
-            raise
-        finally:
-            # Always close the connection
-            if conn and conn != PostgresRDSClient._connection:
-                conn.close()
-
     @staticmethod
     def check_database_exists():
         """Check if the database exists."""
@@ -196,26 +347,127 @@ class PostgresRDSClient:
 
     @staticmethod
     def execute_query(query, params=None, fetch_one=False, fetch_all=False):
-        conn = PostgresRDSClient.get_connection()
-        with conn.cursor() as cursor:
+        return PostgresRDSClient._execute(
+            lambda conn, cursor: cursor.execute(query, params), fetch_one, fetch_all
+        )
+
+    @staticmethod
+    def prepared_statements_enabled():
+        return os.getenv("CLOUDSQL_PREPARED_STATEMENTS", "true").lower() == "true"
+
+    @staticmethod
+    def register_statement(name, query):
+        """Register a query (with %s placeholders) to run as a prepared statement.
+
+        Returns the name to pass to execute_prepared. Statements are prepared
+        lazily on each connection the first time they are executed there.
+        """
+        if not name.isidentifier():
+            raise ValueError(f"Invalid prepared statement name '{name}'")
+        parts = query.split("%s")
+        numbered = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+        PostgresRDSClient._statements[name] = (query, numbered, len(parts) - 1)
+        return name
+
+    @staticmethod
+    def execute_prepared(name, params=None, fetch_one=False, fetch_all=False):
+        """Run a registered statement with EXECUTE; same results as execute_query."""
+        if not PostgresRDSClient.prepared_statements_enabled():
+            query = PostgresRDSClient._statements[name][0]
+            return PostgresRDSClient.execute_query(query, params, fetch_one, fetch_all)
+        return PostgresRDSClient._execute(
+            lambda conn, cursor: PostgresRDSClient._run_prepared(conn, cursor, name, params),
+            fetch_one, fetch_all
+        )
+
+    @staticmethod
+    def _prepare(conn, cursor, name):
+        _, numbered, _ = PostgresRDSClient._statements[name]
+        try:
+            cursor.execute(f"PREPARE {name} AS {numbered}")
+        except psycopg2.errors.DuplicatePreparedStatement:
+            # Already on the server even though this connection lost track of it
+            if not conn.autocommit:
+                conn.rollback()
+        conn.prepared.add(name)
+
+    @staticmethod
+    def _run_prepared(conn, cursor, name, params):
+        query, _, count = PostgresRDSClient._statements[name]
+        prepared = getattr(conn, "prepared", None)
+        if prepared is None:
+            # Connections not opened by _connect (the legacy shared one) don't track statements
+            cursor.execute(query, params)
+            return
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f"EXECUTE {name}"
+        if name not in prepared:
+            PostgresRDSClient._prepare(conn, cursor, name)
+        try:
+            cursor.execute(execute, params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The session was reset underneath us (e.g. DISCARD ALL); prepare again and retry once
+            if not conn.autocommit:
+                conn.rollback()
+            prepared.clear()
+            PostgresRDSClient._prepare(conn, cursor, name)
+            cursor.execute(execute, params)
+
+    @staticmethod
+    def iter_query(query, params=None, batch_size=1000):
+        """Stream a large result through a server-side cursor.
+
+        Yields results shaped like ``execute_query(fetch_all=True)`` holding at
+        most ``batch_size`` rows each, so memory is bounded by the batch size
+        rather than the size of the result.
+        """
+        if PostgresRDSClient.pool_enabled():
+            context = PostgresRDSClient.connection()
+        else:
+            # Don't take the shared legacy connection out of autocommit mode
+            context = closing(PostgresRDSClient._connect())
+        with context as conn:
+            # Named (server-side) cursors only exist inside a transaction
+            conn.autocommit = False
             try:
-                cursor.execute(query, params)
-                if fetch_one:
-                    result = cursor.fetchone()
-                    if result:
-                        # Return both the result and column descriptions
-                        columns = [desc[0] for desc in cursor.description]
-                        return {"data": result, "columns": columns}
-                    return None
-                if fetch_all:
-                    results = cursor.fetchall()
-                    if results:
-                        # Return both results and column descriptions
-                        columns = [desc[0] for desc in cursor.description]
-                        return {"data": results, "columns": columns}
-                    return None
+                with conn.cursor(name=f"iter_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(query, params)
+                    columns = None
+                    while rows := cursor.fetchmany(batch_size):
+                        columns = columns or [desc[0] for desc in cursor.description]
+                        yield {"data": rows, "columns": columns}
                 conn.commit()
-            except Exception as e:
-                logger.error(f"Error executing query: {str(e)}")
-                conn.rollback()
-                raise
+            finally:
+                # Also reached when the caller stops iterating early
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+
+    @staticmethod
+    def _execute(run, fetch_one=False, fetch_all=False):
+        with PostgresRDSClient.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    run(conn, cursor)
+                    if fetch_one:
+                        result = cursor.fetchone()
+                        conn.commit()
+                        if result:
+                            # Return both the result and column descriptions
+                            columns = [desc[0] for desc in cursor.description]
+                            return {"data": result, "columns": columns}
+                        return None
+                    if fetch_all:
+                        results = cursor.fetchall()
+                        conn.commit()
+                        if results:
+                            # Return both results and column descriptions
+                            columns = [desc[0] for desc in cursor.description]
+                            return {"data": results, "columns": columns}
+                        return None
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Error executing query: {str(e)}")
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
@@ -0,0 +1,54 @@
+""" Tests for the Bloom filters """
+from utils.bloom import BloomFilter, CountingBloomFilter
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter(1000, 0.01)
+    items = [f"jti-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_false_positive_rate_stays_near_the_target_at_capacity():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+
+    assert false_positives / 10000 < 0.02
+    assert 0.005 < bloom.expected_error_rate() < 0.015
+
+
+def test_counting_filter_forgets_removed_items():
+    bloom = CountingBloomFilter(1000, 0.01)
+    for i in range(100):
+        bloom.add(f"user-{i}")
+
+    assert bloom.remove("user-7")
+    assert "user-7" not in bloom
+    assert all(f"user-{i}" in bloom for i in range(100) if i != 7)
+    assert bloom.count == 99
+
+
+def test_counting_filter_refuses_to_remove_what_it_lacks():
+    bloom = CountingBloomFilter(1000, 0.01)
+    bloom.add("user-1")
+
+    assert not bloom.remove("user-2")
+    assert "user-1" in bloom and bloom.count == 1
+
+
+def test_saturated_counters_are_never_decremented():
+    bloom = CountingBloomFilter(10, 0.01)
+    for _ in range(300):
+        bloom.add("popular")
+    for _ in range(300):
+        bloom.remove("popular")
+
+    # The counters stuck at 255 can't tell how many adds they have seen
+    assert "popular" in bloom
+    assert bloom.memory_bytes() == bloom.size
@@ -0,0 +1,63 @@
+""" Tests for the password hashing pool: backpressure and recovery from a dead worker """
+import os
+import time
+import pytest
+from utils.hashing_pool import HashingPool, HashingPoolSaturated
+
+
+def die_once(marker):
+    """Kill the worker running it the first time, as an OOM kill would; succeed after that."""
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return 'done'
+
+
+@pytest.fixture(autouse=True)
+def one_worker_pool(monkeypatch):
+    monkeypatch.setenv('HASHING_POOL_WORKERS', '1')
+    monkeypatch.setenv('HASHING_POOL_MAX_QUEUE', '0')
+    monkeypatch.setenv('HASHING_POOL_QUEUE_TIMEOUT', '0.05')
+    monkeypatch.setattr(HashingPool, '_executor', None)
+    monkeypatch.setattr(HashingPool, '_pid', None)
+    yield
+    if HashingPool._executor is not None:
+        HashingPool._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def test_hash_and_check_run_in_the_pool():
+    pwhash = HashingPool.generate_password_hash('correct horse')
+
+    assert HashingPool.check_password_hash(pwhash, 'correct horse')
+    assert not HashingPool.check_password_hash(pwhash, 'wrong horse')
+
+
+def test_full_queue_rejects_instead_of_waiting():
+    rejected = HashingPool.get_metrics()["rejected"]
+    busy = HashingPool.submit(time.sleep, 0.5)
+
+    started_at = time.monotonic()
+    with pytest.raises(HashingPoolSaturated):
+        HashingPool.submit(time.sleep, 0)
+
+    assert time.monotonic() - started_at < 0.4
+    assert HashingPool.get_metrics()["rejected"] == rejected + 1
+    busy.result()
+    # The slot is free again once the job is done
+    HashingPool.submit(time.sleep, 0).result()
+
+
+def test_dead_worker_is_replaced_and_the_job_retried(tmp_path):
+    restarts = HashingPool.get_metrics()["restarts"]
+
+    assert HashingPool._run(die_once, str(tmp_path / 'died')) == 'done'
+
+    assert HashingPool.get_metrics()["restarts"] == restarts + 1
+    assert HashingPool.check_password_hash(HashingPool.generate_password_hash('secret'), 'secret')
+
+
+def test_zero_workers_hash_inline(monkeypatch):
+    monkeypatch.setenv('HASHING_POOL_WORKERS', '0')
+
+    assert HashingPool.check_password_hash(HashingPool.generate_password_hash('secret'), 'secret')
+    assert HashingPool._executor is None
@@ -0,0 +1,114 @@
+""" Tests for key-ring signing and the verified-token cache of CachingJWTManager """
+import time
+from datetime import timedelta
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from flask import Flask, jsonify
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from utils.jwt_keys import KeyRing
+from utils.jwt_manager import CachingJWTManager
+
+
+def make_app(**options):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-of-at-least-32-bytes'
+    manager = CachingJWTManager(**options)
+    manager.init_app(app)
+
+    @app.get('/me')
+    @jwt_required()
+    def me():
+        return jsonify(user=get_jwt_identity())
+
+    return app, manager
+
+
+def token_for(app, user, **options):
+    with app.app_context():
+        return create_access_token(identity=user, **options)
+
+
+def get_me(app, token):
+    return app.test_client().get('/me', headers={'Authorization': f"Bearer {token}"})
+
+
+def write_private_key(key_dir, kid):
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    (key_dir / f"{kid}.pem").write_bytes(pem)
+    return key
+
+
+def write_public_key(key_dir, kid, key):
+    pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    (key_dir / f"{kid}.pub.pem").write_bytes(pem)
+
+
+@pytest.fixture(autouse=True)
+def hmac_signing(monkeypatch):
+    monkeypatch.setenv('JWT_ALGORITHM', 'HS256')
+
+
+def test_token_presented_again_skips_verification():
+    # Fails if flask_jwt_extended stops routing decoding through the overridden hook
+    app, manager = make_app(cache_size=16)
+    token = token_for(app, 'alice')
+
+    assert get_me(app, token).get_json() == {'user': 'alice'}
+    assert get_me(app, token).get_json() == {'user': 'alice'}
+
+    stats = manager.stats()
+    assert (stats['misses'], stats['hits']) == (1, 1)
+
+
+def test_cached_token_is_still_rejected_once_it_expires():
+    app, manager = make_app(cache_size=16)
+    token = token_for(app, 'alice', expires_delta=timedelta(seconds=1))
+    assert get_me(app, token).status_code == 200
+
+    time.sleep(1.1)
+
+    assert get_me(app, token).status_code == 401
+    assert manager.stats()['hits'] == 0
+
+
+def test_least_recently_used_token_is_evicted():
+    app, manager = make_app(cache_size=2)
+    tokens = [token_for(app, user) for user in ('alice', 'bob', 'carol')]
+
+    for token in tokens:
+        get_me(app, token)
+    get_me(app, tokens[0])
+
+    stats = manager.stats()
+    assert (stats['evictions'], stats['entries'], stats['hits']) == (2, 2, 0)
+
+
+def test_disabled_cache_verifies_every_time():
+    app, manager = make_app(cache_size=0)
+    token = token_for(app, 'alice')
+
+    get_me(app, token)
+    get_me(app, token)
+
+    assert manager.stats()['entries'] == 0
+
+
+def test_key_ring_signs_with_the_active_kid_and_verifies_retired_keys(tmp_path):
+    old_dir, new_dir = tmp_path / 'old', tmp_path / 'new'
+    old_dir.mkdir()
+    new_dir.mkdir()
+    retired = write_private_key(old_dir, '2024-01')
+    write_public_key(new_dir, '2024-01', retired)
+    write_private_key(new_dir, '2024-02')
+    old_app, _ = make_app(key_ring=KeyRing.load(str(old_dir), 'ES256'))
+    new_app, _ = make_app(key_ring=KeyRing.load(str(new_dir), 'ES256'))
+
+    old_token = token_for(old_app, 'alice')
+    new_token = token_for(new_app, 'bob')
+
+    assert get_me(new_app, old_token).get_json() == {'user': 'alice'}
+    assert get_me(new_app, new_token).get_json() == {'user': 'bob'}
+    # A token signed by a key the old ring never had is refused
+    assert get_me(old_app, new_token).status_code == 422
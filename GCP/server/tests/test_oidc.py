@@ -0,0 +1,125 @@
+""" Tests for the cached OpenID Connect discovery document and signing keys """
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from authlib.jose import JsonWebKey
+from flask import Flask
+from utils.oidc import CachingOAuth
+
+
+def public_jwk(kid):
+    key = JsonWebKey.generate_key('EC', 'P-256', is_private=True).as_dict(is_private=False)
+    key['kid'] = kid
+    return key
+
+
+class StandInProvider(BaseHTTPRequestHandler):
+    """Serves a discovery document and a key set, counting requests for each."""
+    provider = None  # the running StandInProvider state, set by the fixture
+
+    def do_GET(self):
+        state = self.provider
+        state["requests"][self.path] = state["requests"].get(self.path, 0) + 1
+        if state["failing"]:
+            self.send_error(500)
+            return
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        if self.path == '/.well-known/openid-configuration':
+            body = {"issuer": base, "jwks_uri": f"{base}/jwks"}
+        elif self.path == '/jwks':
+            body = {"keys": state["keys"]}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider():
+    state = {"requests": {}, "failing": False, "keys": [public_jwk('key-1')]}
+    handler = type("Handler", (StandInProvider,), {"provider": state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(provider):
+    oauth = CachingOAuth(Flask(__name__))
+    return oauth.register(
+        'google', client_id='client-id', client_secret='client-secret',
+        server_metadata_url=f"{provider['url']}/.well-known/openid-configuration"
+    )
+
+
+def fetches(provider, path):
+    return provider["requests"].get(path, 0)
+
+
+def test_metadata_is_fetched_once_until_it_expires(provider, client):
+    client.load_server_metadata()
+    client.load_server_metadata()
+    assert fetches(provider, '/.well-known/openid-configuration') == 1
+
+    client.metadata_ttl = 0
+    client._metadata_expires_at = 0.0
+    client.load_server_metadata()
+    assert fetches(provider, '/.well-known/openid-configuration') == 2
+
+
+def test_key_set_is_parsed_once_and_served_from_memory(provider, client):
+    load_key = client.create_load_key()
+
+    for _ in range(3):
+        assert load_key({'kid': 'key-1'}, None) is not None
+
+    assert fetches(provider, '/jwks') == 1
+    assert client.stats()["jwks_hits"] == 2
+
+
+def test_unknown_kid_refreshes_the_key_set_once(provider, client):
+    load_key = client.create_load_key()
+    client.jwks_min_refresh = 0
+    load_key({'kid': 'key-1'}, None)
+
+    provider["keys"].append(public_jwk('key-2'))
+    assert load_key({'kid': 'key-2'}, None) is not None
+    assert fetches(provider, '/jwks') == 2
+
+    # A kid the provider doesn't have can't force another fetch right away
+    client.jwks_min_refresh = 60
+    with pytest.raises(ValueError):
+        load_key({'kid': 'forged'}, None)
+    assert fetches(provider, '/jwks') == 2
+    assert client.stats()["kid_miss_refreshes"] == 2
+
+
+def test_failed_refresh_keeps_the_cached_keys(provider, client):
+    client.jwks_ttl = 0
+    keys = client.fetch_jwk_set()
+
+    provider["failing"] = True
+    assert client.fetch_jwk_set() == keys
+
+    stats = client.stats()
+    assert (stats["jwks_fetches"], stats["fetch_errors"]) == (1, 1)
+
+
+def test_first_fetch_failing_is_an_error(provider, client):
+    provider["failing"] = True
+
+    with pytest.raises(Exception):
+        client.load_server_metadata()
@@ -0,0 +1,109 @@
+""" Tests for the token-bucket and sliding-window rate limit stores """
+import pytest
+from utils import rate_limit
+from utils.cache_backends import InMemoryCacheBackend
+from utils.rate_limit import InMemoryRateLimitStore, CacheRateLimitStore, RateLimiter, check_limits
+
+
+class Clock:
+    """Stand-in for time.time/time.monotonic that only moves when told to."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    monkeypatch.setattr(rate_limit.time, 'time', clock)
+    return clock
+
+
+# Token buckets
+def test_bucket_allows_a_burst_up_to_the_limit(clock):
+    store = InMemoryRateLimitStore()
+    assert [store.hit('k', 5, 10) for _ in range(5)] == [0.0] * 5
+    # Refills at 5 / 10 = 0.5 tokens per second, so the next token is 2s away
+    assert store.hit('k', 5, 10) == pytest.approx(2.0)
+
+
+def test_bucket_refills_at_the_average_rate(clock):
+    store = InMemoryRateLimitStore()
+    for _ in range(5):
+        store.hit('k', 5, 10)
+
+    clock.advance(2.0)
+    assert store.hit('k', 5, 10) == 0.0
+    assert store.hit('k', 5, 10) == pytest.approx(2.0)
+
+
+def test_bucket_never_holds_more_than_the_limit(clock):
+    store = InMemoryRateLimitStore()
+    store.hit('k', 3, 3)
+    clock.advance(3600)
+    assert [store.hit('k', 3, 3) for _ in range(4)][-1] == pytest.approx(1.0)
+
+
+def test_bucket_keys_are_independent_and_bounded(clock):
+    store = InMemoryRateLimitStore(max_keys=2)
+    store.hit('a', 1, 60)
+    store.hit('b', 1, 60)
+    assert store.hit('b', 1, 60) > 0
+    store.hit('c', 1, 60)  # evicts 'a', the least recently seen key
+
+    assert store.size() == 2
+    assert store.hit('a', 1, 60) == 0.0  # starts again with a full bucket
+
+
+# Sliding windows
+def test_window_allows_the_limit_then_rejects(clock):
+    clock.now = 600.0  # start of a 60s window
+    store = CacheRateLimitStore(InMemoryCacheBackend())
+    assert [store.hit('k', 3, 60) for _ in range(3)] == [0.0] * 3
+    # The fourth hit only fits in the next window, where the previous one weighs 1 - elapsed
+    assert store.hit('k', 3, 60) == pytest.approx(60 * (2 - 0 - 2 / 4))
+
+
+def test_window_weights_the_previous_window_by_its_overlap(clock):
+    clock.now = 600.0
+    store = CacheRateLimitStore(InMemoryCacheBackend())
+    for _ in range(4):
+        store.hit('k', 4, 60)
+
+    # A quarter into the next window the previous one still counts 4 * 0.75 = 3
+    clock.advance(75)
+    assert store.hit('k', 4, 60) == 0.0
+    assert store.hit('k', 4, 60) > 0
+
+
+@pytest.mark.parametrize("limit,period,hits,start", [(3, 60, 5, 600.0), (10, 300, 14, 912.5), (1, 10, 3, 27.0)])
+def test_window_retry_after_is_when_a_hit_fits_again(clock, limit, period, hits, start):
+    clock.now = start
+    store = CacheRateLimitStore(InMemoryCacheBackend())
+    retry_after = 0.0
+    for _ in range(hits):
+        retry_after = store.hit('k', limit, period)
+    assert retry_after > 0
+
+    clock.advance(retry_after + 1e-6)
+    assert store.hit('k', limit, period) == 0.0
+
+
+# Limiters
+def test_check_limits_stops_at_the_first_rejection(clock):
+    store = InMemoryRateLimitStore()
+    by_ip = RateLimiter("ip", 1, 60, store)
+    by_identifier = RateLimiter("identifier", 5, 60, store)
+
+    assert check_limits((by_ip, '10.0.0.1'), (by_identifier, 'alice'), (None, 'ignored'), (by_identifier, '')) == 0
+    assert check_limits((by_ip, '10.0.0.1'), (by_identifier, 'alice')) == pytest.approx(60.0)
+
+    assert by_ip.stats()["rejected"] == 1
+    assert by_identifier.stats()["checks"] == 1
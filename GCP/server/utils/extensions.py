@@ -1,8 +1,27 @@
 """ Flask extensions """
 """ Step 1: Importing required libraries"""
-from authlib.integrations.flask_client import OAuth
-from flask_mail import Mail
+import os
+from dotenv import load_dotenv
+from utils.oidc import CachingOAuth
+from utils.smtp_pool import PooledMail
+from utils.jwt_manager import CachingJWTManager
+from utils.metrics import register_metrics
+
+load_dotenv()
 
 """ Step 2: Creating instances of the extensions """
-mail = Mail()
-oauth = OAuth()
\ No newline at end of file
+mail = PooledMail()
+oauth = CachingOAuth()
+jwt = CachingJWTManager()
+register_metrics("jwt_verify_cache", jwt.stats)
+register_metrics("smtp_pool", mail.stats)
+
+# Google sign-in; GOOGLE_DISCOVERY_URL can point at another provider (e.g. stub_idp.py)
+oauth.register(
+    name='google',
+    client_id=os.getenv('GOOGLE_CLIENT_ID'),
+    client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
+    server_metadata_url=os.getenv('GOOGLE_DISCOVERY_URL', 'https://accounts.google.com/.well-known/openid-configuration'),
+    client_kwargs={'scope': 'openid email profile'},
+)
+register_metrics("google_oidc_cache", lambda: oauth.google.stats() if oauth.app else {})
@@ -0,0 +1,232 @@
+""" Durable outbox for outgoing mail, delivered by a background sender """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import random
+import smtplib
+import logging
+import threading
+from typing import NamedTuple, Optional
+from flask_mail import Message
+from dotenv import load_dotenv
+from services.postgres_rds import PostgresRDSClient
+from utils.extensions import mail
+from utils.metrics import register_metrics
+
+load_dotenv()
+
+""" Step 2: Define the store """
+class OutboxMessage(NamedTuple):
+    id: object
+    subject: str
+    sender: str
+    recipients: list
+    body: Optional[str]
+    html: Optional[str]
+    attempts: int
+
+
+class PostgresOutboxStore:
+    """Messages in the mail_outbox table (migration 0005).
+
+    Senders claim due messages with FOR UPDATE SKIP LOCKED, so any number of
+    them (one per worker process, or mail_worker.py) can drain the table
+    without sending a message twice.
+    """
+
+    def __init__(self, lease_seconds=300.0):
+        self.lease_seconds = lease_seconds
+        PostgresRDSClient.register_statement("mail_outbox_insert", """
+            INSERT INTO mail_outbox (subject, sender, recipients, body, html)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id
+        """)
+        PostgresRDSClient.register_statement("mail_outbox_claim", """
+            UPDATE mail_outbox SET attempts = attempts + 1, next_attempt_at = now() + make_interval(secs => %s)
+            WHERE id IN (
+                SELECT id FROM mail_outbox
+                WHERE sent_at IS NULL AND attempts < %s AND next_attempt_at <= now()
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, subject, sender, recipients, body, html, attempts
+        """)
+        PostgresRDSClient.register_statement(
+            "mail_outbox_sent", "UPDATE mail_outbox SET sent_at = now(), last_error = NULL WHERE id = ANY(%s)"
+        )
+        PostgresRDSClient.register_statement(
+            "mail_outbox_failed",
+            "UPDATE mail_outbox SET next_attempt_at = now() + make_interval(secs => %s), last_error = %s WHERE id = %s"
+        )
+
+    def add(self, subject, sender, recipients, body, html):
+        result = PostgresRDSClient.execute_prepared(
+            "mail_outbox_insert", (subject, sender, list(recipients), body, html), fetch_one=True
+        )
+        return result["data"][0]
+
+    def claim(self, limit, max_attempts):
+        result = PostgresRDSClient.execute_prepared(
+            "mail_outbox_claim", (self.lease_seconds, max_attempts, limit), fetch_all=True
+        )
+        return [OutboxMessage(*row) for row in result["data"]] if result else []
+
+    def mark_sent(self, message_ids):
+        PostgresRDSClient.execute_prepared("mail_outbox_sent", (list(message_ids),))
+
+    def mark_failed(self, message_id, retry_in, error):
+        PostgresRDSClient.execute_prepared("mail_outbox_failed", (retry_in, error[:1000], message_id))
+
+    def purge_sent(self, older_than_seconds):
+        PostgresRDSClient.execute_query(
+            "DELETE FROM mail_outbox WHERE sent_at < now() - make_interval(secs => %s)", (older_than_seconds,)
+        )
+
+
+""" Step 3: Define the MailOutbox class """
+# SMTP errors that concern one message. SMTPException subclasses OSError, so
+# they are checked before CONNECTION_ERRORS, which end the session and leave
+# the rest of the batch for later; anything else (e.g. BadHeaderError or a
+# UnicodeEncodeError while building the message) only fails its message
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+
+
+class MailOutbox:
+    """Writes messages to the store in the request and delivers them in the background.
+
+    The sender thread claims up to ``batch_size`` due messages at a time and
+    sends them over one pooled SMTP session. A failed message is retried after an
+    exponential backoff (``backoff_base`` doubling per attempt, capped at
+    ``backoff_max``, with jitter) until it has been tried ``max_attempts``
+    times; it then stays in the store with its last error. Messages enqueued
+    by this process wake the sender at once; others are picked up within
+    ``poll_interval`` seconds.
+    """
+
+    def __init__(self, store, batch_size=50, poll_interval=5.0, max_attempts=8,
+                 backoff_base=30.0, backoff_max=3600.0, retention=7 * 86400.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention = retention
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._next_purge = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "batches": 0, "sent": 0, "failed": 0, "gave_up": 0}
+
+    def _count(self, stat, n=1):
+        with self._stats_lock:
+            self._stats[stat] += n
+
+    def enqueue(self, message):
+        """Store a flask_mail Message for delivery; returns its outbox id."""
+        message_id = self.store.add(
+            message.subject, message.sender, message.recipients, message.body, message.html
+        )
+        self._count("enqueued")
+        self._wakeup.set()
+        return message_id
+
+    def start(self, app):
+        """Start the sender thread for this process (once)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="mail-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, app):
+        """Deliver due messages until stop() is called."""
+        logging.info("Mail outbox sender started")
+        while not self._stopping.is_set():
+            try:
+                with app.app_context():
+                    claimed = self.drain_once()
+            except Exception as e:
+                logging.error(f"Mail outbox sender error: {str(e)}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self):
+        """Claim and send one batch; returns the number of messages claimed."""
+        batch = self.store.claim(self.batch_size, self.max_attempts)
+        if batch:
+            self._count("batches")
+            self._send_batch(batch)
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + 3600.0
+            self.store.purge_sent(self.retention)
+        return len(batch)
+
+    def _send_batch(self, batch):
+        sent = []
+        remaining = list(batch)
+        try:
+            with mail.connect() as connection:
+                while remaining:
+                    outbox_message = remaining[0]
+                    try:
+                        connection.send(Message(
+                            subject=outbox_message.subject,
+                            sender=outbox_message.sender,
+                            recipients=list(outbox_message.recipients),
+                            body=outbox_message.body,
+                            html=outbox_message.html
+                        ))
+                        sent.append(outbox_message.id)
+                    except MESSAGE_ERRORS as e:
+                        self._failed(outbox_message, e)
+                    except CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        self._failed(outbox_message, e)
+                    remaining.pop(0)
+        except Exception as e:
+            # Connecting failed or the connection broke: retry the rest later
+            for outbox_message in remaining:
+                self._failed(outbox_message, e)
+        if sent:
+            self.store.mark_sent(sent)
+            self._count("sent", len(sent))
+
+    def _failed(self, outbox_message, error):
+        self._count("failed")
+        if outbox_message.attempts >= self.max_attempts:
+            self._count("gave_up")
+            logging.error(f"Giving up on outbox message {outbox_message.id} after {outbox_message.attempts} attempts: {str(error)}")
+        else:
+            logging.warning(f"Outbox message {outbox_message.id} failed (attempt {outbox_message.attempts}): {str(error)}")
+        retry_in = min(self.backoff_base * 2 ** (outbox_message.attempts - 1), self.backoff_max)
+        self.store.mark_failed(outbox_message.id, retry_in * random.uniform(0.5, 1.0), str(error))
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+""" Step 4: Create the configured outbox """
+mail_outbox = MailOutbox(
+    PostgresOutboxStore(float(os.getenv('MAIL_OUTBOX_LEASE', 300))),
+    batch_size=int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50)),
+    poll_interval=float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 5)),
+    max_attempts=int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 8)),
+    backoff_base=float(os.getenv('MAIL_OUTBOX_BACKOFF_BASE', 30)),
+    backoff_max=float(os.getenv('MAIL_OUTBOX_BACKOFF_MAX', 3600))
+)
+register_metrics("mail_outbox", mail_outbox.stats)
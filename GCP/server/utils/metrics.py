@@ -0,0 +1,24 @@
+""" In-process metrics registry """
+""" Step 1: Importing required libraries"""
+import logging
+
+""" Step 2: Define the registry """
+# Each provider is a zero-argument callable returning a JSON-serializable dict
+_providers = {}
+
+
+def register_metrics(name, provider):
+    """Register a metrics provider under the given name."""
+    _providers[name] = provider
+
+
+def collect_metrics():
+    """Return a snapshot of every registered provider."""
+    snapshot = {}
+    for name, provider in _providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            logging.error(f"Error collecting metrics for {name}: {str(e)}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,113 @@
+""" OAuth client with cached OpenID Connect discovery metadata and signing keys """
+""" Step 1: Importing required libraries"""
+import os
+import time
+import logging
+import threading
+from authlib.integrations.flask_client import OAuth, FlaskOAuth2App
+from authlib.jose import JsonWebKey
+from dotenv import load_dotenv
+
+load_dotenv()
+
+""" Step 2: Define the caching client """
+class CachingOAuth2App(FlaskOAuth2App):
+    """OAuth 2 / OpenID Connect client that keeps the provider's metadata and keys in memory.
+
+    authlib fetches the discovery document once and never again, and parses
+    the JWKS on every ID token. Here the discovery document is refetched after
+    OIDC_METADATA_TTL seconds and the parsed key set after OIDC_JWKS_TTL, so a
+    callback normally makes no request besides the token exchange. A token
+    signed with an unknown kid (the provider rotated its keys) refreshes the
+    key set at once, but at most every OIDC_JWKS_MIN_REFRESH seconds. If a
+    refresh fails the cached copy is kept and retried after that interval.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metadata_ttl = float(os.getenv('OIDC_METADATA_TTL', 86400))
+        self.jwks_ttl = float(os.getenv('OIDC_JWKS_TTL', 3600))
+        self.jwks_min_refresh = float(os.getenv('OIDC_JWKS_MIN_REFRESH', 60))
+        self._metadata_expires_at = 0.0
+        self._jwks = None  # (JWKS document, parsed KeySet)
+        self._jwks_expires_at = 0.0
+        self._jwks_fetched_at = float('-inf')
+        self._metadata_lock = threading.Lock()
+        self._jwks_lock = threading.Lock()
+        self._stats = {"metadata_fetches": 0, "jwks_fetches": 0, "jwks_hits": 0, "kid_miss_refreshes": 0, "fetch_errors": 0}
+
+    def load_server_metadata(self):
+        if not self._server_metadata_url or time.monotonic() < self._metadata_expires_at:
+            return self.server_metadata
+        with self._metadata_lock:
+            if time.monotonic() >= self._metadata_expires_at:
+                loaded = '_loaded_at' in self.server_metadata
+                self.server_metadata.pop('_loaded_at', None)
+                try:
+                    super().load_server_metadata()
+                    self._stats["metadata_fetches"] += 1
+                    self._metadata_expires_at = time.monotonic() + self.metadata_ttl
+                except Exception as e:
+                    if not loaded:
+                        raise
+                    self._stats["fetch_errors"] += 1
+                    logging.warning(f"Keeping cached OIDC metadata for {self.name}: {str(e)}")
+                    self.server_metadata['_loaded_at'] = time.time()
+                    self._metadata_expires_at = time.monotonic() + self.jwks_min_refresh
+        return self.server_metadata
+
+    def fetch_jwk_set(self, force=False):
+        return self._load_jwks(force)[0]
+
+    def _load_jwks(self, force=False):
+        with self._jwks_lock:
+            now = time.monotonic()
+            cached = self._jwks
+            if cached is not None:
+                if force and now - self._jwks_fetched_at < self.jwks_min_refresh:
+                    force = False  # just refreshed; the kid is really unknown
+                if not force and now < self._jwks_expires_at:
+                    self._stats["jwks_hits"] += 1
+                    return cached
+            uri = self.load_server_metadata().get('jwks_uri')
+            if not uri:
+                raise RuntimeError('Missing "jwks_uri" in metadata')
+            try:
+                with self.client_cls(**self.client_kwargs) as session:
+                    resp = session.request('GET', uri, withhold_token=True)
+                    resp.raise_for_status()
+                    jwk_set = resp.json()
+            except Exception as e:
+                if cached is None:
+                    raise
+                self._stats["fetch_errors"] += 1
+                logging.warning(f"Keeping cached OIDC signing keys for {self.name}: {str(e)}")
+                self._jwks_fetched_at = now
+                self._jwks_expires_at = now + self.jwks_min_refresh
+                return cached
+            self._stats["jwks_fetches"] += 1
+            self._jwks = (jwk_set, JsonWebKey.import_key_set(jwk_set))
+            self._jwks_fetched_at = now
+            self._jwks_expires_at = now + self.jwks_ttl
+            return self._jwks
+
+    def create_load_key(self):
+        def load_key(header, _):
+            kid = header.get('kid')
+            try:
+                return self._load_jwks()[1].find_by_kid(kid)
+            except ValueError:
+                self._stats["kid_miss_refreshes"] += 1
+                return self._load_jwks(force=True)[1].find_by_kid(kid)
+
+        return load_key
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["jwks_keys"] = len(self._jwks[1].keys) if self._jwks else 0
+        return stats
+
+
+class CachingOAuth(OAuth):
+    """OAuth registry whose OAuth 2 clients are CachingOAuth2App instances."""
+    oauth2_client_cls = CachingOAuth2App
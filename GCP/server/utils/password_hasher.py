@@ -0,0 +1,99 @@
+""" Configurable password hashing with detection of outdated hashes """
+""" Step 1: Importing required libraries"""
+import os
+import secrets
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from argon2 import PasswordHasher as Argon2Hasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+except ImportError:  # argon2-cffi is optional
+    Argon2Hasher = None
+
+""" Step 2: Define hashing helpers """
+# Method strings follow werkzeug's "<algorithm>:<params>" format:
+#   scrypt:<n>:<r>:<p>, pbkdf2:<hash_name>:<iterations>, argon2:<time_cost>:<memory_kib>:<parallelism>
+DEFAULT_HASH_METHOD = "scrypt:32768:8:1"
+ARGON2_DEFAULTS = (3, 65536, 4)
+PBKDF2_DEFAULT_ITERATIONS = 1_000_000
+_dummy_hashes = {}  # method -> hash of a random password
+_dummy_lock = threading.Lock()
+
+
+def get_hash_method():
+    """Return the configured hash method with all parameters filled in."""
+    return normalize_method(os.getenv("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD))
+
+
+def normalize_method(method):
+    """Expand a method string to the fully parameterized form stored in hashes."""
+    algorithm, *args = method.split(":")
+    if algorithm == "scrypt":
+        n, r, p = map(int, args) if args else (2**15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if algorithm == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) > 1 else PBKDF2_DEFAULT_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if algorithm == "argon2":
+        if Argon2Hasher is None:
+            raise ValueError("argon2 hashing requires the argon2-cffi package")
+        time_cost, memory_cost, parallelism = map(int, args) if args else ARGON2_DEFAULTS
+        return f"argon2:{time_cost}:{memory_cost}:{parallelism}"
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+def _argon2_hasher(method=None):
+    if method is None:
+        return Argon2Hasher()
+    _, time_cost, memory_cost, parallelism = method.split(":")
+    return Argon2Hasher(time_cost=int(time_cost), memory_cost=int(memory_cost), parallelism=int(parallelism))
+
+
+def hash_password(password, method=None):
+    """Hash a password with the given (or configured) method."""
+    method = normalize_method(method) if method else get_hash_method()
+    if method.startswith("argon2:"):
+        return _argon2_hasher(method).hash(password)
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(pwhash, password):
+    """Check a password against a hash produced by any supported algorithm."""
+    if not pwhash:
+        return False
+    if pwhash.startswith("$argon2"):
+        if Argon2Hasher is None:
+            return False
+        try:
+            # Parameters are encoded in the hash itself
+            return _argon2_hasher().verify(pwhash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(pwhash, password)
+
+
+def needs_rehash(pwhash, method=None):
+    """Return True if pwhash was not produced with the given (or configured) method."""
+    method = normalize_method(method) if method else get_hash_method()
+    if method.startswith("argon2:"):
+        if not pwhash.startswith("$argon2"):
+            return True
+        return _argon2_hasher(method).check_needs_rehash(pwhash)
+    # werkzeug hashes are "<method>$<salt>$<hash>"
+    return pwhash.split("$", 1)[0] != method
+
+
+def dummy_hash(method=None):
+    """Return a hash of a random password made with the given (or configured) method.
+
+    Logins for unknown users (or users without a password) are verified
+    against it, so they take as long as a wrong password for a real user.
+    It is computed once per method; create_app does that at startup.
+    """
+    method = normalize_method(method) if method else get_hash_method()
+    with _dummy_lock:
+        if method not in _dummy_hashes:
+            _dummy_hashes[method] = hash_password(secrets.token_urlsafe(16), method)
+        return _dummy_hashes[method]
@@ -0,0 +1,26 @@
+""" Issue access/refresh token pairs """
+""" Step 1: Importing required libraries"""
+import time
+import uuid
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+from models.refresh_token import RefreshToken
+
+""" Step 2: Define the token helpers """
+def issue_tokens(user_id, family_id=None):
+    """Create an access token and a refresh token for the user, and record the refresh token.
+
+    Access tokens are short-lived (JWT_ACCESS_TOKEN_EXPIRES) and verified
+    without touching the database; only redeeming the refresh token at
+    /user/refresh does. A login starts a new family and each refresh passes
+    its family on, so replaying a used refresh token revokes the whole
+    session. Both tokens carry the family as the ``fam`` claim.
+    """
+    family_id = family_id or uuid.uuid4().hex
+    jti = uuid.uuid4().hex
+    claims = {"fam": family_id}
+    access_token = create_access_token(identity=str(user_id), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user_id), additional_claims={**claims, "jti": jti})
+    expires_at = time.time() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds()
+    RefreshToken.create(jti, family_id, user_id, expires_at)
+    return {"access_token": access_token, "refresh_token": refresh_token}